@@ -0,0 +1,94 @@
+from typing import Callable, Dict, Optional, Tuple, Type
+
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters.callback_data import CallbackData
+
+
+class HostCallback(CallbackData, prefix="h"):
+    """Открыть карточку хоста."""
+    host_id: int
+
+
+class PollCallback(CallbackData, prefix="p"):
+    """Запросить метрики у агента хоста. Адрес берётся из БД по host_id."""
+    host_id: int
+
+
+class HostsPageCallback(CallbackData, prefix="hp"):
+    """Страница списка хостов с фильтром по тегу, сортировкой и префиксом имени."""
+    page: int
+    tag: str = ""
+    sort: str = "id"
+    query: str = ""
+
+
+class HostTagsCallback(CallbackData, prefix="ht"):
+    """Изменить теги хоста."""
+    host_id: int
+
+
+class GroupPollCallback(CallbackData, prefix="gp"):
+    """Опросить все хосты группы (тега)."""
+    tag: str
+
+
+_FACTORIES: Dict[str, Type[CallbackData]] = {
+    factory.__prefix__: factory
+    for factory in (HostCallback, PollCallback, HostsPageCallback, HostTagsCallback, GroupPollCallback)
+}
+
+
+def parse_callback_data(data: Optional[str]) -> Optional[CallbackData]:
+    """Разбирает callback_data по префиксу через таблицу фабрик. Возвращает None для простых строк."""
+    if not data:
+        return None
+    prefix, separator, _ = data.partition(":")
+    factory = _FACTORIES.get(prefix) if separator else None
+    if factory is None:
+        return None
+    try:
+        return factory.unpack(data)
+    except (TypeError, ValueError):
+        return None
+
+
+class CallbackHandlers:
+    """
+    Таблица обработчиков callback_query.
+
+    Простые строки callback_data и типы CallbackData сопоставляются обработчикам
+    словарями, поэтому выбор обработчика не зависит от их числа, в отличие от
+    линейного перебора фильтров роутера aiogram. Обработчик ищется один раз в
+    CallbackDataMiddleware и вызывается единственным хендлером роутера.
+    """
+
+    def __init__(self):
+        self._by_data: Dict[str, HandlerObject] = {}
+        self._by_factory: Dict[Type[CallbackData], HandlerObject] = {}
+
+    @staticmethod
+    def _register(table: dict, key, callback: Callable) -> Callable:
+        if key in table:
+            raise ValueError(f"Обработчик для {key!r} уже зарегистрирован")
+        table[key] = HandlerObject(callback=callback)
+        return callback
+
+    def data(self, value: str) -> Callable[[Callable], Callable]:
+        """Декоратор: обработчик нажатия кнопки с callback_data, равной value."""
+        return lambda callback: self._register(self._by_data, value, callback)
+
+    def factory(self, factory: Type[CallbackData]) -> Callable[[Callable], Callable]:
+        """Декоратор: обработчик callback_data, разобранной фабрикой factory."""
+        return lambda callback: self._register(self._by_factory, factory, callback)
+
+    def resolve(self, data: Optional[str]) -> Tuple[Optional[HandlerObject], Optional[CallbackData]]:
+        """
+        Разбирает callback_data и находит её обработчик.
+
+        Returns:
+            Tuple: (обработчик или None, разобранные данные или None для простых строк).
+        """
+        callback_data = parse_callback_data(data)
+        if callback_data is not None:
+            return self._by_factory.get(type(callback_data)), callback_data
+        return self._by_data.get(data), None
@@ -1,27 +1,206 @@
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
-from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession
-from sqlalchemy import String, ForeignKey, BigInteger, DateTime, Float, JSON, Integer, CheckConstraint
+from sqlalchemy.ext.asyncio import AsyncAttrs, async_sessionmaker, create_async_engine, AsyncSession, AsyncEngine
+from sqlalchemy import String, ForeignKey, BigInteger, DateTime, Float, JSON, Integer, CheckConstraint, Index, text, \
+    Boolean, select, update, bindparam, inspect
+from sqlalchemy.schema import CreateIndex
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.engine import Connection
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
 from datetime import datetime
+from typing import AsyncIterator, Optional
 import logging
+import time
 
-from config import DB_URL
+from config import DB_URL, DB_READ_URL, DB_READ_MAX_STALENESS
+from app.utils.metrics import DB_POOL_IN_USE
 
 IP_MAX_LENGTH = 50
 NAME_MAX_LENGTH = 100
 SYSTEM_INFO_MAX_LENGTH = 255
+TAG_MAX_LENGTH = 20
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-engine = create_async_engine(url=DB_URL)
-async_session = async_sessionmaker(
-    bind=engine,
-    class_=AsyncSession,
-    expire_on_commit=False,
-    autoflush=False,
+READ_PROBE_INTERVAL = 5.0
+
+_engine: Optional[AsyncEngine] = None
+_session_maker: Optional[async_sessionmaker[AsyncSession]] = None
+_read_engine: Optional[AsyncEngine] = None
+_read_session_maker: Optional[async_sessionmaker[AsyncSession]] = None
+# Telegram ID пользователя, чей апдейт сейчас обрабатывается (ставит CurrentUserMiddleware)
+current_user_id: ContextVar[Optional[int]] = ContextVar("current_user_id", default=None)
+# Момент последней пишущей сессии по tg_id; записи старше DB_READ_MAX_STALENESS вычищаются
+_last_writes: "OrderedDict[int, float]" = OrderedDict()
+# Результат последней проверки реплики (время, пригодна ли)
+_read_probe = (0.0, False)
+# Отставание реплики в секундах. Если реплика воспроизвела всё полученное WAL, она не отстаёт:
+# now() - pg_last_xact_replay_timestamp() при этом растёт на простаивающей основной БД
+REPLICA_LAG_SQL = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+""")
+TRGM_INDEX = "ix_hosts_name_key_trgm"
+# Индексы, добавленные к уже существующим таблицам: create_all создаёт индексы только вместе
+# с таблицей, поэтому на старых базах они досоздаются при запуске. None — для любого диалекта
+UPGRADE_INDEXES = (
+    ("ix_hosts_user_name_key", None),
+    (TRGM_INDEX, "postgresql"),
+    ("ix_metrics_ram_percent", None),
+    ("ix_host_tags_tag_host", None),
 )
 
 
+def host_name_key(name: str) -> str:
+    """Имя хоста, приведённое для поиска по префиксу без учёта регистра."""
+    return name.casefold()
+
+
+def _default_name_key(context) -> str:
+    return host_name_key(context.get_current_parameters()["name"])
+
+
+def _pg_trgm_installed(bind) -> bool:
+    """Установлено ли в базе расширение pg_trgm. При выводе DDL без соединения считается, что да."""
+    if not isinstance(bind, Connection):
+        return True
+    return bind.execute(text("SELECT 1 FROM pg_extension WHERE extname = 'pg_trgm'")).first() is not None
+
+
+def get_engine() -> AsyncEngine:
+    """Возвращает движок БД, создавая его при первом обращении."""
+    global _engine
+    if _engine is None:
+        _engine = create_async_engine(url=DB_URL)
+        checked_out = getattr(_engine.pool, "checkedout", None)
+        if checked_out is not None:
+            DB_POOL_IN_USE.set_function(checked_out)
+        logger.info("Database engine created")
+    return _engine
+
+
+def _make_session_maker(engine: AsyncEngine) -> async_sessionmaker[AsyncSession]:
+    return async_sessionmaker(
+        bind=engine,
+        class_=AsyncSession,
+        expire_on_commit=False,
+        autoflush=False,
+    )
+
+
+def get_session_maker() -> async_sessionmaker[AsyncSession]:
+    """Возвращает фабрику сессий, привязанную к движку из get_engine()."""
+    global _session_maker
+    if _session_maker is None:
+        _session_maker = _make_session_maker(get_engine())
+    return _session_maker
+
+
+def get_read_session_maker() -> Optional[async_sessionmaker[AsyncSession]]:
+    """Возвращает фабрику сессий движка чтения или None, если DB_READ_URL не задан."""
+    global _read_engine, _read_session_maker
+    if not DB_READ_URL:
+        return None
+    if _read_session_maker is None:
+        _read_engine = create_async_engine(url=DB_READ_URL)
+        _read_session_maker = _make_session_maker(_read_engine)
+        logger.info("Read database engine created")
+    return _read_session_maker
+
+
+def async_session() -> AsyncSession:
+    """
+    Создаёт новую сессию основной (пишущей) БД. Движок инициализируется лениво при первом вызове.
+
+    Момент вызова запоминается для текущего пользователя (current_user_id): при заданном
+    DB_READ_MAX_STALENESS его чтения в течение этого времени идут в основную БД, чтобы он
+    видел свои изменения. Чтения остальных пользователей продолжают идти в реплику.
+    """
+    user_id = current_user_id.get()
+    if user_id is not None and DB_READ_MAX_STALENESS:
+        now = time.monotonic()
+        _last_writes[user_id] = now
+        _last_writes.move_to_end(user_id)
+        while _last_writes:
+            oldest_user, written_at = next(iter(_last_writes.items()))
+            if now - written_at < DB_READ_MAX_STALENESS:
+                break
+            del _last_writes[oldest_user]
+    return get_session_maker()()
+
+
+def _wrote_recently(user_id: Optional[int]) -> bool:
+    written_at = _last_writes.get(user_id) if user_id is not None else None
+    return written_at is not None and time.monotonic() - written_at < DB_READ_MAX_STALENESS
+
+
+async def _probe_read_engine(read_maker: async_sessionmaker[AsyncSession]) -> bool:
+    """Проверяет доступность и отставание реплики; результат кешируется на READ_PROBE_INTERVAL."""
+    global _read_probe
+    checked_at, usable = _read_probe
+    now = time.monotonic()
+    if now - checked_at < READ_PROBE_INTERVAL:
+        return usable
+    try:
+        async with read_maker() as session:
+            if session.bind.dialect.name == "postgresql" and DB_READ_MAX_STALENESS:
+                lag = await session.scalar(REPLICA_LAG_SQL)
+                usable = float(lag) <= DB_READ_MAX_STALENESS
+                if not usable:
+                    logger.warning(f"Реплика отстаёт на {float(lag):.1f} сек, чтение идёт в основную БД")
+            else:
+                await session.execute(text("SELECT 1"))
+                usable = True
+    except Exception as e:
+        logger.error(f"Реплика недоступна, чтение идёт в основную БД: {e}")
+        usable = False
+    _read_probe = (now, usable)
+    return usable
+
+
+@asynccontextmanager
+async def read_session() -> AsyncIterator[AsyncSession]:
+    """
+    Сессия для путей отображения.
+
+    Идёт в DB_READ_URL, если он задан, реплика доступна и её отставание (PostgreSQL)
+    не больше DB_READ_MAX_STALENESS. Иначе, а также в течение DB_READ_MAX_STALENESS
+    секунд после записи того же пользователя, используется основная БД.
+    """
+    read_maker = get_read_session_maker()
+    use_replica = read_maker is not None
+    if use_replica and DB_READ_MAX_STALENESS and _wrote_recently(current_user_id.get()):
+        use_replica = False
+    if use_replica:
+        use_replica = await _probe_read_engine(read_maker)
+    maker = read_maker if use_replica else get_session_maker()
+    async with maker() as session:
+        yield session
+
+
+async def dispose_engine() -> None:
+    """Закрывает пулы соединений движков, если они были созданы."""
+    global _engine, _session_maker, _read_engine, _read_session_maker, _read_probe
+    if _engine is not None:
+        await _engine.dispose()
+        DB_POOL_IN_USE.set_function(None)
+        logger.info("Database engine disposed")
+    if _read_engine is not None:
+        await _read_engine.dispose()
+        logger.info("Read database engine disposed")
+    _engine = None
+    _session_maker = None
+    _read_engine = None
+    _read_session_maker = None
+    _read_probe = (0.0, False)
+    _last_writes.clear()
+
+
 class Base(AsyncAttrs, DeclarativeBase):
     """Базовый класс для моделей с асинхронной поддержкой."""
     pass
@@ -40,12 +219,21 @@ class Host(Base):
     __tablename__ = "hosts"
     __table_args__ = (
         CheckConstraint("port >= 0 AND port <= 65535", name="check_port_range"),
+        # Поиск по префиксу имени в пределах пользователя (диапазонный предикат по B-tree)
+        Index("ix_hosts_user_name_key", "user_id", "name_key"),
+        # На PostgreSQL поиск идёт через LIKE, его ускоряет триграммный индекс, если есть pg_trgm
+        Index(
+            TRGM_INDEX, "name_key",
+            postgresql_using="gin", postgresql_ops={"name_key": "gin_trgm_ops"},
+        ).ddl_if(dialect="postgresql", callable_=lambda ddl, target, bind, **kw: _pg_trgm_installed(bind)),
     )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     ip: Mapped[str] = mapped_column(String(IP_MAX_LENGTH), unique=True, index=True, nullable=False)
     port: Mapped[int] = mapped_column(Integer, nullable=False)
     name: Mapped[str] = mapped_column(String(NAME_MAX_LENGTH), nullable=False)
+    # Имя в нижнем регистре (host_name_key): заполняется при вставке из name
+    name_key: Mapped[str] = mapped_column(String(NAME_MAX_LENGTH), nullable=False, default=_default_name_key)
     last_checked: Mapped[datetime | None] = mapped_column(DateTime, nullable=True)
     user_id: Mapped[BigInteger] = mapped_column(ForeignKey("users.tg_id"))
 
@@ -70,7 +258,7 @@ class Metric(Base):
     total_ram_mb: Mapped[float] = mapped_column(Float, nullable=False)
     used_ram_gb: Mapped[float] = mapped_column(Float, nullable=False)
     used_ram_mb: Mapped[float] = mapped_column(Float, nullable=False)
-    ram_percent: Mapped[float] = mapped_column(Float, nullable=False)
+    ram_percent: Mapped[float] = mapped_column(Float, nullable=False, index=True)
     total_swap_gb: Mapped[float] = mapped_column(Float, nullable=False)
     total_swap_mb: Mapped[float] = mapped_column(Float, nullable=False)
     used_swap_gb: Mapped[float] = mapped_column(Float, nullable=False)
@@ -82,11 +270,93 @@ class Metric(Base):
     components: Mapped[list] = mapped_column(JSON, nullable=False)
 
 
+class HostTag(Base):
+    """Тег хоста. Группа хостов — это все хосты пользователя с одним тегом."""
+    __tablename__ = "host_tags"
+    __table_args__ = (
+        Index("ix_host_tags_tag_host", "tag", "host_id"),
+    )
+
+    host_id: Mapped[int] = mapped_column(ForeignKey("hosts.id", ondelete="CASCADE"), primary_key=True)
+    tag: Mapped[str] = mapped_column(String(TAG_MAX_LENGTH), primary_key=True)
+
+
+class MetricSample(Base):
+    """
+    Отсчёт истории опросов хоста для периодических отчётов.
+
+    up=False — агент не ответил, значения метрик тогда пустые. disk_percent пуст и
+    для ответов 304 Not Modified, в которых тело (а значит, и диски) не передаётся.
+    """
+    __tablename__ = "metric_samples"
+    __table_args__ = (
+        Index("ix_metric_samples_host_taken", "host_id", "taken_at"),
+        Index("ix_metric_samples_taken", "taken_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+    host_id: Mapped[int] = mapped_column(ForeignKey("hosts.id", ondelete="CASCADE"), nullable=False)
+    taken_at: Mapped[datetime] = mapped_column(DateTime, nullable=False)
+    up: Mapped[bool] = mapped_column(Boolean, nullable=False)
+    ram_percent: Mapped[float | None] = mapped_column(Float, nullable=True)
+    swap_percent: Mapped[float | None] = mapped_column(Float, nullable=True)
+    disk_percent: Mapped[float | None] = mapped_column(Float, nullable=True)
+
+
+async def _upgrade_schema(conn) -> None:
+    """
+    Приводит таблицы, созданные прежними версиями, к текущей схеме. Все шаги идемпотентны.
+
+    Args:
+        conn: Соединение внутри транзакции async_main.
+    """
+    columns = await conn.run_sync(
+        lambda sync_conn: {column["name"] for column in inspect(sync_conn).get_columns("hosts")})
+    if "name_key" not in columns:
+        await conn.execute(
+            text(f"ALTER TABLE hosts ADD COLUMN name_key VARCHAR({NAME_MAX_LENGTH}) NOT NULL DEFAULT ''"))
+        rows = (await conn.execute(select(Host.id, Host.name))).all()
+        if rows:
+            await conn.execute(
+                update(Host.__table__).where(Host.__table__.c.id == bindparam("host_id"))
+                .values(name_key=bindparam("key")),
+                [{"host_id": host_id, "key": host_name_key(name)} for host_id, name in rows],
+            )
+        logger.info(f"Добавлен столбец hosts.name_key, заполнено {len(rows)} хостов")
+
+    indexes = {index.name: index for table in Base.metadata.tables.values() for index in table.indexes}
+    for name, dialect in UPGRADE_INDEXES:
+        if dialect is not None and dialect != conn.dialect.name:
+            continue
+        if name == TRGM_INDEX and not await conn.run_sync(_pg_trgm_installed):
+            continue
+        await conn.execute(CreateIndex(indexes[name], if_not_exists=True))
+
+
+async def _create_pg_trgm(conn) -> None:
+    """
+    Пытается установить pg_trgm в точке сохранения. Роли без права CREATE это не удастся:
+    тогда запуск продолжается без триграммного индекса, поиск по префиксу обслуживает
+    B-tree индекс ix_hosts_user_name_key.
+
+    Args:
+        conn: Соединение внутри транзакции async_main.
+    """
+    try:
+        async with conn.begin_nested():
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    except DBAPIError as e:
+        logger.warning(f"Расширение pg_trgm недоступно, индекс {TRGM_INDEX} не создаётся: {e}")
+
+
 async def async_main():
     """Инициализация базы данных с обработкой ошибок."""
     try:
-        async with engine.begin() as conn:
+        async with get_engine().begin() as conn:
+            if conn.dialect.name == "postgresql":
+                await _create_pg_trgm(conn)
             await conn.run_sync(Base.metadata.create_all)
+            await _upgrade_schema(conn)
         logger.info("Database initialized successfully")
     except Exception as e:
         logger.error(f"Failed to initialize database: {e}")
@@ -1,17 +1,20 @@
-from typing import Tuple, Optional
+from typing import Tuple, Optional, List, AsyncIterator
 from datetime import datetime
-from sqlalchemy import select, insert, update, or_
-from sqlalchemy.orm import joinedload
+from sqlalchemy import select, insert, update, delete, or_, bindparam, func, case, literal
+from sqlalchemy.orm import joinedload, contains_eager
 from sqlalchemy.exc import IntegrityError
-from sqlalchemy.engine import ScalarResult
+from sqlalchemy.engine import Row
 import logging
 
-from .models import async_session, User, Host, Metric
+from .models import async_session, read_session, host_name_key, User, Host, Metric, HostTag, MetricSample
+from app.utils.metrics import timed, DB_QUERY_SECONDS
+from app.utils.samples import disk_usage_percent
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
 
+@timed(DB_QUERY_SECONDS)
 async def set_user(tg_id: int) -> None:
     """
     Добавляет нового пользователя в базу данных, если он еще не существует.
@@ -28,7 +31,8 @@ async def set_user(tg_id: int) -> None:
                     tg_id=tg_id,
                     settings=[
                     {
-                        "short": False
+                        "short": False,
+                        "report": None
                     }
                 ]))
                 await session.commit()
@@ -37,6 +41,7 @@ async def set_user(tg_id: int) -> None:
                 logger.info(f"Пользователь с tg_id={tg_id} уже существует.")
 
 
+@timed(DB_QUERY_SECONDS)
 async def get_user(tg_id: int) -> Optional[User]:
     """
     Получает информацию о пользователе по его Telegram ID.
@@ -47,7 +52,7 @@ async def get_user(tg_id: int) -> Optional[User]:
     Returns:
         Optional[User]: Объект User или None, если пользователь не найден.
     """
-    async with async_session() as session:
+    async with read_session() as session:
         user = await session.scalar(select(User).where(User.tg_id == tg_id))
         if user:
             logger.info(f"Пользователь с tg_id={tg_id} найден.")
@@ -56,6 +61,7 @@ async def get_user(tg_id: int) -> Optional[User]:
         return user
 
 
+@timed(DB_QUERY_SECONDS)
 async def switch_user_short_format(tg_id: int) -> bool:
     """
     Переключает настройку формата вывода (short) для пользователя и возвращает новое значение.
@@ -68,20 +74,73 @@ async def switch_user_short_format(tg_id: int) -> bool:
     """
     async with async_session() as session:
         async with session.begin():
-            user = await get_user(tg_id=tg_id)
+            user = await session.scalar(select(User).where(User.tg_id == tg_id))
             if not user:
                 logger.error(f"Пользователь с tg_id={tg_id} не найден для переключения настроек.")
                 return False
             current_short = user.settings[0]["short"]
 
             new_short = not current_short
-            stmt_host = update(User).where(User.tg_id == tg_id).values(settings=[{"short": new_short}])
+            new_settings = [dict(user.settings[0], short=new_short)]
+            stmt_host = update(User).where(User.tg_id == tg_id).values(settings=new_settings)
             await session.execute(stmt_host)
             await session.commit()
             logger.info(f"Настройка short для пользователя с tg_id={tg_id} изменена на {new_short}.")
             return new_short
 
 
+REPORT_PERIODS = (None, "daily", "weekly")
+
+
+@timed(DB_QUERY_SECONDS)
+async def switch_user_report_period(tg_id: int) -> Optional[str]:
+    """
+    Переключает периодичность отчётов пользователя по кругу: выключены, ежедневно, еженедельно.
+
+    Args:
+        tg_id (int): Telegram ID пользователя.
+
+    Returns:
+        Optional[str]: Новая периодичность ("daily", "weekly") или None, если отчёты выключены.
+    """
+    async with async_session() as session:
+        async with session.begin():
+            user = await session.scalar(select(User).where(User.tg_id == tg_id))
+            if not user:
+                logger.error(f"Пользователь с tg_id={tg_id} не найден для переключения отчётов.")
+                return None
+            current = user.settings[0].get("report")
+            new_period = REPORT_PERIODS[(REPORT_PERIODS.index(current) + 1) % len(REPORT_PERIODS)]
+            new_settings = [dict(user.settings[0], report=new_period)]
+            await session.execute(update(User).where(User.tg_id == tg_id).values(settings=new_settings))
+            logger.info(f"Отчёты для пользователя с tg_id={tg_id} переключены на {new_period}.")
+            return new_period
+
+
+def _empty_metric_values() -> dict:
+    """Значения колонок Metric для хоста, который ещё не опрашивался."""
+    return {
+        "last_checked": datetime.now(),
+        "system_name": "",
+        "kernel_version": "",
+        "os_version": "",
+        "host_name": "",
+        "total_ram_gb": 0.0,
+        "total_ram_mb": 0.0,
+        "used_ram_gb": 0.0,
+        "used_ram_mb": 0.0,
+        "ram_percent": 0.0,
+        "total_swap_gb": 0.0,
+        "total_swap_mb": 0.0,
+        "used_swap_gb": 0.0,
+        "used_swap_mb": 0.0,
+        "swap_percent": 0.0,
+        "disks": [],
+        "components": [],
+    }
+
+
+@timed(DB_QUERY_SECONDS)
 async def add_host(user_id: int, name: str, ip: str, port: int) -> Tuple[bool, Optional[str]]:
     """
     Добавляет новый хост и связанные с ним метрики в базу данных.
@@ -103,26 +162,7 @@ async def add_host(user_id: int, name: str, ip: str, port: int) -> Tuple[bool, O
                 result = await session.execute(stmt)
                 host_id = result.inserted_primary_key[0]
 
-                stmt_metric = insert(Metric).values(
-                    host_id=host_id,
-                    last_checked=datetime.now(),
-                    system_name="",
-                    kernel_version="",
-                    os_version="",
-                    host_name="",
-                    total_ram_gb=0.0,
-                    total_ram_mb=0.0,
-                    used_ram_gb=0.0,
-                    used_ram_mb=0.0,
-                    ram_percent=0.0,
-                    total_swap_gb=0.0,
-                    total_swap_mb=0.0,
-                    used_swap_gb=0.0,
-                    used_swap_mb=0.0,
-                    swap_percent=0.0,
-                    disks=[],
-                    components=[]
-                )
+                stmt_metric = insert(Metric).values(host_id=host_id, **_empty_metric_values())
                 await session.execute(stmt_metric)
                 await session.commit()
                 logger.info(f"Хост с IP={ip} успешно добавлен для пользователя {user_id}.")
@@ -140,23 +180,199 @@ async def add_host(user_id: int, name: str, ip: str, port: int) -> Tuple[bool, O
             return False, f"❌ Неизвестная ошибка при добавлении хоста: {str(e)}"
 
 
-async def get_hosts(user_id: int) -> ScalarResult:
+async def _insert_hosts_skip_conflicts(session, dialect: str, user_id: int,
+                                       hosts: List[Tuple[str, str, int]]) -> List[Tuple[int, str]]:
+    """Многострочный INSERT ... ON CONFLICT DO NOTHING RETURNING для PostgreSQL и SQLite."""
+    if dialect == "postgresql":
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    stmt = (
+        dialect_insert(Host)
+        # name_key задаётся явно: Python-умолчание столбца не вызывается для многострочного VALUES
+        .values([{"user_id": user_id, "name": name, "name_key": host_name_key(name), "ip": ip, "port": port}
+                 for name, ip, port in hosts])
+        .on_conflict_do_nothing(index_elements=[Host.ip])
+        .returning(Host.id, Host.ip)
+    )
+    return [(host_id, ip) for host_id, ip in (await session.execute(stmt)).all()]
+
+
+async def _insert_hosts_one_by_one(session, user_id: int,
+                                   hosts: List[Tuple[str, str, int]]) -> List[Tuple[int, str]]:
+    """
+    Запасной путь для остальных СУБД: обычный INSERT на каждый хост в своей точке
+    сохранения, конфликт по IP пропускается через IntegrityError.
+    """
+    inserted = []
+    for name, ip, port in hosts:
+        try:
+            async with session.begin_nested():
+                result = await session.execute(insert(Host).values(user_id=user_id, name=name, ip=ip, port=port))
+        except IntegrityError:
+            continue
+        inserted.append((result.inserted_primary_key[0], ip))
+    return inserted
+
+
+@timed(DB_QUERY_SECONDS)
+async def add_hosts_bulk(user_id: int, hosts: List[Tuple[str, str, int]]) -> List[str]:
     """
-    Получает список всех хостов пользователя.
+    Добавляет пачку хостов многострочными INSERT без прерывания на конфликтах.
+    Для СУБД без ON CONFLICT хосты вставляются по одному с пропуском конфликтов.
 
     Args:
         user_id (int): Telegram ID пользователя.
+        hosts (List[Tuple[str, str, int]]): Список кортежей (имя, IP, порт).
 
     Returns:
-        ScalarResult: Результат запроса с объектами Host.
+        List[str]: IP-адреса, которые не были добавлены, так как уже существуют.
     """
-
+    if not hosts:
+        return []
     async with async_session() as session:
-        hosts = await session.scalars(select(Host).where(Host.user_id == user_id))
-        logger.info(f"Получено {hosts.rowcount} хостов для пользователя с tg_id={user_id}.")
+        async with session.begin():
+            dialect = session.bind.dialect.name
+            if dialect in ("postgresql", "sqlite"):
+                inserted = await _insert_hosts_skip_conflicts(session, dialect, user_id, hosts)
+            else:
+                inserted = await _insert_hosts_one_by_one(session, user_id, hosts)
+            if inserted:
+                empty_metric = _empty_metric_values()
+                await session.execute(
+                    insert(Metric).values([dict(empty_metric, host_id=host_id) for host_id, _ in inserted])
+                )
+    inserted_ips = {ip for _, ip in inserted}
+    conflicts = [ip for _, ip, _ in hosts if ip not in inserted_ips]
+    logger.info(f"Пользователю {user_id} добавлено {len(inserted)} хостов, конфликтов: {len(conflicts)}.")
+    return conflicts
+
+
+HOT_TAG = "hot"
+HOT_RAM_PERCENT = 90.0
+HOST_SORTS = {
+    "id": (Host.id,),
+    "name": (Host.name_key, Host.id),
+    "ram": (Metric.ram_percent.desc(), Host.id),
+    "swap": (Metric.swap_percent.desc(), Host.id),
+    "checked": (Host.last_checked.desc(), Host.id),
+}
+
+
+def _filter_hosts(query, dialect: str, user_id: int, tag: Optional[str], name_prefix: Optional[str]):
+    """Добавляет к запросу фильтры по пользователю, тегу и префиксу имени."""
+    query = query.where(Host.user_id == user_id)
+    if tag == HOT_TAG:
+        query = query.where(Metric.ram_percent > HOT_RAM_PERCENT)
+    elif tag:
+        query = query.where(Host.id.in_(select(HostTag.host_id).where(HostTag.tag == tag)))
+    if name_prefix:
+        # Сравнение идёт по name_key, поэтому регистр не важен на обоих диалектах
+        key = host_name_key(name_prefix)
+        if dialect == "postgresql":
+            # LIKE по префиксу обслуживается триграммным индексом ix_hosts_name_key_trgm
+            escaped = key.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+            query = query.where(Host.name_key.like(f"{escaped}%"))
+        else:
+            # Диапазон вместо LIKE, чтобы использовать B-tree индекс ix_hosts_user_name_key
+            query = query.where(Host.name_key >= key, Host.name_key < key + "\U0010ffff")
+    return query
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_hosts(user_id: int, tag: Optional[str] = None, name_prefix: Optional[str] = None,
+                    sort: str = "id", offset: int = 0, limit: Optional[int] = None) -> List[Host]:
+    """
+    Получает хосты пользователя с фильтрацией, сортировкой и постраничной выборкой на стороне БД.
+
+    Args:
+        user_id (int): Telegram ID пользователя.
+        tag (Optional[str]): Тег (группа). Тег HOT_TAG выбирает хосты с RAM выше HOT_RAM_PERCENT.
+        name_prefix (Optional[str]): Префикс имени хоста.
+        sort (str): Ключ HOST_SORTS: "id", "name", "ram", "swap" или "checked".
+        offset (int): Сколько хостов пропустить.
+        limit (Optional[int]): Максимум хостов, None — без ограничения.
+
+    Returns:
+        List[Host]: Объекты Host с загруженными метриками.
+    """
+
+    async with read_session() as session:
+        query = select(Host).outerjoin(Host.metric).options(contains_eager(Host.metric))
+        query = _filter_hosts(query, session.bind.dialect.name, user_id, tag, name_prefix)
+        query = query.order_by(*HOST_SORTS.get(sort, HOST_SORTS["id"])).offset(offset).limit(limit)
+        hosts = (await session.scalars(query)).all()
+        logger.info(f"Получено {len(hosts)} хостов для пользователя с tg_id={user_id}.")
         return hosts
 
 
+@timed(DB_QUERY_SECONDS)
+async def count_hosts(user_id: int, tag: Optional[str] = None, name_prefix: Optional[str] = None) -> int:
+    """
+    Считает хосты пользователя с теми же фильтрами, что и get_hosts.
+
+    Returns:
+        int: Количество хостов.
+    """
+    async with read_session() as session:
+        query = select(func.count(Host.id)).select_from(Host).outerjoin(Host.metric)
+        query = _filter_hosts(query, session.bind.dialect.name, user_id, tag, name_prefix)
+        return await session.scalar(query)
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_user_tags(user_id: int) -> List[str]:
+    """
+    Получает все теги хостов пользователя.
+
+    Args:
+        user_id (int): Telegram ID пользователя.
+
+    Returns:
+        List[str]: Отсортированный список тегов.
+    """
+    async with read_session() as session:
+        tags = await session.scalars(
+            select(HostTag.tag).join(Host, Host.id == HostTag.host_id)
+            .where(Host.user_id == user_id).distinct().order_by(HostTag.tag)
+        )
+        return list(tags)
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_host_tags(host_id: int) -> List[str]:
+    """
+    Получает теги хоста.
+
+    Args:
+        host_id (int): ID хоста.
+
+    Returns:
+        List[str]: Отсортированный список тегов.
+    """
+    async with read_session() as session:
+        tags = await session.scalars(select(HostTag.tag).where(HostTag.host_id == host_id).order_by(HostTag.tag))
+        return list(tags)
+
+
+@timed(DB_QUERY_SECONDS)
+async def set_host_tags(host_id: int, tags: List[str]) -> None:
+    """
+    Заменяет теги хоста.
+
+    Args:
+        host_id (int): ID хоста.
+        tags (List[str]): Новый набор тегов.
+    """
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(delete(HostTag).where(HostTag.host_id == host_id))
+            if tags:
+                await session.execute(insert(HostTag).values([{"host_id": host_id, "tag": tag} for tag in tags]))
+    logger.info(f"Теги хоста {host_id} обновлены: {tags}.")
+
+
+@timed(DB_QUERY_SECONDS)
 async def get_host_info(host_id: Optional[str] = None, host_ip: Optional[str] = None) -> Optional[Host]:
     """
     Получает информацию о хосте по его ID или IP-адресу, включая связанные метрики.
@@ -175,7 +391,7 @@ async def get_host_info(host_id: Optional[str] = None, host_ip: Optional[str] =
         logger.error("Необходимо указать host_id или host_ip.")
         raise ValueError("Необходимо указать host_id или host_ip")
 
-    async with async_session() as session:
+    async with read_session() as session:
         query = select(Host).options(joinedload(Host.metric, innerjoin=False))
 
         if host_id and host_ip:
@@ -193,6 +409,45 @@ async def get_host_info(host_id: Optional[str] = None, host_ip: Optional[str] =
         return host
 
 
+def _sample_values(host_id: int, metrics_data: dict, taken_at: Optional[datetime] = None) -> dict:
+    """Преобразует ответ агента в значения колонок MetricSample."""
+    memory = metrics_data["memory"]
+    return {
+        "host_id": host_id,
+        "taken_at": taken_at or datetime.now(),
+        "up": True,
+        "ram_percent": memory["ram_percent"],
+        "swap_percent": memory["swap_percent"],
+        "disk_percent": disk_usage_percent(metrics_data["disks"]),
+    }
+
+
+def _metric_values(metrics_data: dict) -> dict:
+    """Преобразует ответ агента в значения колонок Metric."""
+    system = metrics_data["system"]
+    memory = metrics_data["memory"]
+    return {
+        "last_checked": datetime.now(),
+        "system_name": system["name"],
+        "kernel_version": system["kernel_version"],
+        "os_version": system["os_version"],
+        "host_name": system["host_name"],
+        "total_ram_gb": memory["total_ram_gb"],
+        "total_ram_mb": memory["total_ram_mb"],
+        "used_ram_gb": memory["used_ram_gb"],
+        "used_ram_mb": memory["used_ram_mb"],
+        "ram_percent": memory["ram_percent"],
+        "total_swap_gb": memory["total_swap_gb"],
+        "total_swap_mb": memory["total_swap_mb"],
+        "used_swap_gb": memory["used_swap_gb"],
+        "used_swap_mb": memory["used_swap_mb"],
+        "swap_percent": memory["swap_percent"],
+        "disks": metrics_data["disks"],
+        "components": metrics_data["components"],
+    }
+
+
+@timed(DB_QUERY_SECONDS)
 async def update_host_metrics(host_ip: str, metrics_data: dict) -> None:
     """
     Обновляет метрики хоста в базе данных.
@@ -212,25 +467,227 @@ async def update_host_metrics(host_ip: str, metrics_data: dict) -> None:
                 logger.error(f"Хост с IP={host_ip} не найден для обновления метрик.")
                 raise ValueError(f"Хост с IP {host_ip} не найден")
 
-            stmt_metric = update(Metric).where(Metric.host_id == host.id).values(
-                last_checked=datetime.now(),
-                system_name=metrics_data["system"]["name"],
-                kernel_version=metrics_data["system"]["kernel_version"],
-                os_version=metrics_data["system"]["os_version"],
-                host_name=metrics_data["system"]["host_name"],
-                total_ram_gb=metrics_data["memory"]["total_ram_gb"],
-                total_ram_mb=metrics_data["memory"]["total_ram_mb"],
-                used_ram_gb=metrics_data["memory"]["used_ram_gb"],
-                used_ram_mb=metrics_data["memory"]["used_ram_mb"],
-                ram_percent=metrics_data["memory"]["ram_percent"],
-                total_swap_gb=metrics_data["memory"]["total_swap_gb"],
-                total_swap_mb=metrics_data["memory"]["total_swap_mb"],
-                used_swap_gb=metrics_data["memory"]["used_swap_gb"],
-                used_swap_mb=metrics_data["memory"]["used_swap_mb"],
-                swap_percent=metrics_data["memory"]["swap_percent"],
-                disks=metrics_data["disks"],
-                components=metrics_data["components"]
-            )
+            stmt_metric = update(Metric).where(Metric.host_id == host.id).values(**_metric_values(metrics_data))
             await session.execute(stmt_metric)
+            await session.execute(insert(MetricSample).values(**_sample_values(host.id, metrics_data)))
             await session.commit()
             logger.info(f"Метрики для хоста с IP={host_ip} успешно обновлены.")
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_all_hosts() -> List[Tuple[int, str, int]]:
+    """
+    Получает адреса всех хостов для фонового опроса.
+
+    Returns:
+        List[Tuple[int, str, int]]: Список кортежей (id, ip, port).
+    """
+    async with read_session() as session:
+        rows = await session.execute(select(Host.id, Host.ip, Host.port))
+        return [tuple(row) for row in rows]
+
+
+@timed(DB_QUERY_SECONDS)
+async def update_hosts_metrics(samples: List[Tuple[int, dict]]) -> None:
+    """
+    Обновляет метрики пачки хостов одной транзакцией (executemany).
+
+    Args:
+        samples (List[Tuple[int, dict]]): Список пар (ID хоста, словарь с данными метрик).
+    """
+    if not samples:
+        return
+    now = datetime.now()
+    host_ids = [host_id for host_id, _ in samples]
+    params = [dict(_metric_values(metrics_data), b_host_id=host_id) for host_id, metrics_data in samples]
+    history = [_sample_values(host_id, metrics_data, now) for host_id, metrics_data in samples]
+    metrics_table = Metric.__table__
+
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(update(Host).where(Host.id.in_(host_ids)).values(last_checked=now))
+            connection = await session.connection()
+            await connection.execute(
+                update(metrics_table).where(metrics_table.c.host_id == bindparam("b_host_id")),
+                params,
+            )
+            await connection.execute(insert(MetricSample.__table__), history)
+            logger.info(f"Метрики обновлены для {len(samples)} хостов.")
+
+
+@timed(DB_QUERY_SECONDS)
+async def touch_hosts(host_ids: List[int]) -> None:
+    """
+    Отмечает хосты проверенными без изменения метрик (агент ответил 304 Not Modified).
+
+    Args:
+        host_ids (List[int]): ID хостов.
+    """
+    if not host_ids:
+        return
+    now = datetime.now()
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(update(Host).where(Host.id.in_(host_ids)).values(last_checked=now))
+            await session.execute(update(Metric).where(Metric.host_id.in_(host_ids)).values(last_checked=now))
+            # Метрики не изменились: в историю идут последние сохранённые значения
+            await session.execute(insert(MetricSample).from_select(
+                ["host_id", "taken_at", "up", "ram_percent", "swap_percent"],
+                select(Metric.host_id, literal(now), literal(True), Metric.ram_percent, Metric.swap_percent)
+                .where(Metric.host_id.in_(host_ids)),
+            ))
+    logger.info(f"Время проверки обновлено для {len(host_ids)} хостов без изменений.")
+
+
+@timed(DB_QUERY_SECONDS)
+async def record_failed_polls(host_ids: List[int]) -> None:
+    """
+    Записывает в историю неудачные опросы (агент не ответил или ответил ошибкой).
+
+    Args:
+        host_ids (List[int]): ID хостов.
+    """
+    if not host_ids:
+        return
+    now = datetime.now()
+    async with async_session() as session:
+        async with session.begin():
+            await session.execute(
+                insert(MetricSample).values([{"host_id": host_id, "taken_at": now, "up": False}
+                                             for host_id in host_ids])
+            )
+    logger.info(f"Неудачные опросы записаны для {len(host_ids)} хостов.")
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_report_subscribers(period: str) -> List[int]:
+    """
+    Получает пользователей, подписанных на отчёты с заданной периодичностью.
+
+    Args:
+        period (str): "daily" или "weekly".
+
+    Returns:
+        List[int]: Telegram ID пользователей.
+    """
+    # Фильтр по settings[0].report выполняет БД: json_extract в SQLite, #>> в PostgreSQL
+    query = select(User.tg_id).where(User.settings[(0, "report")].as_string() == period).order_by(User.tg_id)
+    async with read_session() as session:
+        return list(await session.scalars(query))
+
+
+@timed(DB_QUERY_SECONDS)
+async def get_report_stats(user_ids: List[int], since: datetime) -> List[tuple]:
+    """
+    Считает сводку по истории опросов всех хостов пачки пользователей одним запросом.
+
+    Доступность, пики RAM и Swap агрегируются GROUP BY по хосту, первое и последнее
+    значение заполненности дисков выбираются оконной функцией row_number().
+
+    Args:
+        user_ids (List[int]): Telegram ID пользователей.
+        since (datetime): Начало периода.
+
+    Returns:
+        List[tuple]: Строки (user_id, host_id, name, samples, up_samples, peak_ram, peak_swap,
+        first_disk, last_disk), упорядоченные по пользователю и хосту. Для хостов без истории
+        samples равно 0, а остальные агрегаты — None.
+    """
+    if not user_ids:
+        return []
+    user_hosts = select(Host.id).where(Host.user_id.in_(user_ids))
+    in_period = (MetricSample.host_id.in_(user_hosts), MetricSample.taken_at >= since)
+
+    stats = (
+        select(
+            MetricSample.host_id,
+            func.count().label("samples"),
+            func.sum(case((MetricSample.up.is_(True), 1), else_=0)).label("up_samples"),
+            func.max(MetricSample.ram_percent).label("peak_ram"),
+            func.max(MetricSample.swap_percent).label("peak_swap"),
+        )
+        .where(*in_period)
+        .group_by(MetricSample.host_id)
+        .subquery()
+    )
+    ranked = (
+        select(
+            MetricSample.host_id,
+            MetricSample.disk_percent,
+            func.row_number().over(
+                partition_by=MetricSample.host_id, order_by=MetricSample.taken_at).label("first_rank"),
+            func.row_number().over(
+                partition_by=MetricSample.host_id, order_by=MetricSample.taken_at.desc()).label("last_rank"),
+        )
+        .where(*in_period, MetricSample.disk_percent.is_not(None))
+        .subquery()
+    )
+    disks = (
+        select(
+            ranked.c.host_id,
+            func.max(case((ranked.c.first_rank == 1, ranked.c.disk_percent))).label("first_disk"),
+            func.max(case((ranked.c.last_rank == 1, ranked.c.disk_percent))).label("last_disk"),
+        )
+        .where(or_(ranked.c.first_rank == 1, ranked.c.last_rank == 1))
+        .group_by(ranked.c.host_id)
+        .subquery()
+    )
+    query = (
+        select(
+            Host.user_id, Host.id, Host.name,
+            func.coalesce(stats.c.samples, 0), func.coalesce(stats.c.up_samples, 0),
+            stats.c.peak_ram, stats.c.peak_swap, disks.c.first_disk, disks.c.last_disk,
+        )
+        .outerjoin(stats, stats.c.host_id == Host.id)
+        .outerjoin(disks, disks.c.host_id == Host.id)
+        .where(Host.user_id.in_(user_ids))
+        .order_by(Host.user_id, Host.id)
+    )
+    async with read_session() as session:
+        rows = await session.execute(query)
+        return [tuple(row) for row in rows]
+
+
+@timed(DB_QUERY_SECONDS)
+async def prune_samples(before: datetime) -> int:
+    """
+    Удаляет историю опросов старше заданного момента.
+
+    Args:
+        before (datetime): Граница хранения.
+
+    Returns:
+        int: Количество удалённых отсчётов.
+    """
+    async with async_session() as session:
+        async with session.begin():
+            result = await session.execute(delete(MetricSample).where(MetricSample.taken_at < before))
+    logger.info(f"Удалено {result.rowcount} отсчётов истории опросов.")
+    return result.rowcount
+
+
+async def stream_hosts_export(user_id: int, batch_size: int = 500) -> AsyncIterator[Row]:
+    """
+    Потоково отдаёт хосты пользователя вместе с последними метриками.
+
+    Строки читаются с сервера БД порциями по batch_size, весь список в память не загружается.
+
+    Args:
+        user_id (int): Telegram ID пользователя.
+        batch_size (int): Размер порции строк.
+
+    Yields:
+        Row: Строка (name, ip, port, last_checked, host_name, ram_percent, swap_percent).
+    """
+    query = (
+        select(Host.name, Host.ip, Host.port, Host.last_checked,
+               Metric.host_name, Metric.ram_percent, Metric.swap_percent)
+        .outerjoin(Metric, Metric.host_id == Host.id)
+        .where(Host.user_id == user_id)
+        .order_by(Host.id)
+        .execution_options(yield_per=batch_size)
+    )
+    async with read_session() as session:
+        result = await session.stream(query)
+        async for row in result:
+            yield row
@@ -1,25 +1,53 @@
+import asyncio
 import logging
-from aiogram import types, Router, F
-from aiogram.filters import CommandStart
+import re
+from aiogram import types, Router, F, html
+from aiogram.dispatcher.event.handler import HandlerObject
+from aiogram.filters import CommandStart, ExceptionTypeFilter
 from aiogram.fsm.state import StatesGroup, State
 from aiogram.fsm.context import FSMContext
 
 from app.database.requests import set_user, add_host, get_host_info, update_host_metrics, get_user, \
-    switch_user_short_format
+    switch_user_short_format, add_hosts_bulk, touch_hosts, get_hosts, get_host_tags, set_host_tags, \
+    update_hosts_metrics, HOT_TAG, record_failed_polls, switch_user_report_period
+from app.database.models import NAME_MAX_LENGTH, TAG_MAX_LENGTH
+from app.callbacks import CallbackHandlers, HostCallback, PollCallback, HostsPageCallback, HostTagsCallback, \
+    GroupPollCallback
 from app.utils.ip_valid import is_valid_ip
-from app.utils.send_request import send_request
+from app.utils.send_request import send_request, NOT_MODIFIED, commit_etag
+from app.utils.samples import metrics_problem
 from app.utils.format_host_info import format_host_info
 from app.utils.message_utils import delete_and_update_message
+from app.utils.background import run_in_background
+from app.utils.event_isolation import ChatQueueFull
+from app.utils.host_transfer import import_hosts, HostsExportFile
+from app.utils.discovery import parse_scan_target, scan_network, ALLOWED_NETWORKS
 from app.keyboards import inline_main_button, inline_cancel_button, inline_cancel_and_back_button, hosts, \
-    create_send_request_button_and_inline_menu_button, inline_menu_button, inline_settings_button
+    create_send_request_button_and_inline_menu_button, inline_menu_button, inline_settings_button, \
+    inline_cancel_scan_button
 from app.messages import WELCOME_MESSAGE, HOST_NAME_PROMPT, IP_PROMPT, PORT_PROMPT, INVALID_IP, INVALID_PORT, \
     HOST_ADDED, HOST_EXISTS, SETTINGS_MESSAGE, SWITCH_MESSAGE, ERROR_ADD_HOST, CANCEL_ADD_HOST, BACK_TO_MENU, \
-    HOSTS_MESSAGE, NO_REQUEST_INFO, WAITING_FOR_RESPONSE, ERROR_FETCHING_DATA
+    HOSTS_MESSAGE, NO_REQUEST_INFO, WAITING_FOR_RESPONSE, ERROR_FETCHING_DATA, POLL_IN_PROGRESS, TOO_MANY_REQUESTS, \
+    HOST_NOT_FOUND, IMPORT_PROMPT, IMPORT_UNSUPPORTED_FILE, IMPORT_IN_PROGRESS, IMPORT_RESULT, IMPORT_FAILED, \
+    EXPORT_CAPTION, SCAN_PROMPT, INVALID_SCAN_TARGET, SCAN_ALREADY_RUNNING, SCAN_PROGRESS, SCAN_FINISHED, POLL_FAILED, \
+    SCAN_CANCELLED, SCAN_FAILED, SEARCH_PROMPT, HOSTS_FILTERED_MESSAGE, TAGS_PROMPT, INVALID_TAGS, TAGS_UPDATED, \
+    NO_TAGS, HOST_TAGS, GROUP_POLL_STARTED, GROUP_POLL_FINISHED, GROUP_POLL_FAILED, REPORT_SWITCH_MESSAGE, \
+    REPORT_PERIOD_NAMES, SCAN_DISABLED, SCAN_ALLOWED
 
 router = Router()
+callback_handlers = CallbackHandlers()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Пары (chat_id, ip), для которых уже выполняется фоновый запрос к агенту
+_polls_in_progress = set()
+# Сканирования подсетей по chat_id
+_scans = {}
+SCAN_PROGRESS_INTERVAL = 2.0
+GROUP_POLL_CONCURRENCY = 32
+SEARCH_QUERY_MAX_BYTES = 24
+TAG_PATTERN = re.compile(rf"[a-z0-9_-]{{1,{TAG_MAX_LENGTH}}}")
+
 
 class Host(StatesGroup):
     bot_message_id = State()
@@ -28,6 +56,22 @@ class Host(StatesGroup):
     port = State()
 
 
+class HostImport(StatesGroup):
+    file = State()
+
+
+class HostScan(StatesGroup):
+    target = State()
+
+
+class HostSearch(StatesGroup):
+    query = State()
+
+
+class HostTags(StatesGroup):
+    tags = State()
+
+
 @router.message(CommandStart())
 async def cmd_start(message: types.Message):
     logger.info(f"User {message.from_user.id} started the bot.")
@@ -38,7 +82,7 @@ async def cmd_start(message: types.Message):
     )
 
 
-@router.callback_query(F.data == "to_main")
+@callback_handlers.data("to_main")
 async def menu(callback: types.CallbackQuery):
     await callback.answer()
     await callback.message.edit_text(
@@ -47,7 +91,7 @@ async def menu(callback: types.CallbackQuery):
     )
 
 
-@router.callback_query(F.data == "settings")
+@callback_handlers.data("settings")
 async def settings(callback: types.CallbackQuery):
     await callback.answer()
     await callback.message.edit_text(
@@ -56,7 +100,7 @@ async def settings(callback: types.CallbackQuery):
     )
 
 
-@router.callback_query(F.data == "switch_short")
+@callback_handlers.data("switch_short")
 async def settings(callback: types.CallbackQuery):
     await callback.answer()
     new_short = await switch_user_short_format(callback.from_user.id)
@@ -70,8 +114,18 @@ async def settings(callback: types.CallbackQuery):
     )
 
 
+@callback_handlers.data("switch_report")
+async def switch_report(callback: types.CallbackQuery):
+    await callback.answer()
+    new_period = await switch_user_report_period(callback.from_user.id)
+    await callback.message.edit_text(
+        text=f"{REPORT_SWITCH_MESSAGE} {REPORT_PERIOD_NAMES[new_period]}",
+        reply_markup=inline_settings_button()
+    )
+
+
 # Добавление хоста
-@router.callback_query(F.data == "add_host")
+@callback_handlers.data("add_host")
 async def add_host_name(callback: types.CallbackQuery, state: FSMContext):
     await state.set_state(Host.name)
     msg = await callback.message.edit_text(
@@ -113,7 +167,7 @@ async def add_host_port(message: types.Message, state: FSMContext):
     await delete_and_update_message(message.bot, message.chat.id, bot_message_id, state, msg)
 
 
-@router.callback_query(F.data == "back_to_name")
+@callback_handlers.data("back_to_name")
 async def back_to_name(callback: types.CallbackQuery, state: FSMContext):
     await state.set_state(Host.name)
     await callback.message.edit_text(
@@ -170,7 +224,7 @@ async def add_host_finally(message: types.Message, state: FSMContext):
         await state.clear()
 
 
-@router.callback_query(F.data == "back_to_ip")
+@callback_handlers.data("back_to_ip")
 async def back_to_ip(callback: types.CallbackQuery, state: FSMContext):
     await state.set_state(Host.ip)
     await callback.message.edit_text(
@@ -179,7 +233,7 @@ async def back_to_ip(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
-@router.callback_query(F.data == "cancel_add_host")
+@callback_handlers.data("cancel_add_host")
 async def cancel_add_host(callback: types.CallbackQuery, state: FSMContext):
     await state.clear()
     await callback.message.edit_text(
@@ -193,8 +247,156 @@ async def cancel_add_host(callback: types.CallbackQuery, state: FSMContext):
     await callback.answer()
 
 
+# Импорт и экспорт хостов
+IMPORT_FORMATS = {".csv": "csv", ".json": "json", ".jsonl": "jsonl"}
+
+
+@callback_handlers.data("import_hosts")
+async def import_hosts_prompt(callback: types.CallbackQuery, state: FSMContext):
+    await state.set_state(HostImport.file)
+    await callback.message.edit_text(
+        text=IMPORT_PROMPT,
+        reply_markup=inline_cancel_button()
+    )
+    await callback.answer()
+
+
+@router.message(HostImport.file, F.document)
+async def import_hosts_file(message: types.Message, state: FSMContext):
+    file_name = (message.document.file_name or "").lower()
+    fmt = next((fmt for ext, fmt in IMPORT_FORMATS.items() if file_name.endswith(ext)), None)
+    if fmt is None:
+        await message.reply(text=IMPORT_UNSUPPORTED_FILE, reply_markup=inline_cancel_button())
+        return
+    await state.clear()
+    progress = await message.answer(text=IMPORT_IN_PROGRESS)
+    try:
+        file = await message.bot.get_file(message.document.file_id)
+        url = message.bot.session.api.file_url(message.bot.token, file.file_path)
+        added, skipped, problems = await import_hosts(
+            user_id=message.from_user.id,
+            chunks=message.bot.session.stream_content(url),
+            fmt=fmt
+        )
+    except Exception as e:
+        logger.error(f"Error importing hosts: {e}")
+        await progress.edit_text(text=IMPORT_FAILED, reply_markup=inline_main_button())
+        return
+    text = IMPORT_RESULT.format(added=added, skipped=skipped)
+    if problems:
+        text += "\n\n" + "\n".join(html.quote(problem) for problem in problems)
+    await progress.edit_text(text=text, reply_markup=inline_main_button())
+
+
+@router.message(HostImport.file)
+async def import_hosts_not_file(message: types.Message):
+    await message.reply(text=IMPORT_PROMPT, reply_markup=inline_cancel_button())
+
+
+@callback_handlers.data("export_hosts")
+async def export_hosts(callback: types.CallbackQuery):
+    await callback.answer()
+    await callback.message.answer_document(
+        document=HostsExportFile(user_id=callback.from_user.id),
+        caption=EXPORT_CAPTION
+    )
+
+
+# Сканирование подсети
+@callback_handlers.data("scan_network")
+async def scan_network_prompt(callback: types.CallbackQuery, state: FSMContext):
+    if not ALLOWED_NETWORKS:
+        await callback.answer(text=SCAN_DISABLED, show_alert=True)
+        return
+    await state.set_state(HostScan.target)
+    await callback.message.edit_text(
+        text=SCAN_PROMPT + SCAN_ALLOWED.format(
+            networks=", ".join(f"<code>{network}</code>" for network in ALLOWED_NETWORKS)),
+        reply_markup=inline_cancel_button()
+    )
+    await callback.answer()
+
+
+@router.message(HostScan.target)
+async def scan_network_start(message: types.Message, state: FSMContext):
+    try:
+        network, port = parse_scan_target(message.text or "")
+    except ValueError as e:
+        await message.reply(
+            text=INVALID_SCAN_TARGET.format(error=html.quote(str(e))),
+            reply_markup=inline_cancel_button())
+        return
+    await state.clear()
+    if message.chat.id in _scans:
+        await message.answer(text=SCAN_ALREADY_RUNNING, reply_markup=inline_main_button())
+        return
+    target = f"{network}:{port}"
+    progress = await message.answer(
+        text=SCAN_PROGRESS.format(target=target, checked=0, total="…", found=0),
+        reply_markup=inline_cancel_scan_button()
+    )
+    _scans[message.chat.id] = run_in_background(
+        _scan_and_register(progress, message.from_user.id, network, port),
+        name=f"scan-{target}"
+    )
+
+
+async def _scan_and_register(progress: types.Message, user_id: int, network, port: int):
+    """
+    Сканирует подсеть, регистрирует ответивших агентов и пишет прогресс в сообщение.
+    При отмене регистрируются агенты, найденные до неё.
+    """
+    target = f"{network}:{port}"
+    loop = asyncio.get_running_loop()
+    last_update = loop.time()
+
+    async def on_progress(checked: int, total: int, found: int):
+        nonlocal last_update
+        if loop.time() - last_update < SCAN_PROGRESS_INTERVAL:
+            return
+        last_update = loop.time()
+        try:
+            await progress.edit_text(
+                text=SCAN_PROGRESS.format(target=target, checked=checked, total=total, found=found),
+                reply_markup=inline_cancel_scan_button())
+        except Exception as e:
+            logger.warning(f"Failed to update scan progress: {e}")
+
+    async def register() -> int:
+        conflicts = await add_hosts_bulk(user_id, [(host_name[:NAME_MAX_LENGTH], ip, port) for ip, host_name in found])
+        return len(found) - len(conflicts)
+
+    found = []
+    try:
+        await scan_network(network, port, on_progress=on_progress, found=found)
+        text = SCAN_FINISHED.format(target=target, found=len(found), added=await register())
+    except asyncio.CancelledError:
+        try:
+            added = await register()
+        except Exception as e:
+            logger.error(f"Error registering partial scan of {target}: {e}")
+            added = 0
+        await progress.edit_text(text=SCAN_CANCELLED.format(found=len(found), added=added),
+                                 reply_markup=inline_main_button())
+        raise
+    except Exception as e:
+        logger.error(f"Error scanning {target}: {e}")
+        text = SCAN_FAILED
+    finally:
+        _scans.pop(progress.chat.id, None)
+    await progress.edit_text(text=text, reply_markup=inline_main_button())
+
+
+@callback_handlers.data("cancel_scan")
+async def cancel_scan(callback: types.CallbackQuery):
+    task = _scans.get(callback.message.chat.id)
+    if task is not None:
+        task.cancel()
+    await callback.answer()
+
+
 # Работа с хостами
-@router.callback_query(F.data == "list_hosts")
+@callback_handlers.data("list_hosts")
 async def list_hosts(callback: types.CallbackQuery):
     await callback.message.edit_text(
         text=HOSTS_MESSAGE,
@@ -202,50 +404,204 @@ async def list_hosts(callback: types.CallbackQuery):
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("hosts_page_"))
-async def handle_hosts_pagination(callback: types.CallbackQuery):
-    page = int(callback.data.split("_")[2])
+@callback_handlers.factory(HostsPageCallback)
+async def handle_hosts_pagination(callback: types.CallbackQuery, callback_data: HostsPageCallback):
+    page = callback_data.page
+    text = HOSTS_FILTERED_MESSAGE.format(query=html.quote(callback_data.query)) if callback_data.query \
+        else HOSTS_MESSAGE
     await callback.message.edit_text(
-        text=HOSTS_MESSAGE,
-        reply_markup=await hosts(user_id=str(callback.from_user.id), page=page))
+        text=text,
+        reply_markup=await hosts(user_id=str(callback.from_user.id), page=page, tag=callback_data.tag,
+                                 sort=callback_data.sort, query=callback_data.query))
     await callback.answer()
 
 
-@router.callback_query(F.data.startswith("host_"))
-async def info_host(callback: types.CallbackQuery):
+@callback_handlers.data("search_hosts")
+async def search_hosts_prompt(callback: types.CallbackQuery, state: FSMContext):
+    await state.set_state(HostSearch.query)
+    await callback.message.edit_text(
+        text=SEARCH_PROMPT,
+        reply_markup=inline_cancel_button()
+    )
+    await callback.answer()
+
+
+@router.message(HostSearch.query)
+async def search_hosts(message: types.Message, state: FSMContext):
+    await state.clear()
+    # Префикс попадает в callback_data, поэтому без разделителя и не длиннее SEARCH_QUERY_MAX_BYTES
+    query = (message.text or "").strip().replace(":", "")
+    while len(query.encode()) > SEARCH_QUERY_MAX_BYTES:
+        query = query[:-1]
+    await message.answer(
+        text=HOSTS_FILTERED_MESSAGE.format(query=html.quote(query)) if query else HOSTS_MESSAGE,
+        reply_markup=await hosts(user_id=str(message.from_user.id), page=1, query=query))
+
+
+@callback_handlers.factory(HostTagsCallback)
+async def host_tags_prompt(callback: types.CallbackQuery, callback_data: HostTagsCallback, state: FSMContext):
+    tags = await get_host_tags(callback_data.host_id)
+    await state.set_state(HostTags.tags)
+    await state.update_data(host_id=callback_data.host_id)
+    await callback.message.edit_text(
+        text=TAGS_PROMPT.format(tags=", ".join(tags) or NO_TAGS),
+        reply_markup=inline_cancel_button()
+    )
     await callback.answer()
-    host_id = callback.data.split("_")[1]
-    info = await get_host_info(host_id=host_id)
+
+
+@router.message(HostTags.tags)
+async def host_tags_set(message: types.Message, state: FSMContext):
+    raw = (message.text or "").strip()
+    tags = [] if raw == "-" else sorted({tag.lower() for tag in re.split(r"[\s,]+", raw) if tag})
+    if any(not TAG_PATTERN.fullmatch(tag) or tag == HOT_TAG for tag in tags):
+        await message.reply(
+            text=INVALID_TAGS.format(max_length=TAG_MAX_LENGTH, reserved=HOT_TAG),
+            reply_markup=inline_cancel_button())
+        return
+    data = await state.get_data()
+    await state.clear()
+    await set_host_tags(data["host_id"], tags)
+    await message.answer(
+        text=TAGS_UPDATED.format(tags=", ".join(tags) or NO_TAGS),
+        reply_markup=inline_main_button()
+    )
+
+
+@callback_handlers.factory(GroupPollCallback)
+async def group_poll(callback: types.CallbackQuery, callback_data: GroupPollCallback):
+    group_hosts = list(await get_hosts(callback.from_user.id, tag=callback_data.tag))
+    poll_key = (callback.message.chat.id, f"#{callback_data.tag}")
+    if poll_key in _polls_in_progress:
+        await callback.answer(text=POLL_IN_PROGRESS)
+        return
+    await callback.answer()
+    await callback.message.edit_text(
+        text=GROUP_POLL_STARTED.format(count=len(group_hosts), tag=callback_data.tag)
+    )
+    _polls_in_progress.add(poll_key)
+    run_in_background(
+        _poll_group(callback.message, callback.from_user.id, callback_data.tag, group_hosts, poll_key),
+        name=f"group-poll-{callback_data.tag}")
+
+
+async def _poll_group(message: types.Message, user_id: int, tag: str, group_hosts: list, poll_key: tuple):
+    """Параллельно опрашивает хосты группы и сохраняет результаты одной пачкой."""
+    semaphore = asyncio.Semaphore(GROUP_POLL_CONCURRENCY)
+
+    async def poll(host):
+        async with semaphore:
+            return host.id, await send_request(host.ip, str(host.port), conditional=True)
+
+    try:
+        results = await asyncio.gather(*(poll(host) for host in group_hosts))
+        samples, unchanged, failed = [], [], []
+        for host_id, data in results:
+            if data is NOT_MODIFIED:
+                unchanged.append(host_id)
+            elif isinstance(data, dict) and metrics_problem(data) is None:
+                samples.append((host_id, data))
+            else:
+                # Ответ без полей метрик уронил бы сохранение всей группы, поэтому считается ошибкой
+                failed.append(host_id)
+        await update_hosts_metrics(samples)
+        saved = {host_id for host_id, _ in samples}
+        for host in group_hosts:
+            if host.id in saved:
+                commit_etag(host.ip, str(host.port))
+        await touch_hosts(unchanged)
+        await record_failed_polls(failed)
+        await message.edit_text(
+            text=GROUP_POLL_FINISHED.format(tag=tag, updated=len(samples), unchanged=len(unchanged),
+                                            failed=len(failed)),
+            reply_markup=await hosts(user_id=str(user_id), page=1, tag=tag))
+    except Exception as e:
+        logger.error(f"Error polling group #{tag}: {e}")
+        await message.edit_text(text=GROUP_POLL_FAILED.format(tag=tag), reply_markup=inline_menu_button())
+    finally:
+        _polls_in_progress.discard(poll_key)
+
+
+@callback_handlers.factory(HostCallback)
+async def info_host(callback: types.CallbackQuery, callback_data: HostCallback):
+    await callback.answer()
+    info = await get_host_info(host_id=callback_data.host_id)
     if info.last_checked is None:
         await callback.message.edit_text(
             text=NO_REQUEST_INFO,
-            reply_markup=create_send_request_button_and_inline_menu_button(ip=info.ip, port=info.port)
+            reply_markup=create_send_request_button_and_inline_menu_button(host_id=info.id)
         )
         return
     _settings = await get_user(callback.from_user.id)
     short = _settings.settings[0]["short"]
     text = format_host_info(info=info, short=short)
+    tags = await get_host_tags(info.id)
+    if tags:
+        text += HOST_TAGS.format(tags=", ".join(f"#{tag}" for tag in tags))
     await callback.message.edit_text(
         text=text,
-        reply_markup=create_send_request_button_and_inline_menu_button(ip=info.ip,port=info.port))
+        reply_markup=create_send_request_button_and_inline_menu_button(host_id=info.id))
 
 
-@router.callback_query(F.data.startswith("send_request_"))
-async def send_request_handler(callback: types.CallbackQuery):
+@callback_handlers.factory(PollCallback)
+async def send_request_handler(callback: types.CallbackQuery, callback_data: PollCallback):
+    info = await get_host_info(host_id=callback_data.host_id)
+    if info is None:
+        await callback.answer(text=HOST_NOT_FOUND)
+        return
+    ip, port, host_id = info.ip, str(info.port), info.id
+    poll_key = (callback.message.chat.id, ip)
+    if poll_key in _polls_in_progress:
+        await callback.answer(text=POLL_IN_PROGRESS)
+        return
     await callback.answer()
-    ip, port = callback.data.split("_")[2], callback.data.split("_")[3]
     msg = WAITING_FOR_RESPONSE + f"{ip}:{port} ..."
     await callback.message.edit_text(
         text=msg
     )
-    metrics_data = await send_request(ip, port)
-    msg = ERROR_FETCHING_DATA + f"{metrics_data}"
-    if isinstance(metrics_data, str):
-        text = msg
-    else:
-        await update_host_metrics(host_ip=ip, metrics_data=metrics_data)
-        info = await get_host_info(host_ip=ip)
-        _settings = await get_user(callback.from_user.id)
-        short = _settings.settings[0]["short"]
-        text = format_host_info(info=info, short=short)
-    await callback.message.edit_text(text=text, reply_markup=inline_menu_button())
+    _polls_in_progress.add(poll_key)
+    run_in_background(_poll_and_report(callback.message, callback.from_user.id, host_id, ip, port, poll_key),
+                      name=f"poll-{ip}:{port}")
+
+
+async def _poll_and_report(message: types.Message, user_id: int, host_id: int, ip: str, port: str,
+                           poll_key: tuple):
+    """Опрашивает агента вне хендлера и редактирует сообщение, когда придёт ответ."""
+    try:
+        metrics_data = await send_request(ip, port, conditional=True)
+        if isinstance(metrics_data, dict):
+            problem = metrics_problem(metrics_data)
+            if problem is not None:
+                metrics_data = f"некорректный ответ агента: {problem}"
+        if isinstance(metrics_data, str):
+            await record_failed_polls([host_id])
+            text = ERROR_FETCHING_DATA + metrics_data
+        else:
+            if metrics_data is NOT_MODIFIED:
+                await touch_hosts([host_id])
+            else:
+                await update_host_metrics(host_ip=ip, metrics_data=metrics_data)
+                commit_etag(ip, port)
+            info = await get_host_info(host_ip=ip)
+            _settings = await get_user(user_id)
+            short = _settings.settings[0]["short"]
+            text = format_host_info(info=info, short=short)
+        await message.edit_text(text=text, reply_markup=inline_menu_button())
+    except Exception as e:
+        logger.error(f"Error polling host {ip}:{port}: {e}")
+        await message.edit_text(text=POLL_FAILED, reply_markup=inline_menu_button())
+    finally:
+        _polls_in_progress.discard(poll_key)
+
+
+@router.callback_query(lambda callback, callback_handler=None: callback_handler is not None)
+async def dispatch_callback(callback: types.CallbackQuery, callback_handler: HandlerObject, **data):
+    """Единственный хендлер callback_query: вызывает обработчик, найденный CallbackDataMiddleware."""
+    return await callback_handler.call(callback, **data)
+
+
+@router.errors(ExceptionTypeFilter(ChatQueueFull))
+async def chat_queue_full(event: types.ErrorEvent):
+    logger.warning(f"Апдейт {event.update.update_id} отброшен: {event.exception}")
+    if event.update.callback_query:
+        await event.update.callback_query.answer(text=TOO_MANY_REQUESTS)
@@ -2,7 +2,8 @@ from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
 from aiogram.utils.keyboard import InlineKeyboardBuilder
 from math import ceil
 
-from app.database.requests import get_hosts
+from app.callbacks import HostCallback, PollCallback, HostsPageCallback, HostTagsCallback, GroupPollCallback
+from app.database.requests import get_hosts, count_hosts, get_user_tags, HOT_TAG
 
 
 def inline_menu_button() -> InlineKeyboardMarkup:
@@ -18,6 +19,7 @@ def inline_settings_button() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="Переключить формат информации", callback_data="switch_short")],
+            [InlineKeyboardButton(text="Периодичность отчётов", callback_data="switch_report")],
             [InlineKeyboardButton(text="На главную", callback_data="to_main")]
         ]
     )
@@ -31,6 +33,11 @@ def inline_main_button() -> InlineKeyboardMarkup:
                 InlineKeyboardButton(text="Добавить хост", callback_data="add_host"),
                 InlineKeyboardButton(text="Список хостов", callback_data="list_hosts"),
             ],
+            [
+                InlineKeyboardButton(text="Импорт хостов", callback_data="import_hosts"),
+                InlineKeyboardButton(text="Экспорт хостов", callback_data="export_hosts"),
+            ],
+            [InlineKeyboardButton(text="Сканировать подсеть", callback_data="scan_network")],
             [InlineKeyboardButton(text="Команды", callback_data="commands")],
             [InlineKeyboardButton(text="Разработчик", url="https://t.me/sblro4eeek")],
         ]
@@ -46,20 +53,30 @@ def inline_cancel_button() -> InlineKeyboardMarkup:
     )
 
 
-def create_send_request_button(ip: str, port: int) -> InlineKeyboardMarkup:
+def inline_cancel_scan_button() -> InlineKeyboardMarkup:
+    """Создаёт инлайн-кнопку остановки сканирования."""
+    return InlineKeyboardMarkup(
+        inline_keyboard=[
+            [InlineKeyboardButton(text="Остановить", callback_data="cancel_scan")]
+        ]
+    )
+
+
+def create_send_request_button(host_id: int) -> InlineKeyboardMarkup:
     """Создаёт инлайн-кнопку для отправки запроса."""
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="Отправить запрос", callback_data=f"send_request_{ip}_{port}")]
+            [InlineKeyboardButton(text="Отправить запрос", callback_data=PollCallback(host_id=host_id).pack())]
         ]
     )
 
 
-def create_send_request_button_and_inline_menu_button(ip: str, port: int) -> InlineKeyboardMarkup:
-    """Создаёт инлайн-клавиатуру для отправки запроса и возврата."""
+def create_send_request_button_and_inline_menu_button(host_id: int) -> InlineKeyboardMarkup:
+    """Создаёт инлайн-клавиатуру для отправки запроса, изменения тегов и возврата."""
     return InlineKeyboardMarkup(
         inline_keyboard=[
-            [InlineKeyboardButton(text="Отправить запрос", callback_data=f"send_request_{ip}_{port}")],
+            [InlineKeyboardButton(text="Отправить запрос", callback_data=PollCallback(host_id=host_id).pack())],
+            [InlineKeyboardButton(text="🏷 Теги", callback_data=HostTagsCallback(host_id=host_id).pack())],
             [InlineKeyboardButton(text="На главную", callback_data="to_main")]
         ]
     )
@@ -72,32 +89,60 @@ def inline_cancel_and_back_button(callback_cancel: str, callback_back: str):
     ])
 
 
-async def hosts(user_id: str, page: int = 1) -> InlineKeyboardMarkup:
-    all_hosts = list(await get_hosts(int(user_id)))
+HOSTS_PER_PAGE = 8
+HOST_SORT_BUTTONS = (("id", "По порядку"), ("name", "По имени"), ("ram", "RAM ↓"), ("swap", "Swap ↓"))
+
+
+async def hosts(user_id: str, page: int = 1, tag: str = "", sort: str = "id",
+                query: str = "") -> InlineKeyboardMarkup:
+    user_id = int(user_id)
+    total = await count_hosts(user_id, tag=tag or None, name_prefix=query or None)
     keyboard = InlineKeyboardBuilder()
 
-    if not all_hosts:
+    def page_button(text: str, **changes) -> InlineKeyboardButton:
+        params = dict(page=page, tag=tag, sort=sort, query=query)
+        params.update(changes)
+        return InlineKeyboardButton(text=text, callback_data=HostsPageCallback(**params).pack())
+
+    if not total:
         keyboard.add(InlineKeyboardButton(text="Нет хостов", callback_data="no_hosts"))
     else:
-        HOSTS_PER_PAGE = 8
-        total_pages = ceil(len(all_hosts) / HOSTS_PER_PAGE)
+        total_pages = ceil(total / HOSTS_PER_PAGE)
         page = max(1, min(page, total_pages))
 
-        start_idx = (page - 1) * HOSTS_PER_PAGE
-        end_idx = start_idx + HOSTS_PER_PAGE
-        current_hosts = all_hosts[start_idx:end_idx]
-
+        current_hosts = await get_hosts(user_id, tag=tag or None, name_prefix=query or None, sort=sort,
+                                        offset=(page - 1) * HOSTS_PER_PAGE, limit=HOSTS_PER_PAGE)
         for host in current_hosts:
-            keyboard.add(InlineKeyboardButton(text=host.name, callback_data=f"host_{host.id}"))
+            keyboard.add(InlineKeyboardButton(text=host.name, callback_data=HostCallback(host_id=host.id).pack()))
         keyboard.adjust(2)
 
         nav_buttons = []
         if page > 1:
-            nav_buttons.append(InlineKeyboardButton(text="⬅️ Назад", callback_data=f"hosts_page_{page - 1}"))
+            nav_buttons.append(page_button("⬅️ Назад", page=page - 1))
         if page < total_pages:
-            nav_buttons.append(InlineKeyboardButton(text="Вперёд ➡️", callback_data=f"hosts_page_{page + 1}"))
+            nav_buttons.append(page_button("Вперёд ➡️", page=page + 1))
         if nav_buttons:
             keyboard.row(*nav_buttons)
 
+        keyboard.row(*(
+            page_button(f"• {text}" if key == sort else text, page=1, sort=key)
+            for key, text in HOST_SORT_BUTTONS
+        ))
+
+    tag_buttons = [
+        page_button(f"• #{user_tag}" if user_tag == tag else f"#{user_tag}", page=1, tag=user_tag)
+        for user_tag in [HOT_TAG] + await get_user_tags(user_id)
+    ]
+    for start in range(0, len(tag_buttons), 4):
+        keyboard.row(*tag_buttons[start:start + 4])
+
+    action_buttons = [InlineKeyboardButton(text="🔍 Поиск", callback_data="search_hosts")]
+    if tag or query:
+        action_buttons.append(page_button("Сбросить фильтр", page=1, tag="", query=""))
+    if tag and total:
+        action_buttons.append(InlineKeyboardButton(
+            text="Опросить группу", callback_data=GroupPollCallback(tag=tag).pack()))
+    keyboard.row(*action_buttons)
+
     keyboard.row(InlineKeyboardButton(text="На главную", callback_data="to_main"))
     return keyboard.as_markup()
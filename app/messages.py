@@ -12,6 +12,10 @@ SWITCH_MESSAGE = "🔄 Формат переключен на "
 NO_REQUEST_INFO = "❓ Вы не делали запрос на информацию!"
 WAITING_FOR_RESPONSE = "⏳ Получаем ответ от "
 ERROR_FETCHING_DATA = "❌ Не удалось получить данные: "
+POLL_FAILED = "❌ Не удалось сохранить ответ хоста. Попробуй позже."
+HOST_NOT_FOUND = "❌ Хост не найден."
+POLL_IN_PROGRESS = "⏳ Запрос к этому хосту уже выполняется."
+TOO_MANY_REQUESTS = "⏳ Слишком много запросов, подождите немного."
 HOSTS_MESSAGE = "💻 Ваши хосты:"
 HOST_NAME_PROMPT = "🔧 Введите имя для вашего хоста"
 IP_PROMPT = "✅ Отлично! Теперь отправь IP твоего хоста"
@@ -27,3 +31,64 @@ HOST_ADDED = (
     "🔌 Порт: <code>{port}</code>"
 )
 HOST_EXISTS = "❌ Хост с таким IP и портом уже существует!"
+IMPORT_PROMPT = (
+    "📥 Отправьте файл с хостами:\n"
+    "• <b>CSV</b> с колонками <code>name,ip,port</code>\n"
+    "• <b>JSON</b> (.json) — массив объектов <code>{\"name\": ..., \"ip\": ..., \"port\": ...}</code>\n"
+    "• <b>JSON Lines</b> (.jsonl), по такому объекту на строку"
+)
+IMPORT_UNSUPPORTED_FILE = "❌ Поддерживаются только файлы .csv, .json и .jsonl. Попробуй еще раз."
+IMPORT_IN_PROGRESS = "⏳ Импортируем хосты..."
+IMPORT_RESULT = "✅ Импорт завершён.\n➕ Добавлено: <b>{added}</b>\n⏭ Пропущено: <b>{skipped}</b>"
+IMPORT_FAILED = "❌ Не удалось импортировать файл. Попробуй позже."
+EXPORT_CAPTION = "📤 Ваши хосты с последними метриками"
+SCAN_PROMPT = (
+    "🔎 Отправьте подсеть и порт агентов, например <code>10.0.0.0/22:8080</code> "
+    "или <code>[fd00::/120]:8080</code>"
+)
+INVALID_SCAN_TARGET = "❌ Некорректная цель: {error}. Попробуй еще раз."
+SCAN_ALREADY_RUNNING = "⏳ Сканирование в этом чате уже выполняется."
+SCAN_PROGRESS = "🔎 Сканируем <code>{target}</code>\n📡 Проверено: {checked}/{total}\n✅ Найдено агентов: {found}"
+SCAN_FINISHED = "✅ Сканирование <code>{target}</code> завершено.\n✅ Найдено агентов: {found}\n➕ Добавлено хостов: {added}"
+SCAN_CANCELLED = "❌ Сканирование отменено.\n✅ Найдено агентов: {found}\n➕ Добавлено хостов: {added}"
+SCAN_DISABLED = "🔒 Сканирование подсетей отключено администратором бота."
+SCAN_ALLOWED = "\n\nРазрешённые подсети: {networks}"
+SCAN_FAILED = "❌ Сканирование завершилось с ошибкой. Попробуй позже."
+SEARCH_PROMPT = "🔍 Отправьте начало имени хоста"
+HOSTS_FILTERED_MESSAGE = "💻 Ваши хосты, имя начинается с «{query}»:"
+TAGS_PROMPT = (
+    "🏷 Отправьте теги хоста через запятую или пробел, например <code>prod, db</code>.\n"
+    "Текущие теги: {tags}\n"
+    "Отправьте <code>-</code>, чтобы удалить все теги."
+)
+INVALID_TAGS = (
+    "❌ Тег может содержать только латинские буквы, цифры, «-» и «_», "
+    "не длиннее {max_length} символов, и не может быть «{reserved}». Попробуй еще раз."
+)
+TAGS_UPDATED = "✅ Теги хоста обновлены: {tags}"
+NO_TAGS = "нет"
+HOST_TAGS = "\n<b>🏷 Теги:</b> {tags}\n"
+GROUP_POLL_STARTED = "⏳ Опрашиваем {count} хостов группы #{tag} ..."
+GROUP_POLL_FINISHED = (
+    "✅ Группа #{tag} опрошена.\n"
+    "🔄 Обновлено: {updated}\n"
+    "⏸ Без изменений: {unchanged}\n"
+    "❌ Ошибок: {failed}"
+)
+GROUP_POLL_FAILED = "❌ Не удалось сохранить результаты опроса группы #{tag}. Попробуй позже."
+REPORT_SWITCH_MESSAGE = "📊 Отчёты:"
+REPORT_PERIOD_NAMES = {None: "выключены", "daily": "ежедневно", "weekly": "еженедельно"}
+REPORT_HEADER = {
+    "daily": "📊 <b>Отчёт за сутки</b> ({since} — {until})\n",
+    "weekly": "📊 <b>Отчёт за неделю</b> ({since} — {until})\n",
+}
+REPORT_HOST_LINE = (
+    "\n🖥️ <b>{name}</b>\n"
+    "🟢 Доступность: {uptime:.1f}% ({up} из {samples})\n"
+    "📈 Пик RAM: {peak_ram:.1f}% · Swap: {peak_swap:.1f}%\n"
+    "💽 Диск: {disk}\n"
+)
+REPORT_HOST_NO_DATA = "\n🖥️ <b>{name}</b>\n❓ Нет данных опросов за период\n"
+REPORT_HOST_DOWN = "\n🖥️ <b>{name}</b>\n🔴 Доступность: 0% (0 из {samples})\n"
+REPORT_DISK_GROWTH = "{last:.1f}% ({growth:+.1f} п.п.)"
+REPORT_MORE_HOSTS = "\n… и ещё {count} хостов"
@@ -0,0 +1,106 @@
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject
+
+from app.callbacks import CallbackHandlers
+from app.database.models import current_user_id
+from app.utils.metrics import HANDLER_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class HandlerMetricsMiddleware(BaseMiddleware):
+    """Inner-middleware, записывающая время работы каждого хендлера в HANDLER_SECONDS."""
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        # Для callback_query реальный обработчик выбран CallbackDataMiddleware
+        handler_object = data.get("callback_handler") or data.get("handler")
+        name = handler_object.callback.__name__ if handler_object else "unknown"
+        start = time.perf_counter()
+        try:
+            return await handler(event, data)
+        finally:
+            HANDLER_SECONDS.labels(name).observe(time.perf_counter() - start)
+
+
+class DuplicateCallbackMiddleware(BaseMiddleware):
+    """
+    Outer-middleware для callback_query: отбрасывает повторное нажатие той же кнопки
+    того же сообщения, пришедшее в течение ttl секунд после предыдущего.
+    """
+
+    def __init__(self, ttl: float = 2.0):
+        self.ttl = ttl
+        self._seen: "OrderedDict[tuple, float]" = OrderedDict()
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        now = time.monotonic()
+        while self._seen:
+            oldest_key, seen_at = next(iter(self._seen.items()))
+            if now - seen_at < self.ttl:
+                break
+            del self._seen[oldest_key]
+
+        message_id = event.message.message_id if event.message else None
+        key = (event.from_user.id, message_id, event.data)
+        if key in self._seen:
+            logger.info(f"Повторный callback {event.data} от {event.from_user.id} отброшен")
+            await event.answer()
+            return None
+        self._seen[key] = now
+        return await handler(event, data)
+
+
+class CallbackDataMiddleware(BaseMiddleware):
+    """
+    Outer-middleware для callback_query: один раз разбирает callback_data, находит
+    обработчик в таблице CallbackHandlers и кладёт оба в data
+    ("callback_data" и "callback_handler").
+    """
+
+    def __init__(self, handlers: CallbackHandlers):
+        self.handlers = handlers
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: CallbackQuery,
+        data: Dict[str, Any],
+    ) -> Any:
+        data["callback_handler"], data["callback_data"] = self.handlers.resolve(event.data)
+        return await handler(event, data)
+
+
+class CurrentUserMiddleware(BaseMiddleware):
+    """
+    Outer-middleware: кладёт Telegram ID автора апдейта в current_user_id, чтобы чтения
+    пользователя сразу после его же записей шли в основную БД, а не в реплику.
+    Фоновые задачи, запущенные из хендлера, наследуют значение вместе с контекстом.
+    """
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        user = data.get("event_from_user")
+        token = current_user_id.set(user.id if user else None)
+        try:
+            return await handler(event, data)
+        finally:
+            current_user_id.reset(token)
@@ -0,0 +1,26 @@
+import asyncio
+import logging
+
+from config import POLLER_WORKERS, POLLER_INTERVAL, POLLER_METRICS_PORT, METRICS_HOST, ANOMALY_DISKS
+
+
+async def main():
+    from app.database.models import async_main, dispose_engine
+    from app.poller.supervisor import PollerSupervisor
+
+    await async_main()
+    metrics_runner = None
+    if POLLER_METRICS_PORT:
+        from app.utils.metrics import start_metrics_server
+        metrics_runner = await start_metrics_server(METRICS_HOST, POLLER_METRICS_PORT)
+    try:
+        await PollerSupervisor(workers=POLLER_WORKERS, interval=POLLER_INTERVAL, anomaly_disks=ANOMALY_DISKS).run()
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await dispose_engine()
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main())
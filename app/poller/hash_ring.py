@@ -0,0 +1,54 @@
+import hashlib
+from bisect import bisect
+from typing import Dict, Iterable, List, TypeVar
+
+T = TypeVar("T")
+
+DEFAULT_REPLICAS = 64
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "big")
+
+
+class HashRing:
+    """
+    Кольцо консистентного хеширования с виртуальными узлами.
+
+    При добавлении или удалении воркера переезжает только ~1/N хостов,
+    остальные остаются у прежних воркеров вместе с их открытыми соединениями.
+    """
+
+    def __init__(self, nodes: Iterable[int] = (), replicas: int = DEFAULT_REPLICAS):
+        self.replicas = replicas
+        self._points: List[int] = []
+        self._owners: Dict[int, int] = {}
+        for node in nodes:
+            self.add(node)
+
+    @property
+    def nodes(self) -> List[int]:
+        return sorted(set(self._owners.values()))
+
+    def add(self, node: int) -> None:
+        for replica in range(self.replicas):
+            point = _hash(f"{node}#{replica}")
+            self._owners[point] = node
+        self._points = sorted(self._owners)
+
+    def remove(self, node: int) -> None:
+        self._owners = {point: owner for point, owner in self._owners.items() if owner != node}
+        self._points = sorted(self._owners)
+
+    def get(self, host_id: int) -> int:
+        if not self._points:
+            raise LookupError("В кольце нет воркеров")
+        index = bisect(self._points, _hash(str(host_id))) % len(self._points)
+        return self._owners[self._points[index]]
+
+    def assign(self, hosts: Iterable[T], key=lambda host: host[0]) -> Dict[int, List[T]]:
+        """Раскладывает хосты по воркерам. Каждому воркеру возвращается список, даже пустой."""
+        assignment: Dict[int, List[T]] = {node: [] for node in self.nodes}
+        for host in hosts:
+            assignment[self.get(key(host))].append(host)
+        return assignment
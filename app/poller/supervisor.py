@@ -0,0 +1,204 @@
+import asyncio
+import logging
+import multiprocessing
+from typing import Dict, List, Tuple
+
+from app.database.requests import get_all_hosts, update_hosts_metrics, touch_hosts, record_failed_polls
+from app.poller.hash_ring import HashRing
+from app.poller.worker import run_worker, HostAddress
+from app.reports.retention import run_sample_retention
+from app.utils.anomaly import AnomalyDetector, DISK_SERIES
+from app.utils.metrics import apply_metrics_delta, POLLS_IN_FLIGHT, POLLER_SAMPLES
+
+logger = logging.getLogger(__name__)
+
+CONCURRENCY_PER_WORKER = 200
+BATCH_SIZE = 100
+REFRESH_INTERVAL = 30.0
+
+
+class PollerSupervisor:
+    """
+    Шардированный опрос хостов в нескольких процессах.
+
+    Хосты распределяются по воркерам консистентным хешированием по id. Воркеры
+    присылают пачки метрик в общую очередь, а единственный писатель в этом процессе
+    сохраняет их в БД через update_hosts_metrics(). Значения рядов копятся до конца
+    цикла воркера, и весь цикл оценивается детектором аномалий одним вызовом.
+    При добавлении, удалении или падении воркера хосты перераспределяются.
+    Метрики запросов к агентам, пересланные воркерами, суммируются в метрики этого процесса.
+    Старая история опросов удаляется run_sample_retention(), даже если бот с отчётами не запущен.
+    """
+
+    def __init__(self, workers: int, interval: float,
+                 concurrency: int = CONCURRENCY_PER_WORKER, batch_size: int = BATCH_SIZE,
+                 refresh_interval: float = REFRESH_INTERVAL, anomaly_disks: int = DISK_SERIES):
+        self.interval = interval
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.refresh_interval = refresh_interval
+        self._initial_workers = workers
+        self._context = multiprocessing.get_context("spawn")
+        self._result_queue = self._context.Queue()
+        self._ring = HashRing()
+        self._processes: Dict[int, multiprocessing.Process] = {}
+        self._command_queues: Dict[int, multiprocessing.Queue] = {}
+        self._hosts: List[HostAddress] = []
+        self._next_worker_id = 0
+        self.samples_written = 0
+        self._in_flight: Dict[int, float] = {}
+        # Строки рядов текущего цикла каждого воркера: {worker_id: {host_id: строка}}
+        self._cycle_rows: Dict[int, Dict[int, List[float]]] = {}
+        self.detector = AnomalyDetector(disks=anomaly_disks)
+
+    def add_worker(self) -> int:
+        """Запускает новый воркер и перераспределяет хосты с его учётом."""
+        worker_id = self._next_worker_id
+        self._next_worker_id += 1
+        command_queue = self._context.Queue()
+        process = self._context.Process(
+            target=run_worker,
+            args=(worker_id, command_queue, self._result_queue, self.interval, self.concurrency, self.batch_size),
+            name=f"poller-{worker_id}",
+            daemon=True,
+        )
+        process.start()
+        self._processes[worker_id] = process
+        self._command_queues[worker_id] = command_queue
+        self._ring.add(worker_id)
+        logger.info(f"Воркер {worker_id} запущен (pid={process.pid})")
+        self._rebalance()
+        return worker_id
+
+    async def remove_worker(self, worker_id: int) -> None:
+        """
+        Останавливает воркер и отдаёт его хосты остальным. Процесс дожидается в пуле потоков,
+        как и в stop(), чтобы писатель тем временем разбирал очередь.
+        """
+        process = self._processes.pop(worker_id)
+        command_queue = self._command_queues.pop(worker_id)
+        self._ring.remove(worker_id)
+        self._in_flight.pop(worker_id, None)
+        self._cycle_rows.pop(worker_id, None)
+        if process.is_alive():
+            command_queue.put(("stop", None))
+            await asyncio.get_running_loop().run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+        logger.info(f"Воркер {worker_id} остановлен")
+        self._rebalance()
+
+    def _rebalance(self) -> None:
+        if not self._processes:
+            return
+        for worker_id, hosts in self._ring.assign(self._hosts).items():
+            self._command_queues[worker_id].put(("assign", hosts))
+
+    async def _refresh(self) -> None:
+        """Подхватывает новые/удалённые хосты и заменяет упавшие воркеры."""
+        for worker_id, process in list(self._processes.items()):
+            if not process.is_alive():
+                logger.error(f"Воркер {worker_id} завершился с кодом {process.exitcode}, перезапуск")
+                await self.remove_worker(worker_id)
+                self.add_worker()
+
+        hosts = sorted(await get_all_hosts())
+        if hosts != self._hosts:
+            logger.info(f"Список хостов изменился: {len(self._hosts)} -> {len(hosts)}")
+            current_ids = {host_id for host_id, _, _ in hosts}
+            for host_id, _, _ in self._hosts:
+                if host_id not in current_ids:
+                    self.detector.forget(host_id)
+            self._hosts = hosts
+            self._rebalance()
+
+    async def _writer(self) -> None:
+        """Единственный писатель: забирает пачки из очереди и сохраняет их в БД."""
+        loop = asyncio.get_running_loop()
+        while True:
+            message = await loop.run_in_executor(None, self._result_queue.get)
+            if message is None:
+                return
+            kind, worker_id, payload = message
+            if kind == "cycle":
+                hosts_count, elapsed = payload
+                logger.debug(f"Воркер {worker_id}: цикл по {hosts_count} хостам за {elapsed:.2f} сек")
+                self._score_cycle(worker_id)
+                continue
+            if kind == "metrics":
+                delta, in_flight = payload
+                apply_metrics_delta(delta)
+                if worker_id in self._processes:
+                    self._in_flight[worker_id] = in_flight
+                continue
+            if kind == "unchanged":
+                try:
+                    await touch_hosts(payload)
+                except Exception as e:
+                    logger.error(f"Не удалось обновить время проверки от воркера {worker_id}: {e}")
+                continue
+            if kind == "failed":
+                try:
+                    await record_failed_polls(payload)
+                except Exception as e:
+                    logger.error(f"Не удалось записать неудачные опросы от воркера {worker_id}: {e}")
+                continue
+            samples: List[Tuple[int, dict]] = payload
+            try:
+                await update_hosts_metrics(samples)
+                self.samples_written += len(samples)
+                POLLER_SAMPLES.inc(len(samples))
+            except Exception as e:
+                logger.error(f"Не удалось сохранить пачку от воркера {worker_id}: {e}")
+                continue
+            command_queue = self._command_queues.get(worker_id)
+            if command_queue is not None:
+                command_queue.put(("saved", [host_id for host_id, _ in samples]))
+            rows = self._cycle_rows.setdefault(worker_id, {})
+            for host_id, metrics_data in samples:
+                try:
+                    rows[host_id] = self.detector.values(host_id, metrics_data)
+                except (KeyError, TypeError, ValueError) as e:
+                    logger.error(f"Не удалось разобрать ряды хоста {host_id} от воркера {worker_id}: {e}")
+
+    def _score_cycle(self, worker_id: int) -> None:
+        """Оценивает детектором аномалий все значения, накопленные за цикл воркера."""
+        rows = self._cycle_rows.pop(worker_id, None)
+        if not rows:
+            return
+        for host_id, series, kind, value in self.detector.observe_rows(rows):
+            logger.warning(f"Аномалия ({kind}) у хоста {host_id}: {series}={value:.2f}")
+
+    async def run(self) -> None:
+        POLLS_IN_FLIGHT.set_function(lambda: sum(self._in_flight.values()))
+        self._hosts = sorted(await get_all_hosts())
+        for _ in range(self._initial_workers):
+            self.add_worker()
+        writer = asyncio.create_task(self._writer())
+        retention = asyncio.create_task(run_sample_retention())
+        try:
+            while True:
+                await asyncio.sleep(self.refresh_interval)
+                await self._refresh()
+        finally:
+            retention.cancel()
+            await self.stop()
+            self._result_queue.put(None)
+            await writer
+
+    async def stop(self) -> None:
+        """
+        Останавливает все воркеры. Процессы дожидаются в пуле потоков, чтобы писатель
+        продолжал разбирать очередь: воркер не завершится, пока его последние пачки
+        не прочитаны из канала.
+        """
+        loop = asyncio.get_running_loop()
+        processes = [self._processes.pop(worker_id) for worker_id in list(self._processes)]
+        for command_queue in self._command_queues.values():
+            command_queue.put(("stop", None))
+        self._command_queues.clear()
+        for process in processes:
+            await loop.run_in_executor(None, process.join, 5)
+            if process.is_alive():
+                process.terminate()
+        self._ring = HashRing()
@@ -0,0 +1,151 @@
+import asyncio
+import logging
+import queue
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+HostAddress = Tuple[int, str, int]
+
+METRICS_INTERVAL = 5.0
+COMMAND_POLL_INTERVAL = 0.5
+
+
+def _get_command(command_queue, timeout: float) -> Optional[tuple]:
+    try:
+        return command_queue.get(timeout=max(timeout, 0))
+    except queue.Empty:
+        return None
+
+
+async def _poll_cycle(worker_id: int, hosts: List[HostAddress], result_queue,
+                      concurrency: int, batch_size: int) -> None:
+    """
+    Опрашивает назначенные хосты: успешные ответы уходят писателю пачками, затем списки 304 и ошибок.
+    Ответы, не прошедшие metrics_problem(), попадают в ошибки.
+    """
+    from app.utils.send_request import send_request, NOT_MODIFIED
+    from app.utils.samples import metrics_problem
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def poll(host: HostAddress):
+        host_id, ip, port = host
+        async with semaphore:
+            return host_id, await send_request(ip, str(port), conditional=True)
+
+    batch = []
+    unchanged = []
+    failed = []
+    for future in asyncio.as_completed([poll(host) for host in hosts]):
+        host_id, metrics_data = await future
+        if metrics_data is NOT_MODIFIED:
+            unchanged.append(host_id)
+            continue
+        if isinstance(metrics_data, str):
+            failed.append(host_id)
+            continue
+        # Ответ без нужных полей уронил бы сохранение всей пачки, поэтому считается неудачным опросом
+        problem = metrics_problem(metrics_data)
+        if problem is not None:
+            logger.warning(f"Воркер {worker_id}: некорректный ответ хоста {host_id}: {problem}")
+            failed.append(host_id)
+            continue
+        batch.append((host_id, metrics_data))
+        if len(batch) >= batch_size:
+            result_queue.put(("samples", worker_id, batch))
+            batch = []
+    if batch:
+        result_queue.put(("samples", worker_id, batch))
+    if unchanged:
+        result_queue.put(("unchanged", worker_id, unchanged))
+    if failed:
+        result_queue.put(("failed", worker_id, failed))
+
+
+def _send_metrics(worker_id: int, result_queue, sent: dict) -> None:
+    from app.utils.metrics import metrics_delta, POLLS_IN_FLIGHT
+
+    result_queue.put(("metrics", worker_id, (metrics_delta(sent), POLLS_IN_FLIGHT.value)))
+
+
+async def _report_metrics(worker_id: int, result_queue, sent: dict) -> None:
+    """Раз в METRICS_INTERVAL пересылает супервизору прирост метрик опроса и число запросов в полёте."""
+    while True:
+        await asyncio.sleep(METRICS_INTERVAL)
+        _send_metrics(worker_id, result_queue, sent)
+
+
+async def _worker_main(worker_id: int, command_queue, result_queue, interval: float,
+                       concurrency: int, batch_size: int) -> None:
+    from app.utils.send_request import close_http_client, commit_etag
+
+    loop = asyncio.get_running_loop()
+    hosts: List[HostAddress] = []
+    addresses: Dict[int, Tuple[str, int]] = {}
+    deadline = loop.time()
+    started = deadline
+    sent_metrics = {}
+    reporter = asyncio.create_task(_report_metrics(worker_id, result_queue, sent_metrics))
+    cycle: Optional[asyncio.Task] = None
+    command: Optional[asyncio.Future] = None
+    try:
+        while True:
+            # Команды читаются и во время цикла опроса, чтобы "stop" не ждал конца долгого цикла
+            if command is None:
+                timeout = COMMAND_POLL_INTERVAL if cycle is not None else deadline - loop.time()
+                command = loop.run_in_executor(None, _get_command, command_queue, timeout)
+            await asyncio.wait([future for future in (command, cycle) if future is not None],
+                               return_when=asyncio.FIRST_COMPLETED)
+            if cycle is not None and cycle.done():
+                cycle.result()
+                result_queue.put(("cycle", worker_id, (len(hosts), loop.time() - started)))
+                deadline = started + interval
+                cycle = None
+            if command.done():
+                received, command = command.result(), None
+                if received is not None:
+                    name, payload = received
+                    if name == "stop":
+                        return
+                    if name == "assign":
+                        if not hosts:
+                            deadline = loop.time()
+                        hosts = payload
+                        addresses = {host_id: (ip, port) for host_id, ip, port in hosts}
+                        logger.info(f"Воркер {worker_id}: назначено {len(hosts)} хостов")
+                    elif name == "saved":
+                        # Писатель сохранил пачку: ETag этих ответов можно отправлять в If-None-Match
+                        for host_id in payload:
+                            if host_id in addresses:
+                                ip, port = addresses[host_id]
+                                commit_etag(ip, str(port))
+            if cycle is None and loop.time() >= deadline:
+                started = loop.time()
+                cycle = asyncio.create_task(_poll_cycle(worker_id, hosts, result_queue, concurrency, batch_size))
+    finally:
+        if cycle is not None:
+            cycle.cancel()
+        reporter.cancel()
+        _send_metrics(worker_id, result_queue, sent_metrics)
+        await close_http_client()
+
+
+def run_worker(worker_id: int, command_queue, result_queue, interval: float,
+               concurrency: int, batch_size: int) -> None:
+    """
+    Точка входа процесса-воркера.
+
+    У каждого воркера свой event loop и свой пул HTTP-соединений. Воркер получает
+    список хостов командой ("assign", hosts) и завершается по команде ("stop", None).
+    Командой ("saved", host_ids) писатель подтверждает сохранение пачки, и только после
+    этого ETag ответов этих хостов отправляется в условных запросах.
+    Метрики запросов к агентам пересылаются супервизору сообщениями "metrics".
+    """
+    logging.basicConfig(level=logging.INFO)
+    # Строка на каждый запрос к агенту забивает лог и съедает заметную долю CPU воркера
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    try:
+        asyncio.run(_worker_main(worker_id, command_queue, result_queue, interval, concurrency, batch_size))
+    except KeyboardInterrupt:
+        pass
@@ -0,0 +1,60 @@
+import asyncio
+import logging
+from typing import Tuple
+
+from aiogram import Bot
+from aiogram.exceptions import TelegramAPIError, TelegramForbiddenError, TelegramRetryAfter
+
+logger = logging.getLogger(__name__)
+
+MAX_ATTEMPTS = 3
+
+
+class ReportDelivery:
+    """
+    Очередь доставки отчётов с ограничением скорости.
+
+    Отчёты отправляются одним потребителем не чаще rate сообщений в секунду, так что
+    рассылка занимает малую часть лимита Bot API и не мешает ответам хендлеров.
+    На TelegramRetryAfter потребитель засыпает на указанное время и повторяет отправку.
+    """
+
+    def __init__(self, bot: Bot, rate: float):
+        self.bot = bot
+        self.interval = 1.0 / rate
+        self._queue: asyncio.Queue[Tuple[int, str, int]] = asyncio.Queue()
+        self.sent = 0
+
+    def put(self, chat_id: int, text: str) -> None:
+        self._queue.put_nowait((chat_id, text, 1))
+
+    def pending(self) -> int:
+        return self._queue.qsize()
+
+    async def join(self) -> None:
+        """Дожидается доставки всех поставленных в очередь отчётов."""
+        await self._queue.join()
+
+    async def _send(self, chat_id: int, text: str, attempt: int) -> None:
+        try:
+            await self.bot.send_message(chat_id=chat_id, text=text, disable_notification=True)
+            self.sent += 1
+        except TelegramRetryAfter as e:
+            logger.warning(f"Лимит Bot API при отправке отчёта {chat_id}, пауза {e.retry_after} сек")
+            await asyncio.sleep(e.retry_after)
+            if attempt < MAX_ATTEMPTS:
+                self._queue.put_nowait((chat_id, text, attempt + 1))
+        except TelegramForbiddenError:
+            logger.info(f"Пользователь {chat_id} заблокировал бота, отчёт не доставлен")
+        except TelegramAPIError as e:
+            logger.error(f"Не удалось отправить отчёт пользователю {chat_id}: {e}")
+
+    async def run(self) -> None:
+        """Потребитель очереди; работает до отмены задачи."""
+        while True:
+            chat_id, text, attempt = await self._queue.get()
+            try:
+                await self._send(chat_id, text, attempt)
+            finally:
+                self._queue.task_done()
+            await asyncio.sleep(self.interval)
@@ -0,0 +1,80 @@
+import html
+from typing import List, Optional, Tuple
+
+from app.messages import REPORT_HEADER, REPORT_HOST_LINE, REPORT_HOST_NO_DATA, REPORT_HOST_DOWN, \
+    REPORT_DISK_GROWTH, REPORT_MORE_HOSTS
+
+# Ограничение Telegram на длину сообщения в единицах UTF-16
+MESSAGE_MAX_LENGTH = 4096
+
+# (host_id, name, samples, up_samples, peak_ram, peak_swap, first_disk, last_disk)
+HostStats = Tuple[int, str, int, int, Optional[float], Optional[float], Optional[float], Optional[float]]
+
+
+def _uptime(host: HostStats) -> float:
+    _, _, samples, up_samples, *_ = host
+    return 100.0 * up_samples / samples if samples else 100.0
+
+
+def _render_host(host: HostStats) -> str:
+    _, name, samples, up_samples, peak_ram, peak_swap, first_disk, last_disk = host
+    name = html.escape(name)
+    if not samples:
+        return REPORT_HOST_NO_DATA.format(name=name)
+    if not up_samples:
+        return REPORT_HOST_DOWN.format(name=name, samples=samples)
+    disk = "—" if last_disk is None else REPORT_DISK_GROWTH.format(last=last_disk, growth=last_disk - first_disk)
+    return REPORT_HOST_LINE.format(
+        name=name, uptime=_uptime(host), up=up_samples, samples=samples,
+        peak_ram=peak_ram or 0.0, peak_swap=peak_swap or 0.0, disk=disk,
+    )
+
+
+def _message_length(text: str) -> int:
+    """Длина текста так, как её считает Telegram: эмодзи вне BMP занимают две единицы UTF-16."""
+    return len(text.encode("utf-16-le")) // 2
+
+
+def render_report(period: str, since: str, until: str, hosts: List[HostStats]) -> str:
+    """
+    Формирует текст отчёта пользователя.
+
+    Хосты упорядочены от проблемных к здоровым (ниже доступность, выше пик RAM).
+    Строки хостов добавляются, пока текст вместе со строкой «… и ещё N хостов» помещается
+    в MESSAGE_MAX_LENGTH, поэтому при обрезке в отчёт попадают важные. Длина считается
+    вместе с HTML-разметкой, то есть с запасом.
+
+    Args:
+        period (str): "daily" или "weekly".
+        since (str): Начало периода для заголовка.
+        until (str): Конец периода для заголовка.
+        hosts (List[HostStats]): Сводка по хостам пользователя.
+
+    Returns:
+        str: Текст отчёта в HTML-разметке Telegram.
+    """
+    ordered = sorted(hosts, key=lambda host: (_uptime(host), -(host[4] or 0.0), host[0]))
+    parts = [REPORT_HEADER[period].format(since=since, until=until)]
+    length = _message_length(parts[0])
+    for index, host in enumerate(ordered):
+        line = _render_host(host)
+        rest = len(ordered) - index - 1
+        more = REPORT_MORE_HOSTS.format(count=rest) if rest else ""
+        if length + _message_length(line) + _message_length(more) > MESSAGE_MAX_LENGTH:
+            # Строка «ещё N» для оставшихся хостов поместилась на прошлом шаге
+            parts.append(REPORT_MORE_HOSTS.format(count=rest + 1))
+            break
+        parts.append(line)
+        length += _message_length(line)
+    return "".join(parts)
+
+
+def render_reports(period: str, since: str, until: str,
+                   batch: List[Tuple[int, List[HostStats]]]) -> List[Tuple[int, str]]:
+    """
+    Формирует отчёты пачки пользователей. Выполняется в процессе пула рендеринга.
+
+    Returns:
+        List[Tuple[int, str]]: Пары (Telegram ID пользователя, текст отчёта).
+    """
+    return [(user_id, render_report(period, since, until, hosts)) for user_id, hosts in batch]
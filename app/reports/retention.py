@@ -0,0 +1,30 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+
+from app.database.requests import prune_samples
+
+logger = logging.getLogger(__name__)
+
+# Неделя для еженедельного отчёта и сутки запаса
+SAMPLE_RETENTION = timedelta(days=8)
+PRUNE_INTERVAL = 3600.0
+
+
+async def run_sample_retention(retention: timedelta = SAMPLE_RETENTION, interval: float = PRUNE_INTERVAL) -> None:
+    """
+    Раз в interval секунд удаляет историю опросов старше retention; работает до отмены задачи.
+
+    Историю пишут и бот, и поллер, поэтому очистка запускается в обоих процессах
+    независимо от того, включены ли отчёты. Удаление идемпотентно, двойной запуск безопасен.
+
+    Args:
+        retention (timedelta): Сколько хранить историю.
+        interval (float): Пауза между очистками в секундах.
+    """
+    while True:
+        try:
+            await prune_samples(datetime.now() - retention)
+        except Exception as e:
+            logger.error(f"Не удалось удалить старую историю опросов: {e}")
+        await asyncio.sleep(interval)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from itertools import groupby
+from typing import Dict, List
+
+from aiogram import Bot
+
+from app.database.requests import get_report_subscribers, get_report_stats
+from app.reports.delivery import ReportDelivery
+from app.reports.render import render_reports
+
+logger = logging.getLogger(__name__)
+
+PERIODS: Dict[str, timedelta] = {"daily": timedelta(days=1), "weekly": timedelta(days=7)}
+WEEKLY_WEEKDAY = 0
+USERS_PER_QUERY = 500
+USERS_PER_RENDER_TASK = 50
+PERIOD_FORMAT = "%d.%m %H:%M"
+
+
+class ReportScheduler:
+    """
+    Периодические отчёты по истории опросов.
+
+    Раз в сутки в hour:00 пакетная задача собирает отчёты всех подписчиков: сводка
+    считается запросом get_report_stats() на USERS_PER_QUERY пользователей, тексты
+    формируются в пуле процессов, а отправка идёт через очередь ReportDelivery.
+    Еженедельные отчёты собираются по понедельникам.
+    """
+
+    def __init__(self, bot: Bot, hour: int, rate: float, workers: int):
+        self.hour = hour
+        self.workers = workers
+        self.delivery = ReportDelivery(bot, rate)
+
+    def next_run(self, now: datetime) -> datetime:
+        run_at = now.replace(hour=self.hour, minute=0, second=0, microsecond=0)
+        return run_at if run_at > now else run_at + timedelta(days=1)
+
+    async def run_once(self, now: datetime) -> int:
+        """
+        Собирает отчёты за период, заканчивающийся в now, и ставит их в очередь доставки.
+
+        Returns:
+            int: Количество поставленных в очередь отчётов.
+        """
+        periods = ["daily"] + (["weekly"] if now.weekday() == WEEKLY_WEEKDAY else [])
+        loop = asyncio.get_running_loop()
+        queued = 0
+        pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+        try:
+            for period in periods:
+                since = now - PERIODS[period]
+                since_text, until_text = since.strftime(PERIOD_FORMAT), now.strftime(PERIOD_FORMAT)
+                user_ids = await get_report_subscribers(period)
+                period_queued = 0
+                for start in range(0, len(user_ids), USERS_PER_QUERY):
+                    rows = await get_report_stats(user_ids[start:start + USERS_PER_QUERY], since)
+                    reports = [(user_id, [row[1:] for row in user_rows])
+                               for user_id, user_rows in groupby(rows, key=lambda row: row[0])]
+                    batches: List[list] = [reports[i:i + USERS_PER_RENDER_TASK]
+                                           for i in range(0, len(reports), USERS_PER_RENDER_TASK)]
+                    rendered = await asyncio.gather(*(
+                        loop.run_in_executor(pool, render_reports, period, since_text, until_text, batch)
+                        for batch in batches
+                    ))
+                    for chunk in rendered:
+                        for user_id, text in chunk:
+                            self.delivery.put(user_id, text)
+                            period_queued += 1
+                logger.info(f"Отчёты ({period}) поставлены в очередь: {period_queued}")
+                queued += period_queued
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+        return queued
+
+    async def run(self) -> None:
+        """Основной цикл: ждёт времени запуска и собирает отчёты; работает до отмены задачи."""
+        sender = asyncio.create_task(self.delivery.run(), name="report-delivery")
+        try:
+            while True:
+                now = datetime.now()
+                run_at = self.next_run(now)
+                logger.info(f"Следующая сборка отчётов: {run_at}")
+                await asyncio.sleep((run_at - now).total_seconds())
+                try:
+                    await self.run_once(datetime.now())
+                except Exception as e:
+                    logger.error(f"Сборка отчётов завершилась с ошибкой: {e}")
+        finally:
+            sender.cancel()
+            await asyncio.gather(sender, return_exceptions=True)
@@ -1,5 +1,24 @@
+from typing import Optional
+
 from aiogram import Router
-from app.handlers import router as handlers_router
 
-main_router = Router()
-main_router.include_router(handlers_router)
\ No newline at end of file
+_main_router: Optional[Router] = None
+
+
+def get_main_router() -> Router:
+    """Собирает корневой роутер при первом обращении; обработчики импортируются лениво."""
+    global _main_router
+    if _main_router is None:
+        from app.handlers import router as handlers_router, callback_handlers
+        from app.middlewares import HandlerMetricsMiddleware, DuplicateCallbackMiddleware, CallbackDataMiddleware, \
+            CurrentUserMiddleware
+
+        _main_router = Router()
+        _main_router.message.outer_middleware(CurrentUserMiddleware())
+        _main_router.callback_query.outer_middleware(CurrentUserMiddleware())
+        _main_router.message.middleware(HandlerMetricsMiddleware())
+        _main_router.callback_query.middleware(HandlerMetricsMiddleware())
+        _main_router.callback_query.outer_middleware(DuplicateCallbackMiddleware())
+        _main_router.callback_query.outer_middleware(CallbackDataMiddleware(callback_handlers))
+        _main_router.include_router(handlers_router)
+    return _main_router
@@ -0,0 +1,185 @@
+import logging
+from typing import Any, Dict, List, Sequence, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+Anomaly = Tuple[int, str, str, float]
+
+BASE_SERIES = ("ram_percent", "swap_percent")
+DISK_SERIES = 8
+
+
+class AnomalyDetector:
+    """
+    Онлайн-поиск аномалий в рядах RAM%, Swap% и заполненности каждого диска.
+
+    У хоста 2 + disks рядов: RAM, Swap и по ряду на диск. Диски закрепляются за
+    столбцами по точке монтирования в порядке появления; диски сверх disks не оцениваются.
+    Для каждого ряда хранится O(1) состояния: EWMA среднего и дисперсии, EWMA
+    прироста между опросами (тренд) и его дисперсии, оценка квантиля frugal-алгоритмом.
+    Дисперсия сглаживается медленнее среднего (var_alpha): оценка по ~20 отсчётам
+    даёт тяжёлые хвосты z, и на 4 сигмах шум срабатывал ~4e-4 раз на наблюдение.
+    Состояние всех хостов лежит в массивах NumPy, и весь цикл опроса
+    оценивается векторно одним вызовом observe().
+
+    - Скачок: значение выше квантиля и отклоняется от EWMA больше чем на z_threshold сигм.
+    - Медленная утечка: средний прирост за опрос больше leak_rate процентных пунктов
+      и статистически отличим от шума.
+    """
+
+    def __init__(self, alpha: float = 0.1, var_alpha: float = 0.01, trend_alpha: float = 0.02,
+                 z_threshold: float = 5.0, leak_rate: float = 0.2, quantile: float = 0.95, quantile_step: float = 0.5,
+                 min_std: float = 1.0, warmup: int = 20, capacity: int = 1024, disks: int = DISK_SERIES):
+        self.alpha = alpha
+        self.var_alpha = var_alpha
+        self.trend_alpha = trend_alpha
+        self.z_threshold = z_threshold
+        self.leak_rate = leak_rate
+        self.quantile = quantile
+        self.quantile_step = quantile_step
+        self.min_std = min_std
+        self.warmup = warmup
+        self.disks = disks
+        self.series_count = len(BASE_SERIES) + disks
+        self._index: Dict[int, int] = {}
+        # Столбец каждого диска хоста по точке монтирования
+        self._disk_columns: Dict[int, Dict[str, int]] = {}
+        self._allocate(capacity)
+
+    def _allocate(self, capacity: int) -> None:
+        shape = (capacity, self.series_count)
+        old = getattr(self, "_count", None)
+        arrays = {
+            "_mean": np.zeros(shape), "_var": np.zeros(shape), "_trend": np.zeros(shape),
+            "_step_var": np.zeros(shape),
+            "_last": np.zeros(shape), "_quantile": np.zeros(shape), "_count": np.zeros(shape, dtype=np.int64),
+        }
+        if old is not None:
+            for name, array in arrays.items():
+                array[:len(old)] = getattr(self, name)
+        for name, array in arrays.items():
+            setattr(self, name, array)
+
+    def _rows(self, host_ids: Sequence[int]) -> np.ndarray:
+        index = self._index
+        for host_id in host_ids:
+            if host_id not in index:
+                index[host_id] = len(index)
+        if len(index) > len(self._count):
+            self._allocate(max(len(index), 2 * len(self._count)))
+        return np.fromiter((index[host_id] for host_id in host_ids), dtype=np.int64, count=len(host_ids))
+
+    def forget(self, host_id: int) -> None:
+        """Сбрасывает состояние хоста (строка переиспользуется при следующем появлении хоста)."""
+        row = self._index.get(host_id)
+        if row is not None:
+            self._count[row] = 0
+        self._disk_columns.pop(host_id, None)
+
+    def values(self, host_id: int, metrics_data: Dict[str, Any]) -> List[float]:
+        """
+        Достаёт из ответа агента строку значений рядов хоста.
+
+        Returns:
+            List[float]: RAM%, Swap% и заполненность дисков по их столбцам; NaN для дисков,
+                которых нет в ответе.
+        """
+        memory = metrics_data["memory"]
+        row = [memory["ram_percent"], memory["swap_percent"]] + [float("nan")] * self.disks
+        columns = self._disk_columns.setdefault(host_id, {})
+        for disk in metrics_data.get("disks") or ():
+            total = disk.get("total_space_mb") or 0
+            if total <= 0:
+                continue
+            key = disk.get("mount_point") or disk.get("name") or ""
+            column = columns.get(key)
+            if column is None:
+                if len(columns) >= self.disks:
+                    continue
+                column = columns[key] = len(BASE_SERIES) + len(columns)
+            row[column] = 100.0 * (1.0 - (disk.get("available_space_mb") or 0) / total)
+        return row
+
+    def series_name(self, host_id: int, column: int) -> str:
+        """Имя ряда для отчёта: ram_percent, swap_percent или disk:<точка монтирования>."""
+        if column < len(BASE_SERIES):
+            return BASE_SERIES[column]
+        for key, disk_column in self._disk_columns.get(host_id, {}).items():
+            if disk_column == column:
+                return f"disk:{key}"
+        return f"disk{column - len(BASE_SERIES)}"
+
+    def observe(self, host_ids: Sequence[int], values: np.ndarray) -> List[Anomaly]:
+        """
+        Учитывает очередной отсчёт всех рядов для пачки хостов.
+
+        Args:
+            host_ids (Sequence[int]): ID хостов, без повторов.
+            values (np.ndarray): Матрица (len(host_ids), series_count) со значениями рядов;
+                NaN — ряд в этом цикле не наблюдался, его состояние не меняется.
+
+        Returns:
+            List[Anomaly]: Кортежи (host_id, ряд, "jump" | "leak", значение).
+        """
+        if not len(host_ids):
+            return []
+        rows = self._rows(host_ids)
+        x = np.asarray(values, dtype=float)
+        observed = ~np.isnan(x)
+        x = np.where(observed, x, 0.0)
+        count = self._count[rows]
+        fresh = count == 0
+        warm = observed & (count >= self.warmup)
+
+        mean = np.where(fresh, x, self._mean[rows])
+        var = np.where(fresh, 0.0, self._var[rows])
+        last = np.where(fresh, x, self._last[rows])
+        quantile = np.where(fresh, x, self._quantile[rows])
+        trend = np.where(fresh, 0.0, self._trend[rows])
+        step_var = np.where(fresh, 0.0, self._step_var[rows])
+
+        # Дисперсия EWMA, стартующая с нуля, занижена на первых отсчётах — поправка на смещение
+        var_bias = 1.0 - (1.0 - self.var_alpha) ** np.maximum(count, 1)
+        bias = 1.0 - (1.0 - self.alpha) ** np.maximum(count, 1)
+        std = np.maximum(np.sqrt(var / var_bias), self.min_std)
+        z = (x - mean) / std
+        # Одиночный скачок не должен выглядеть как утечка, поэтому прирост ограничивается
+        step = np.clip(x - last, -self.z_threshold * std, self.z_threshold * std)
+        step_delta = step - trend
+        trend += self.trend_alpha * step_delta
+        step_var = (1.0 - self.alpha) * (step_var + self.alpha * step_delta * step_delta)
+        # Шум тоже даёт ненулевой тренд: порог не ниже трёх стандартных отклонений EWMA прироста.
+        # Разброс берётся по приростам, а не по отклонениям от среднего, которые сама утечка раздувает.
+        trend_noise = 3.0 * np.sqrt(step_var / bias * self.trend_alpha / (2.0 - self.trend_alpha))
+        jump = warm & (z > self.z_threshold) & (x > quantile)
+        leak = warm & (trend > np.maximum(self.leak_rate, trend_noise))
+
+        delta = x - mean
+        mean += self.alpha * delta
+        var = (1.0 - self.var_alpha) * (var + self.var_alpha * delta * delta)
+        quantile += self.quantile_step * np.where(x > quantile, self.quantile, self.quantile - 1.0)
+
+        for name, array in (("_mean", mean), ("_var", var), ("_trend", trend), ("_step_var", step_var),
+                            ("_last", x), ("_quantile", quantile)):
+            state = getattr(self, name)
+            state[rows] = np.where(observed, array, state[rows])
+        self._count[rows] = count + observed
+
+        anomalies: List[Anomaly] = []
+        for kind, mask in (("jump", jump), ("leak", leak)):
+            for position, column in zip(*np.nonzero(mask)):
+                host_id = host_ids[position]
+                anomalies.append((host_id, self.series_name(host_id, column), kind, float(x[position, column])))
+        return anomalies
+
+    def observe_rows(self, rows: Dict[int, List[float]]) -> List[Anomaly]:
+        """observe() для строк values(), собранных за цикл опроса: {host_id: строка}."""
+        if not rows:
+            return []
+        return self.observe(list(rows), np.array(list(rows.values()), dtype=float))
+
+    def observe_samples(self, samples: List[Tuple[int, Dict[str, Any]]]) -> List[Anomaly]:
+        """observe() для пачки в формате update_hosts_metrics: [(host_id, metrics_data), ...]."""
+        return self.observe_rows({host_id: self.values(host_id, metrics_data) for host_id, metrics_data in samples})
@@ -0,0 +1,29 @@
+import asyncio
+import logging
+from typing import Coroutine, Set
+
+logger = logging.getLogger(__name__)
+
+_tasks: Set[asyncio.Task] = set()
+
+
+def _on_done(task: asyncio.Task) -> None:
+    _tasks.discard(task)
+    if not task.cancelled() and task.exception() is not None:
+        logger.error(f"Фоновая задача {task.get_name()} завершилась с ошибкой: {task.exception()}")
+
+
+def run_in_background(coro: Coroutine, name: str = None) -> asyncio.Task:
+    """Запускает корутину фоновой задачей, не давая сборщику мусора её удалить."""
+    task = asyncio.create_task(coro, name=name)
+    _tasks.add(task)
+    task.add_done_callback(_on_done)
+    return task
+
+
+async def cancel_background_tasks() -> None:
+    """Отменяет все фоновые задачи и дожидается их завершения."""
+    tasks = list(_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
@@ -0,0 +1,111 @@
+import asyncio
+import ipaddress
+import logging
+from typing import Awaitable, Callable, List, Optional, Tuple, Union
+
+from app.utils.send_request import send_request
+from config import SCAN_ALLOWED_NETWORKS
+
+logger = logging.getLogger(__name__)
+
+SCAN_CONCURRENCY = 128
+SCAN_TIMEOUT = 3.0
+SCAN_CONNECT_TIMEOUT = 1.0
+SCAN_MAX_ADDRESSES = 4096
+
+Network = Union[ipaddress.IPv4Network, ipaddress.IPv6Network]
+
+
+def parse_networks(value: str) -> List[Network]:
+    """
+    Разбирает список подсетей через запятую, например "10.0.0.0/16,192.168.1.0/24".
+
+    Raises:
+        ValueError: Если какая-то из подсетей некорректна.
+    """
+    return [ipaddress.ip_network(part.strip(), strict=False) for part in value.split(",") if part.strip()]
+
+
+# Подсети, внутри которых разрешено сканирование; пустой список отключает функцию
+ALLOWED_NETWORKS = parse_networks(SCAN_ALLOWED_NETWORKS)
+
+
+def parse_scan_target(target: str, allowed: Optional[List[Network]] = None) -> Tuple[Network, int]:
+    """
+    Разбирает цель сканирования вида "10.0.0.0/22:8080" или "[fd00::/120]:8080".
+
+    Args:
+        target (str): Цель сканирования.
+        allowed (List[Network], optional): Разрешённые подсети. По умолчанию ALLOWED_NETWORKS.
+
+    Raises:
+        ValueError: Если подсеть или порт некорректны, подсеть больше SCAN_MAX_ADDRESSES
+            или не лежит целиком в одной из разрешённых.
+    """
+    target = target.strip()
+    if target.startswith("["):
+        network_part, _, port_part = target[1:].partition("]:")
+    else:
+        network_part, _, port_part = target.rpartition(":")
+    if not network_part or not port_part:
+        raise ValueError("Ожидается формат подсеть:порт")
+    network = ipaddress.ip_network(network_part, strict=False)
+    port = int(port_part)
+    if not 0 <= port <= 65535:
+        raise ValueError("Порт вне диапазона 0-65535")
+    if network.num_addresses > SCAN_MAX_ADDRESSES:
+        raise ValueError(f"Подсеть больше {SCAN_MAX_ADDRESSES} адресов")
+    allowed = ALLOWED_NETWORKS if allowed is None else allowed
+    if not any(network.version == permitted.version and network.subnet_of(permitted) for permitted in allowed):
+        raise ValueError("Подсеть не входит в разрешённые для сканирования")
+    return network, port
+
+
+def _scan_addresses(network: Network):
+    if network.num_addresses == 1:
+        return iter([network.network_address])
+    return network.hosts()
+
+
+async def scan_network(network: Network, port: int,
+                       on_progress: Optional[Callable[[int, int, int], Awaitable[None]]] = None,
+                       concurrency: int = SCAN_CONCURRENCY,
+                       found: Optional[List[Tuple[str, str]]] = None) -> List[Tuple[str, str]]:
+    """
+    Опрашивает /get_info каждого адреса подсети, держа в полёте не более concurrency запросов.
+
+    Адреса выдаются воркерам из общего итератора, поэтому задачи на всю подсеть
+    не создаются заранее. Отмена задачи останавливает сканирование; уже найденные
+    агенты остаются в переданном списке found. Ошибки опроса логируются в DEBUG.
+
+    Args:
+        network: Подсеть для сканирования.
+        port (int): Порт агента.
+        on_progress: Корутина (проверено, всего, найдено), вызывается после каждого ответа.
+        concurrency (int): Максимум одновременных запросов.
+        found (List, optional): Список, в который добавляются найденные агенты.
+
+    Returns:
+        List[Tuple[str, str]]: Ответившие агенты в виде (ip, host_name).
+    """
+    total = sum(1 for _ in _scan_addresses(network))
+    addresses = _scan_addresses(network)
+    found = [] if found is None else found
+    checked = 0
+
+    async def worker():
+        nonlocal checked
+        for address in addresses:
+            ip = str(address)
+            data = await send_request(ip, str(port), timeout=SCAN_TIMEOUT, connect_timeout=SCAN_CONNECT_TIMEOUT,
+                                      quiet=True)
+            checked += 1
+            if isinstance(data, dict):
+                host_name = (data.get("system") or {}).get("host_name") or ip
+                found.append((ip, host_name))
+            if on_progress is not None:
+                await on_progress(checked, total, len(found))
+
+    await asyncio.gather(*(worker() for _ in range(min(concurrency, total) or 1)))
+    logger.info(f"Сканирование {network}:{port} завершено: найдено {len(found)} агентов")
+    return found
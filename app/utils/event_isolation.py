@@ -0,0 +1,53 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncGenerator, Dict, Hashable
+
+from aiogram.fsm.storage.base import BaseEventIsolation, StorageKey
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_PENDING = 5
+
+
+class ChatQueueFull(Exception):
+    """Очередь апдейтов чата переполнена, апдейт отброшен."""
+
+
+class ChatEventIsolation(BaseEventIsolation):
+    """
+    Последовательная обработка апдейтов одного чата с ограниченной очередью.
+
+    Апдейты разных чатов обрабатываются параллельно. Если в чате уже ждут
+    max_pending апдейтов, новый отклоняется исключением ChatQueueFull.
+    Блокировки удаляются, как только очередь чата пустеет.
+    """
+
+    def __init__(self, max_pending: int = DEFAULT_MAX_PENDING):
+        self.max_pending = max_pending
+        self._locks: Dict[Hashable, asyncio.Lock] = {}
+        self._pending: Dict[Hashable, int] = {}
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        pending = self._pending.get(key, 0)
+        if pending >= self.max_pending:
+            raise ChatQueueFull(f"В очереди чата {key.chat_id} уже {pending} апдейтов")
+        lock = self._locks.get(key)
+        if lock is None:
+            lock = self._locks[key] = asyncio.Lock()
+        self._pending[key] = pending + 1
+        try:
+            async with lock:
+                yield
+        finally:
+            pending = self._pending[key] - 1
+            if pending:
+                self._pending[key] = pending
+            else:
+                del self._pending[key]
+                del self._locks[key]
+
+    async def close(self) -> None:
+        self._locks.clear()
+        self._pending.clear()
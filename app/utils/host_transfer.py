@@ -0,0 +1,250 @@
+import codecs
+import csv
+import io
+import json
+import logging
+from typing import Any, AsyncIterator, List, Optional, Tuple
+
+from aiogram.types import InputFile
+
+from app.database.models import NAME_MAX_LENGTH
+from app.database.requests import add_hosts_bulk, stream_hosts_export
+from app.utils.ip_valid import is_valid_ip
+
+logger = logging.getLogger(__name__)
+
+IMPORT_BATCH_SIZE = 200
+JSON_ITEM_MAX_CHARS = 64 * 1024
+MAX_REPORTED_PROBLEMS = 20
+EXPORT_HEADER = ("name", "ip", "port", "last_checked", "host_name", "ram_percent", "swap_percent")
+
+HostRow = Tuple[str, str, int]
+
+
+async def iter_lines(chunks: AsyncIterator[bytes]) -> AsyncIterator[str]:
+    """Превращает поток байтовых чанков в поток строк UTF-8 без загрузки файла целиком."""
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    tail = ""
+    async for chunk in chunks:
+        tail += decoder.decode(chunk)
+        *lines, tail = tail.split("\n")
+        for line in lines:
+            yield line.rstrip("\r")
+    tail += decoder.decode(b"", final=True)
+    if tail:
+        yield tail.rstrip("\r")
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Потоково разбирает JSON-массив верхнего уровня и отдаёт его элементы по одному.
+
+    В памяти держится только недоразобранный хвост потока, а не весь файл.
+
+    Raises:
+        ValueError: Поток не является JSON-массивом, элемент некорректен или длиннее JSON_ITEM_MAX_CHARS.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8-sig")()
+    parser = json.JSONDecoder()
+    iterator = chunks.__aiter__()
+    buffer = ""
+    position = 0
+    final = False
+    expect = "["
+
+    async def more() -> bool:
+        nonlocal buffer, position, final
+        if final:
+            return False
+        try:
+            text = decoder.decode(await iterator.__anext__())
+        except StopAsyncIteration:
+            text = decoder.decode(b"", final=True)
+            final = True
+        buffer = buffer[position:] + text
+        position = 0
+        return True
+
+    while True:
+        while position < len(buffer) and buffer[position] in " \t\r\n":
+            position += 1
+        if position == len(buffer):
+            if await more():
+                continue
+            raise ValueError("неожиданный конец файла")
+        char = buffer[position]
+        if expect == "[":
+            if char != "[":
+                raise ValueError("ожидается JSON-массив объектов")
+            position += 1
+            expect = "item or ]"
+        elif expect == ", or ]":
+            if char == "]":
+                return
+            if char != ",":
+                raise ValueError(f"ожидается ',' или ']', а не {char!r}")
+            position += 1
+            expect = "item"
+        elif char == "]" and expect == "item or ]":
+            return
+        else:
+            try:
+                item, end = parser.raw_decode(buffer, position)
+            except json.JSONDecodeError as e:
+                if len(buffer) - position > JSON_ITEM_MAX_CHARS:
+                    raise ValueError(f"объект длиннее {JSON_ITEM_MAX_CHARS} символов")
+                if await more():
+                    continue
+                raise ValueError(f"некорректный JSON: {e.msg}")
+            # Число в конце буфера может продолжиться в следующем чанке
+            if end == len(buffer) and await more():
+                continue
+            position = end
+            expect = ", or ]"
+            yield item
+
+
+def _validate(name: str, ip: str, port: str) -> Tuple[Optional[HostRow], Optional[str]]:
+    name, ip = (name or "").strip(), (ip or "").strip()
+    if not name or len(name) > NAME_MAX_LENGTH:
+        return None, f"имя должно быть от 1 до {NAME_MAX_LENGTH} символов"
+    if not is_valid_ip(ip):
+        return None, f"невалидный IP {ip!r}"
+    try:
+        port = int(str(port).strip())
+    except ValueError:
+        return None, f"порт {port!r} не число"
+    if not 0 <= port <= 65535:
+        return None, f"порт {port} вне диапазона 0-65535"
+    return (name, ip, port), None
+
+
+def _validate_item(item: Any) -> Tuple[Optional[HostRow], Optional[str]]:
+    try:
+        name, ip, port = item["name"], item["ip"], item["port"]
+    except KeyError as e:
+        return None, f"нет поля {e}"
+    except TypeError:
+        return None, "ожидается объект {\"name\": ..., \"ip\": ..., \"port\": ...}"
+    return _validate(str(name), str(ip), port)
+
+
+async def parse_host_lines(lines: AsyncIterator[str], fmt: str) \
+        -> AsyncIterator[Tuple[str, Optional[HostRow], Optional[str]]]:
+    """
+    Разбирает и валидирует строки файла импорта.
+
+    CSV: колонки name,ip,port (строка заголовка необязательна).
+    JSON Lines: по объекту {"name": ..., "ip": ..., "port": ...} на строку.
+
+    Yields:
+        Tuple[str, Optional[HostRow], Optional[str]]: (место в файле, хост или None, ошибка или None).
+    """
+    line_number = 0
+    async for line in lines:
+        line_number += 1
+        if not line.strip():
+            continue
+        if fmt == "csv":
+            fields = next(csv.reader([line]))
+            if line_number == 1 and [field.strip().lower() for field in fields[:3]] == ["name", "ip", "port"]:
+                continue
+            if len(fields) < 3:
+                yield f"строка {line_number}", None, "ожидается name,ip,port"
+                continue
+            host, error = _validate(*fields[:3])
+        else:
+            try:
+                item = json.loads(line)
+            except ValueError as e:
+                yield f"строка {line_number}", None, f"некорректный JSON: {e}"
+                continue
+            host, error = _validate_item(item)
+        yield f"строка {line_number}", host, error
+
+
+async def parse_host_array(chunks: AsyncIterator[bytes]) \
+        -> AsyncIterator[Tuple[str, Optional[HostRow], Optional[str]]]:
+    """
+    Разбирает и валидирует JSON-массив объектов {"name": ..., "ip": ..., "port": ...}.
+    Ошибка в структуре массива прекращает разбор: дальнейшие объекты не восстановить.
+
+    Yields:
+        Tuple[str, Optional[HostRow], Optional[str]]: (место в файле, хост или None, ошибка или None).
+    """
+    number = 0
+    try:
+        async for item in iter_json_array(chunks):
+            number += 1
+            host, error = _validate_item(item)
+            yield f"объект {number}", host, error
+    except ValueError as e:
+        yield f"объект {number + 1}", None, f"{e}, разбор остановлен"
+
+
+async def import_hosts(user_id: int, chunks: AsyncIterator[bytes], fmt: str) -> Tuple[int, int, List[str]]:
+    """
+    Импортирует хосты из потока файла пачками по IMPORT_BATCH_SIZE.
+
+    Args:
+        fmt (str): "csv", "jsonl" (объект на строку) или "json" (массив объектов).
+
+    Returns:
+        Tuple[int, int, List[str]]: (добавлено, пропущено, описания первых проблем).
+    """
+    added = skipped = 0
+    problems: List[str] = []
+    batch: List[HostRow] = []
+    batch_places = {}
+
+    def report(problem: str) -> None:
+        nonlocal skipped
+        skipped += 1
+        if len(problems) < MAX_REPORTED_PROBLEMS:
+            problems.append(problem)
+
+    async def flush() -> None:
+        nonlocal added
+        conflicts = await add_hosts_bulk(user_id, batch)
+        added += len(batch) - len(conflicts)
+        for ip in conflicts:
+            report(f"{batch_places[ip]}: хост с IP {ip} уже существует")
+        batch.clear()
+        batch_places.clear()
+
+    rows = parse_host_array(chunks) if fmt == "json" else parse_host_lines(iter_lines(chunks), fmt)
+    async for place, host, error in rows:
+        if error:
+            report(f"{place}: {error}")
+            continue
+        if host[1] in batch_places:
+            report(f"{place}: IP {host[1]} повторяется в файле")
+            continue
+        batch.append(host)
+        batch_places[host[1]] = place
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            await flush()
+    if batch:
+        await flush()
+    logger.info(f"Импорт для пользователя {user_id}: добавлено {added}, пропущено {skipped}")
+    return added, skipped, problems
+
+
+class HostsExportFile(InputFile):
+    """CSV-выгрузка хостов пользователя, формируемая на лету при отправке в Telegram."""
+
+    def __init__(self, user_id: int, filename: str = "hosts.csv"):
+        super().__init__(filename=filename)
+        self.user_id = user_id
+
+    async def read(self, bot) -> AsyncIterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(EXPORT_HEADER)
+        async for row in stream_hosts_export(self.user_id):
+            writer.writerow(row)
+            if buffer.tell() >= self.chunk_size:
+                yield buffer.getvalue().encode()
+                buffer.seek(0)
+                buffer.truncate()
+        yield buffer.getvalue().encode()
@@ -0,0 +1,227 @@
+import logging
+import time
+from bisect import bisect_left
+from functools import wraps
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _HistogramSeries:
+    """Одна серия гистограммы (одно значение метки)."""
+    __slots__ = ("_buckets", "counts", "sum", "count")
+
+    def __init__(self, buckets: Tuple[float, ...]):
+        self._buckets = buckets
+        # Последний счётчик — корзина +Inf. Счётчики не накопительные, суммируются при выводе.
+        self.counts: List[int] = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect_left(self._buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Histogram:
+    """
+    Гистограмма с одной меткой в формате Prometheus.
+
+    Бот работает в одном event loop, поэтому счётчики обновляются без блокировок.
+    Серия для значения метки создаётся один раз, дальнейшие наблюдения не выделяют память.
+    """
+
+    def __init__(self, name: str, documentation: str, label: str,
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[str, _HistogramSeries] = {}
+
+    def labels(self, value: str) -> _HistogramSeries:
+        series = self._series.get(value)
+        if series is None:
+            series = self._series[value] = _HistogramSeries(self.buckets)
+        return series
+
+    def observe(self, value: str, amount: float) -> None:
+        self.labels(value).observe(amount)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} histogram"]
+        for value, series in self._series.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets, series.counts):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="{bound}"}} {cumulative}')
+            lines.append(f'{self.name}_bucket{{{self.label}="{value}",le="+Inf"}} {series.count}')
+            lines.append(f'{self.name}_sum{{{self.label}="{value}"}} {series.sum}')
+            lines.append(f'{self.name}_count{{{self.label}="{value}"}} {series.count}')
+        return lines
+
+
+class Gauge:
+    """Gauge без меток. Значение либо хранится, либо вычисляется функцией при выводе."""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def dec(self, amount: float = 1) -> None:
+        self.value -= amount
+
+    def set(self, value: float) -> None:
+        self.value = value
+
+    def set_function(self, function: Optional[Callable[[], float]]) -> None:
+        self._function = function
+
+    def render(self) -> List[str]:
+        value = self.value
+        if self._function is not None:
+            try:
+                value = self._function()
+            except Exception as e:
+                logger.warning(f"Не удалось вычислить {self.name}: {e}")
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} gauge", f"{self.name} {value}"]
+
+
+class Counter:
+    """Монотонный счётчик без меток."""
+
+    def __init__(self, name: str, documentation: str):
+        self.name = name
+        self.documentation = documentation
+        self.value = 0
+
+    def inc(self, amount: float = 1) -> None:
+        self.value += amount
+
+    def render(self) -> List[str]:
+        return [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} counter",
+                f"{self.name} {self.value}"]
+
+
+HANDLER_SECONDS = Histogram(
+    "bot_handler_duration_seconds", "Время обработки апдейта хендлером.", "handler")
+DB_QUERY_SECONDS = Histogram(
+    "bot_db_query_duration_seconds", "Время выполнения функций app.database.requests.", "query")
+AGENT_REQUEST_SECONDS = Histogram(
+    "bot_agent_request_duration_seconds", "Время запроса к агенту по исходу.", "outcome")
+AGENT_RESPONSE_BYTES = Counter(
+    "bot_agent_response_bytes_total", "Байт получено от агентов (до распаковки).")
+DB_POOL_IN_USE = Gauge(
+    "bot_db_pool_checked_out", "Соединения, выданные из пула БД.")
+POLLS_IN_FLIGHT = Gauge(
+    "bot_agent_polls_in_flight", "Запросы к агентам, ожидающие ответа.")
+
+POLLER_SAMPLES = Counter(
+    "bot_poller_samples_written_total", "Ответов агентов, сохранённых писателем поллера.")
+
+REGISTRY: List = [HANDLER_SECONDS, DB_QUERY_SECONDS, AGENT_REQUEST_SECONDS, AGENT_RESPONSE_BYTES,
+                  DB_POOL_IN_USE, POLLS_IN_FLIGHT, POLLER_SAMPLES]
+
+# Метрики опроса агентов, которые воркеры поллера пересылают в процесс супервизора
+FORWARDED_HISTOGRAMS = (AGENT_REQUEST_SECONDS,)
+FORWARDED_COUNTERS = (AGENT_RESPONSE_BYTES,)
+
+
+def metrics_delta(sent: Dict) -> Dict:
+    """
+    Возвращает прирост пересылаемых метрик с прошлого вызова.
+
+    Args:
+        sent (Dict): Уже отправленные значения; обновляется на месте.
+
+    Returns:
+        Dict: {(имя гистограммы, метка): (счётчики корзин, сумма, количество), имя счётчика: прирост}.
+    """
+    delta = {}
+    for histogram in FORWARDED_HISTOGRAMS:
+        for label, series in histogram._series.items():
+            key = (histogram.name, label)
+            sent_counts, sent_sum, sent_count = sent.get(key, ((0,) * len(series.counts), 0.0, 0))
+            if series.count == sent_count:
+                continue
+            counts = [count - sent_bucket for count, sent_bucket in zip(series.counts, sent_counts)]
+            delta[key] = (counts, series.sum - sent_sum, series.count - sent_count)
+            sent[key] = (tuple(series.counts), series.sum, series.count)
+    for counter in FORWARDED_COUNTERS:
+        sent_value = sent.get(counter.name, 0)
+        if counter.value != sent_value:
+            delta[counter.name] = counter.value - sent_value
+            sent[counter.name] = counter.value
+    return delta
+
+
+def apply_metrics_delta(delta: Dict) -> None:
+    """Добавляет к метрикам этого процесса прирост, полученный от metrics_delta() другого процесса."""
+    by_name = {metric.name: metric for metric in REGISTRY}
+    for key, value in delta.items():
+        if isinstance(key, tuple):
+            name, label = key
+            counts, total, count = value
+            series = by_name[name].labels(label)
+            for index, bucket_count in enumerate(counts):
+                series.counts[index] += bucket_count
+            series.sum += total
+            series.count += count
+        else:
+            by_name[key].inc(value)
+
+
+def timed(histogram: Histogram, label: Optional[str] = None):
+    """Декоратор асинхронной функции, записывающий время её выполнения в гистограмму."""
+
+    def decorator(func):
+        series = histogram.labels(label or func.__name__)
+
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                series.observe(time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def render_metrics() -> str:
+    """Возвращает все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    return "\n".join(lines) + "\n"
+
+
+async def start_metrics_server(host: str, port: int):
+    """
+    Поднимает HTTP-сервер с эндпоинтом /metrics.
+
+    Returns:
+        aiohttp.web.AppRunner: Запущенный раннер; для остановки вызовите cleanup().
+    """
+    from aiohttp import web
+
+    async def handle(_request):
+        return web.Response(text=render_metrics(), content_type="text/plain", charset="utf-8")
+
+    app = web.Application()
+    app.router.add_get("/metrics", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    await web.TCPSite(runner, host=host, port=port).start()
+    logger.info(f"Эндпоинт метрик доступен на http://{host}:{port}/metrics")
+    return runner
@@ -0,0 +1,50 @@
+from typing import Any, Dict, List, Optional
+
+# Поля ответа /get_info, которые сохраняются в таблицы metrics и metric_samples
+SYSTEM_FIELDS = ("name", "kernel_version", "os_version", "host_name")
+MEMORY_FIELDS = (
+    "total_ram_gb", "total_ram_mb", "used_ram_gb", "used_ram_mb", "ram_percent",
+    "total_swap_gb", "total_swap_mb", "used_swap_gb", "used_swap_mb", "swap_percent",
+)
+
+
+def metrics_problem(data: Any) -> Optional[str]:
+    """
+    Проверяет, что ответ агента содержит всё, что сохраняется в БД.
+
+    Args:
+        data (Any): Разобранный JSON ответа /get_info.
+
+    Returns:
+        Optional[str]: Описание первой найденной проблемы или None, если ответ пригоден.
+    """
+    if not isinstance(data, dict):
+        return "ответ не является объектом"
+    system, memory = data.get("system"), data.get("memory")
+    if not isinstance(system, dict):
+        return "нет раздела system"
+    if not isinstance(memory, dict):
+        return "нет раздела memory"
+    for field in SYSTEM_FIELDS:
+        if not isinstance(system.get(field), str):
+            return f"нет строки system.{field}"
+    for field in MEMORY_FIELDS:
+        value = memory.get(field)
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return f"нет числа memory.{field}"
+    disks = data.get("disks")
+    if not isinstance(disks, list) or not all(isinstance(disk, dict) for disk in disks):
+        return "disks не является списком объектов"
+    if not isinstance(data.get("components"), list):
+        return "components не является списком"
+    return None
+
+
+def disk_usage_percent(disks: List[Dict[str, Any]]) -> float:
+    """Возвращает заполненность самого занятого диска в процентах."""
+    usage = 0.0
+    for disk in disks or ():
+        total = disk.get("total_space_mb") or 0
+        if total > 0:
+            usage = max(usage, 100.0 * (1.0 - (disk.get("available_space_mb") or 0) / total))
+    return usage
@@ -1,21 +1,93 @@
 import httpx
-from typing import Union, Dict, Any
+import time
+from typing import Union, Dict, Any, Optional
 import logging
 
+from app.utils.metrics import AGENT_REQUEST_SECONDS, AGENT_RESPONSE_BYTES, POLLS_IN_FLIGHT
+
 logger = logging.getLogger(__name__)
 
-async def send_request(ip: str, port: str, timeout: int = 10, endpoint: str = "/get_info") -> Union[Dict[str, Any], str]:
+_client: Optional[httpx.AsyncClient] = None
+# ETag сохранённого ответа агента по URL; отправляется в If-None-Match
+_etags: Dict[str, str] = {}
+# ETag полученного, но ещё не сохранённого вызывающим кодом ответа
+_pending_etags: Dict[str, str] = {}
+
+
+class _NotModified:
+    """Маркер ответа 304: данные агента не изменились с прошлого запроса."""
+
+    def __repr__(self) -> str:
+        return "NOT_MODIFIED"
+
+
+NOT_MODIFIED = _NotModified()
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """Возвращает общий HTTP-клиент, создавая его при первом обращении."""
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient()
+        logger.debug("HTTP-клиент создан")
+    return _client
+
+
+def _agent_url(ip: str, port: str, endpoint: str) -> str:
+    host = f"[{ip}]" if ":" in ip else ip
+    return f"http://{host}:{port}{endpoint}"
+
+
+def commit_etag(ip: str, port: str, endpoint: str = "/get_info") -> None:
+    """
+    Подтверждает, что ответ условного запроса к агенту сохранён: его ETag будет отправлен
+    в следующем условном запросе, и 304 будет означать, что сохранённые данные актуальны.
+    """
+    url = _agent_url(ip, port, endpoint)
+    etag = _pending_etags.pop(url, None)
+    if etag is not None:
+        _etags[url] = etag
+
+
+def forget_etag(ip: str, port: str, endpoint: str = "/get_info") -> None:
+    """Забывает ETag агента: следующий условный запрос получит ответ целиком."""
+    url = _agent_url(ip, port, endpoint)
+    _etags.pop(url, None)
+    _pending_etags.pop(url, None)
+
+
+async def close_http_client() -> None:
+    """Закрывает общий HTTP-клиент, если он был создан."""
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        logger.debug("HTTP-клиент закрыт")
+    _client = None
+
+
+async def send_request(ip: str, port: str, timeout: float = 10, endpoint: str = "/get_info",
+                       connect_timeout: Optional[float] = None,
+                       conditional: bool = False, quiet: bool = False) -> Union[Dict[str, Any], str, _NotModified]:
     """
     Выполняет асинхронный HTTP-запрос к хосту для получения информации.
 
     Args:
         ip (str): IP-адрес хоста.
         port (str): Порт хоста.
-        timeout (int, optional): Тайм-аут запроса в секундах. По умолчанию 10.
+        timeout (float, optional): Тайм-аут запроса в секундах. По умолчанию 10.
         endpoint (str, optional): Конечная точка API. По умолчанию "/get_info".
+        connect_timeout (float, optional): Отдельный тайм-аут на установку соединения. По умолчанию равен timeout.
+        conditional (bool, optional): Отправить If-None-Match с ETag последнего сохранённого ответа.
+            Вызывающий код должен уметь обработать NOT_MODIFIED, а после сохранения ответа 200 —
+            вызвать commit_etag(); до этого ETag нового ответа не используется.
+        quiet (bool, optional): Писать ошибки запроса в DEBUG, а не в WARNING/ERROR. Для сканирования,
+            где большинство адресов не отвечает.
 
     Returns:
-        Union[Dict[str, Any], str]: Словарь с данными от сервера или строка с описанием ошибки.
+        Union[Dict[str, Any], str, _NotModified]: Словарь с данными от сервера, строка с описанием ошибки
+            или NOT_MODIFIED, если агент ответил 304 (тело не скачивается и не разбирается).
+
+    Сжатие (gzip/deflate, br при установленном brotli) httpx согласует сам через Accept-Encoding.
 
     Examples:
             await send_request("192.168.1.1", "8080")
@@ -23,38 +95,66 @@ async def send_request(ip: str, port: str, timeout: int = 10, endpoint: str = "/
             await send_request("invalid_ip", "8080")
         "Не удалось выполнить запрос к invalid_ip:8080: ..."
     """
-    url = f"http://{ip}:{port}{endpoint}"
+    url = _agent_url(ip, port, endpoint)
     logger.debug(f"Отправка запроса к {url}")
 
+    log_warning = logger.debug if quiet else logger.warning
+    log_error = logger.debug if quiet else logger.error
+    outcome = "error"
+    start = time.perf_counter()
+    POLLS_IN_FLIGHT.inc()
     try:
-        async with httpx.AsyncClient(timeout=httpx.Timeout(timeout)) as client:
-            response = await client.get(url)
-            response.raise_for_status()
+        request_timeout = httpx.Timeout(timeout, connect=connect_timeout if connect_timeout is not None else timeout)
+        headers = None
+        if conditional and url in _etags:
+            headers = {"If-None-Match": _etags[url]}
+        response = await get_http_client().get(url, timeout=request_timeout, headers=headers)
+        AGENT_RESPONSE_BYTES.inc(response.num_bytes_downloaded)
+        if response.status_code == 304:
+            outcome = "not_modified"
+            logger.debug(f"Данные {ip}:{port} не изменились")
+            return NOT_MODIFIED
+        response.raise_for_status()
 
-            data = response.json()
-            if not data:
-                logger.warning(f"Пустой ответ от {ip}:{port}")
-                return f"Ответ от {ip}:{port} пустой"
-            logger.debug(f"Успешный ответ от {ip}:{port}: {data}")
-            return data
+        data = response.json()
+        if not data:
+            outcome = "empty"
+            log_warning(f"Пустой ответ от {ip}:{port}")
+            return f"Ответ от {ip}:{port} пустой"
+        if conditional:
+            etag = response.headers.get("ETag")
+            if etag:
+                _pending_etags[url] = etag
+            else:
+                forget_etag(ip, port, endpoint)
+        outcome = "ok"
+        logger.debug(f"Успешный ответ от {ip}:{port}: {data}")
+        return data
 
     except httpx.TimeoutException:
+        outcome = "timeout"
         error_msg = f"Превышено время ожидания ({timeout} сек) для {ip}:{port}"
-        logger.warning(error_msg)
+        log_warning(error_msg)
         return error_msg
     except httpx.HTTPStatusError as e:
+        outcome = "http_error"
         error_msg = f"HTTP ошибка {e.response.status_code} при запросе к {ip}:{port}"
-        logger.error(error_msg)
+        log_error(error_msg)
         return error_msg
     except httpx.RequestError as e:
+        outcome = "request_error"
         error_msg = f"Не удалось выполнить запрос к {ip}:{port}: {str(e)}"
-        logger.error(error_msg)
+        log_error(error_msg)
         return error_msg
     except ValueError as e:
+        outcome = "parse_error"
         error_msg = f"Ошибка разбора JSON от {ip}:{port}: {str(e)}"
-        logger.error(error_msg)
+        log_error(error_msg)
         return error_msg
     except Exception as e:
         error_msg = f"Неизвестная ошибка при запросе к {ip}:{port}: {str(e)}"
-        logger.error(error_msg)
+        log_error(error_msg)
         return error_msg
+    finally:
+        POLLS_IN_FLIGHT.dec()
+        AGENT_REQUEST_SECONDS.labels(outcome).observe(time.perf_counter() - start)
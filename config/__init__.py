@@ -1 +1,3 @@
-from .config import BOT_TOKEN, DB_URL
\ No newline at end of file
+from .config import BOT_TOKEN, DB_URL, DB_READ_URL, DB_READ_MAX_STALENESS, METRICS_HOST, METRICS_PORT, \
+    POLLER_WORKERS, POLLER_INTERVAL, POLLER_METRICS_PORT, ANOMALY_DISKS, REPORT_HOUR, REPORT_RATE, REPORT_WORKERS, \
+    SCAN_ALLOWED_NETWORKS
@@ -5,3 +5,15 @@ load_dotenv()
 
 BOT_TOKEN=os.getenv('BOT_TOKEN')
 DB_URL=os.getenv('DB_URL')
+DB_READ_URL=os.getenv('DB_READ_URL')
+DB_READ_MAX_STALENESS=float(os.getenv('DB_READ_MAX_STALENESS') or 0)
+METRICS_HOST=os.getenv('METRICS_HOST', '127.0.0.1')
+METRICS_PORT=int(os.getenv('METRICS_PORT') or 0)
+POLLER_WORKERS=int(os.getenv('POLLER_WORKERS') or os.cpu_count() or 1)
+POLLER_INTERVAL=float(os.getenv('POLLER_INTERVAL') or 60)
+POLLER_METRICS_PORT=int(os.getenv('POLLER_METRICS_PORT') or 0)
+ANOMALY_DISKS=int(os.getenv('ANOMALY_DISKS') or 8)
+REPORT_HOUR=int(os.getenv('REPORT_HOUR') or 9)
+REPORT_RATE=float(os.getenv('REPORT_RATE') or 5)
+REPORT_WORKERS=int(os.getenv('REPORT_WORKERS') or 2)
+SCAN_ALLOWED_NETWORKS=os.getenv('SCAN_ALLOWED_NETWORKS', '')
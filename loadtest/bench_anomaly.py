@@ -0,0 +1,95 @@
+import argparse
+import statistics
+import time
+from typing import Any, Dict, List
+
+import numpy as np
+
+from app.utils.anomaly import AnomalyDetector, BASE_SERIES
+
+
+def _payloads(ram: np.ndarray, swap: np.ndarray, disks: np.ndarray) -> List[Dict[str, Any]]:
+    """Ответы агентов с полями, которые читает детектор: память и диски."""
+    return [
+        {
+            "memory": {"ram_percent": float(ram[host]), "swap_percent": float(swap[host])},
+            "disks": [
+                {"mount_point": f"/mnt/disk{disk}", "total_space_mb": 1000.0,
+                 "available_space_mb": float(1000.0 - 10.0 * disks[host, disk])}
+                for disk in range(disks.shape[1])
+            ],
+        }
+        for host in range(len(ram))
+    ]
+
+
+def run(hosts: int, series: int, cycles: int, leaks: int, jumps: int, seed: int) -> None:
+    disk_count = series - len(BASE_SERIES)
+    rng = np.random.default_rng(seed)
+    detector = AnomalyDetector(disks=disk_count, capacity=hosts)
+    ram = rng.uniform(20, 70, hosts)
+    swap = rng.uniform(0, 30, hosts)
+    disks = rng.uniform(10, 60, (hosts, disk_count))
+    leak_hosts = set(rng.choice(hosts, leaks, replace=False).tolist())
+    jump_hosts = set(rng.choice(sorted(set(range(hosts)) - leak_hosts), jumps, replace=False).tolist())
+    leak_index = np.fromiter(leak_hosts, dtype=np.int64)
+    jump_index = np.fromiter(jump_hosts, dtype=np.int64)
+    leak_start = detector.warmup
+
+    extract_times: List[float] = []
+    score_times: List[float] = []
+    found: Dict[str, set] = {"leak": set(), "jump": set()}
+    for cycle in range(cycles):
+        noisy_disks = disks + rng.normal(0, 0.3, disks.shape)
+        if cycle >= leak_start:
+            # Медленная утечка: последний диск заполняется на 1 п.п. за опрос
+            noisy_disks[leak_index, -1] += cycle - leak_start + 1
+        noisy_ram = ram + rng.normal(0, 2.0, hosts)
+        if cycle == cycles - 1:
+            noisy_ram[jump_index] = 99.0
+        payloads = _payloads(noisy_ram, swap + rng.normal(0, 1.0, hosts), np.clip(noisy_disks, 0, 100))
+
+        started = time.perf_counter()
+        rows = {host: detector.values(host, payload) for host, payload in enumerate(payloads)}
+        extracted = time.perf_counter()
+        anomalies = detector.observe_rows(rows)
+        scored = time.perf_counter()
+        extract_times.append(extracted - started)
+        score_times.append(scored - extracted)
+        for host_id, _, kind, _ in anomalies:
+            found[kind].add(host_id)
+
+    state_bytes = sum(getattr(detector, name).nbytes
+                      for name in ("_mean", "_var", "_trend", "_step_var", "_last", "_quantile", "_count"))
+    print(f"Хостов: {hosts}, рядов на хост: {series}, циклов: {cycles}")
+    print(f"Разбор ответов за цикл: медиана {statistics.median(extract_times) * 1000:.1f} мс, "
+          f"макс {max(extract_times) * 1000:.1f} мс")
+    print(f"Оценка цикла (observe): медиана {statistics.median(score_times) * 1000:.1f} мс, "
+          f"макс {max(score_times) * 1000:.1f} мс")
+    print(f"Состояние детектора: {state_bytes / 2 ** 20:.1f} МиБ")
+    # Ложные срабатывания — хосты без внесённой аномалии; считаются против всех оценённых наблюдений
+    observations = hosts * series * (cycles - detector.warmup)
+    for kind, injected in (("leak", leak_hosts), ("jump", jump_hosts)):
+        hits = found[kind] & injected
+        print(f"{kind}: внесено {len(injected)}, найдено {len(hits)}, "
+              f"ложных хостов {len(found[kind] - injected)} на {observations} наблюдений после прогрева")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Стоимость детектора аномалий на цикл опроса: разбор ответов и векторная оценка "
+                    "всех рядов, плюс полнота на внесённых утечках и скачках.")
+    parser.add_argument("--hosts", type=int, default=10000)
+    parser.add_argument("--series", type=int, default=20, help="рядов на хост: RAM, Swap и диски")
+    parser.add_argument("--cycles", type=int, default=40)
+    parser.add_argument("--leaks", type=int, default=50)
+    parser.add_argument("--jumps", type=int, default=50)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    if args.series <= len(BASE_SERIES):
+        parser.error(f"--series должен быть больше {len(BASE_SERIES)}")
+    run(args.hosts, args.series, args.cycles, args.leaks, args.jumps, args.seed)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import tempfile
+import time
+from typing import List, Tuple
+
+
+def _run_farm(first: int, count: int, change_every: float, addresses, stop) -> None:
+    """Процесс фермы агентов: поднимает count агентов и работает до события stop."""
+    from loadtest.replay import AgentSwarm
+
+    async def farm():
+        swarm = AgentSwarm(count, first=first, change_every=change_every)
+        await swarm.start()
+        addresses.put(swarm.addresses)
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, stop.wait)
+        await swarm.stop()
+
+    logging.disable(logging.INFO)
+    asyncio.run(farm())
+
+
+def start_farm(hosts: int, processes: int, change_every: float) -> Tuple[List[Tuple[str, int]], list, object]:
+    """
+    Запускает ферму поддельных агентов в отдельных процессах, чтобы агенты не
+    делили ядра с поллером.
+
+    Returns:
+        Tuple: (адреса агентов, процессы фермы, событие остановки).
+    """
+    context = multiprocessing.get_context("spawn")
+    addresses, stop = context.Queue(), context.Event()
+    per_process = -(-hosts // processes)
+    farms = []
+    for first in range(0, hosts, per_process):
+        process = context.Process(target=_run_farm, daemon=True,
+                                  args=(first, min(per_process, hosts - first), change_every, addresses, stop))
+        process.start()
+        farms.append(process)
+    result = []
+    for _ in farms:
+        result.extend(addresses.get())
+    return sorted(result), farms, stop
+
+
+def _counting_supervisor(workers: int):
+    """
+    Супервизор, который только считает полученные сэмплы, не сохраняя их в БД.
+    Так измеряется масштабирование опроса (воркеры + IPC), а не единственного писателя.
+    """
+    from app.poller.supervisor import PollerSupervisor
+    from app.utils.metrics import apply_metrics_delta
+
+    class CountingSupervisor(PollerSupervisor):
+        async def _writer(self) -> None:
+            loop = asyncio.get_running_loop()
+            while True:
+                message = await loop.run_in_executor(None, self._result_queue.get)
+                if message is None:
+                    return
+                kind, _, payload = message
+                if kind == "metrics":
+                    apply_metrics_delta(payload[0])
+                elif kind not in ("cycle", "unchanged", "failed"):
+                    self.samples_written += len(payload)
+
+    return CountingSupervisor(workers=workers, interval=0, refresh_interval=3600)
+
+
+async def _measure(workers: int, warmup: float, duration: float, write: bool) -> float:
+    from app.poller.supervisor import PollerSupervisor
+
+    if write:
+        supervisor = PollerSupervisor(workers=workers, interval=0, refresh_interval=3600)
+    else:
+        supervisor = _counting_supervisor(workers)
+    task = asyncio.create_task(supervisor.run())
+    try:
+        await asyncio.sleep(warmup)
+        written = supervisor.samples_written
+        started = time.perf_counter()
+        await asyncio.sleep(duration)
+        return (supervisor.samples_written - written) / (time.perf_counter() - started)
+    finally:
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+
+async def _run(args, addresses: List[Tuple[str, int]]) -> None:
+    from app.database.models import async_main, dispose_engine
+    from app.database.requests import set_user, add_hosts_bulk
+
+    await async_main()
+    await set_user(1)
+    await add_hosts_bulk(1, [(f"agent{index}", ip, port) for index, (ip, port) in enumerate(addresses)])
+    try:
+        print(f"{'воркеров':>9}{'сэмплов/сек':>14}{'ускорение':>12}{'эффективность':>15}")
+        baseline = None
+        for workers in range(1, args.max_workers + 1):
+            rate = await _measure(workers, args.warmup, args.duration, args.write)
+            baseline = baseline or rate
+            speedup = rate / baseline
+            print(f"{workers:>9}{rate:>14.0f}{speedup:>12.2f}{speedup / workers:>15.0%}")
+    finally:
+        await dispose_engine()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Масштабирование поллера: сэмплов в секунду при 1..N воркерах против фермы "
+                    "поддельных агентов. Агенты отдают новые данные на каждый запрос (без 304).")
+    parser.add_argument("--hosts", type=int, default=2000)
+    parser.add_argument("--max-workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--farm-processes", type=int, default=max(1, (os.cpu_count() or 1) // 2))
+    parser.add_argument("--warmup", type=float, default=3.0)
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--db-url", default=None, help="БД для прогона; по умолчанию временный файл SQLite")
+    parser.add_argument("--write", action="store_true",
+                        help="сохранять сэмплы в БД; тогда узким местом обычно становится писатель, "
+                             "а остановка ждёт, пока он разберёт накопившуюся очередь")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    addresses, farms, stop = start_farm(args.hosts, args.farm_processes, change_every=0)
+    try:
+        with tempfile.TemporaryDirectory() as tmp:
+            # DB_URL читается при импорте config и наследуется воркерами через окружение
+            os.environ["DB_URL"] = args.db_url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'poller.db')}"
+            asyncio.run(_run(args, addresses))
+    finally:
+        stop.set()
+        for process in farms:
+            process.join(timeout=5)
+
+
+if __name__ == '__main__':
+    main()
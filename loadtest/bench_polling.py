@@ -0,0 +1,59 @@
+import argparse
+import asyncio
+import logging
+import time
+
+from app.utils import send_request as agent_client
+from app.utils.metrics import AGENT_RESPONSE_BYTES
+from loadtest.stub_agent import StubAgent, bound_port, brotli
+
+
+async def _run(polls: int, encoding: str, conditional: bool, disks: int, components: int):
+    agent = StubAgent(change_every=3600, disks=disks, components=components, compress=encoding != "identity")
+    runner = await agent.start()
+    port = str(bound_port(runner))
+    agent_client.forget_etag("127.0.0.1", port)
+    agent_client.get_http_client().headers["Accept-Encoding"] = encoding
+    bytes_before = AGENT_RESPONSE_BYTES.value
+    cpu_before = time.process_time()
+    not_modified = 0
+    try:
+        for _ in range(polls):
+            result = await agent_client.send_request("127.0.0.1", port, conditional=conditional)
+            if result is agent_client.NOT_MODIFIED:
+                not_modified += 1
+            elif isinstance(result, str):
+                raise RuntimeError(result)
+            elif conditional:
+                agent_client.commit_etag("127.0.0.1", port)
+    finally:
+        await agent_client.close_http_client()
+        await runner.cleanup()
+    cpu = time.process_time() - cpu_before
+    return (AGENT_RESPONSE_BYTES.value - bytes_before) / polls, cpu / polls * 1e6, not_modified
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Байты и CPU на один опрос агента. "
+                                                 "Агент работает в том же процессе, CPU включает и его долю.")
+    parser.add_argument("--polls", type=int, default=500)
+    parser.add_argument("--disks", type=int, default=32)
+    parser.add_argument("--components", type=int, default=64)
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    modes = [("без сжатия", "identity", False), ("gzip", "gzip", False)]
+    if brotli is not None:
+        modes += [("br", "br", False), ("br + ETag", "br", True)]
+    else:
+        modes += [("gzip + ETag", "gzip", True)]
+        print("brotli не установлен, режимы br пропущены")
+
+    print(f"{'режим':<24}{'байт/опрос':>12}{'CPU мкс/опрос':>16}{'304':>8}")
+    for name, encoding, conditional in modes:
+        size, cpu, not_modified = await _run(args.polls, encoding, conditional, args.disks, args.components)
+        print(f"{name:<24}{size:>12.0f}{cpu:>16.0f}{not_modified:>8}")
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -0,0 +1,164 @@
+import asyncio
+import json
+import logging
+import time
+from collections import Counter
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from aiohttp import web
+
+logger = logging.getLogger(__name__)
+
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "Fake", "username": "fake_bot"}
+MAX_UPDATES = 100
+
+Call = Dict[str, Any]
+Predicate = Callable[[Call], bool]
+
+
+def _chat(chat_id: int) -> Dict[str, Any]:
+    return {"id": chat_id, "type": "private", "first_name": f"user{chat_id}"}
+
+
+def _user(user_id: int) -> Dict[str, Any]:
+    return {"id": user_id, "is_bot": False, "first_name": f"user{user_id}"}
+
+
+class FakeTelegram:
+    """
+    Поддельный Bot API для нагрузочных прогонов без Telegram.
+
+    Апдейты кладутся в очередь методами message()/callback() и отдаются боту через
+    long polling getUpdates. Вызовы бота (sendMessage, editMessageText, ...) записываются,
+    а ожидающие их сценарии получают вызов через future из expect().
+    Задержка latency имитирует время ответа настоящего Bot API.
+    """
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+        self.calls = Counter()
+        self._updates: List[Dict[str, Any]] = []
+        self._next_update_id = 1
+        self._new_updates = asyncio.Event()
+        self._message_ids: Dict[int, int] = {}
+        self._waiters: Dict[int, List[Tuple[Predicate, asyncio.Future]]] = {}
+
+    # Апдейты от пользователей
+
+    def _push(self, update: Dict[str, Any]) -> None:
+        update["update_id"] = self._next_update_id
+        self._next_update_id += 1
+        self._updates.append(update)
+        self._new_updates.set()
+
+    def _new_message_id(self, chat_id: int) -> int:
+        self._message_ids[chat_id] = self._message_ids.get(chat_id, 0) + 1
+        return self._message_ids[chat_id]
+
+    def message(self, user_id: int, text: str) -> None:
+        """Пользователь отправляет боту текстовое сообщение."""
+        self._push({"message": {
+            "message_id": self._new_message_id(user_id), "date": int(time.time()),
+            "chat": _chat(user_id), "from": _user(user_id), "text": text,
+        }})
+
+    def callback(self, user_id: int, message_id: int, data: str) -> None:
+        """Пользователь нажимает инлайн-кнопку под сообщением бота message_id."""
+        self._push({"callback_query": {
+            "id": str(self._next_update_id), "from": _user(user_id), "chat_instance": str(user_id), "data": data,
+            "message": {"message_id": message_id, "date": int(time.time()), "chat": _chat(user_id),
+                        "from": BOT_USER, "text": "..."},
+        }})
+
+    def expect(self, chat_id: int, predicate: Predicate) -> asyncio.Future:
+        """
+        Возвращает future, который завершится первым вызовом бота в чате chat_id,
+        удовлетворяющим predicate. Регистрировать ожидание нужно до отправки апдейта.
+        """
+        future = asyncio.get_running_loop().create_future()
+        self._waiters.setdefault(chat_id, []).append((predicate, future))
+        return future
+
+    # Вызовы бота
+
+    def _record(self, call: Call) -> None:
+        waiters = self._waiters.get(call["chat_id"])
+        if not waiters:
+            return
+        for index, (predicate, future) in enumerate(waiters):
+            if future.done():
+                continue
+            if predicate(call):
+                future.set_result(call)
+                del waiters[index]
+                return
+
+    async def _get_updates(self, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+        offset = int(params.get("offset") or 0)
+        timeout = float(params.get("timeout") or 0)
+        self._updates = [update for update in self._updates if update["update_id"] >= offset]
+        if not self._updates and timeout:
+            self._new_updates.clear()
+            try:
+                await asyncio.wait_for(self._new_updates.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+        return self._updates[:MAX_UPDATES]
+
+    def _bot_message(self, chat_id: int, message_id: int, params: Dict[str, Any]) -> Dict[str, Any]:
+        message = {"message_id": message_id, "date": int(time.time()), "chat": _chat(chat_id), "from": BOT_USER}
+        if "text" in params:
+            message["text"] = params["text"]
+        return message
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        params = dict(await request.post())
+        self.calls[method] += 1
+        if method == "getUpdates":
+            return web.json_response({"ok": True, "result": await self._get_updates(params)})
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+        result: Any = True
+        if method == "getMe":
+            result = BOT_USER
+        elif "chat_id" in params:
+            chat_id = int(params["chat_id"])
+            reply_markup = params.get("reply_markup")
+            call = {
+                "method": method, "chat_id": chat_id, "text": params.get("text"),
+                "reply_markup": json.loads(reply_markup) if isinstance(reply_markup, str) else None,
+                "at": time.perf_counter(),
+            }
+            if method.startswith("send"):
+                message_id = self._new_message_id(chat_id)
+                result = self._bot_message(chat_id, message_id, params)
+            elif method.startswith("edit"):
+                message_id = int(params["message_id"])
+                result = self._bot_message(chat_id, message_id, params)
+            else:
+                message_id = int(params.get("message_id") or 0)
+            call["message_id"] = message_id
+            self._record(call)
+        return web.json_response({"ok": True, "result": result})
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+        """Запускает сервер и возвращает раннер. Базовый адрес для бота — http://host:port."""
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host=host, port=port).start()
+        return runner
+
+
+def button_data(call: Call) -> List[str]:
+    """Возвращает callback_data всех инлайн-кнопок из вызова бота."""
+    rows = (call.get("reply_markup") or {}).get("inline_keyboard") or []
+    return [button["callback_data"] for row in rows for button in row if "callback_data" in button]
+
+
+def find_button(call: Call, prefix: str) -> Optional[str]:
+    """Возвращает первую callback_data кнопки, начинающуюся с prefix."""
+    return next((data for data in button_data(call) if data.startswith(prefix)), None)
@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import logging
+import os
+import random
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import event
+
+from app.messages import WAITING_FOR_RESPONSE, ERROR_FETCHING_DATA
+from app.utils.metrics import DB_QUERY_SECONDS, AGENT_REQUEST_SECONDS
+from loadtest.fake_telegram import FakeTelegram, Call, Predicate, find_button
+from loadtest.stub_agent import StubAgent, bound_port
+
+logger = logging.getLogger(__name__)
+
+FAKE_TOKEN = "123456:replay"
+DOWN_PORT = 1
+# DuplicateCallbackMiddleware отбрасывает повторное нажатие той же кнопки в течение 2 секунд
+DUPLICATE_WINDOW = 2.0
+
+
+class AgentSwarm:
+    """
+    Набор поддельных агентов /get_info, по одному на адрес 127.0.x.y.
+
+    У хостов в БД уникальный IP, поэтому каждый агент слушает свой loopback-адрес
+    (на Linux вся сеть 127.0.0.0/8 локальная). Доля slow_fraction агентов отвечает
+    с задержкой slow_latency, доля down_fraction не запущена и отклоняет соединения.
+    Адреса нумеруются с first, так что рой можно разделить между процессами.
+    По умолчанию каждый агент слушает свободный порт; с port все агенты слушают один.
+    """
+
+    def __init__(self, count: int, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 slow_fraction: float = 0.0, slow_latency: float = 2.0, down_fraction: float = 0.0,
+                 seed: int = 0, first: int = 0, change_every: float = 60.0, port: int = 0):
+        self.count = count
+        self.first = first
+        self.change_every = change_every
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.slow_fraction = slow_fraction
+        self.slow_latency = slow_latency
+        self.down_fraction = down_fraction
+        self._rng = random.Random(seed)
+        self.agents: List[StubAgent] = []
+        self.addresses: List[Tuple[str, int]] = []
+        self._runners = []
+
+    async def start(self) -> None:
+        for index in range(self.first, self.first + self.count):
+            ip = f"127.0.{index // 254}.{index % 254 + 1}"
+            roll = self._rng.random()
+            if roll < self.down_fraction:
+                self.addresses.append((ip, DOWN_PORT))
+                continue
+            latency = self.slow_latency if roll < self.down_fraction + self.slow_fraction else self.latency
+            agent = StubAgent(host_name=f"agent{index}", change_every=self.change_every, latency=latency,
+                              jitter=self.jitter, error_rate=self.error_rate)
+            runner = await agent.start(host=ip, port=self.port)
+            self.agents.append(agent)
+            self._runners.append(runner)
+            self.addresses.append((ip, bound_port(runner)))
+
+    async def stop(self) -> None:
+        for runner in self._runners:
+            await runner.cleanup()
+
+
+def percentile(values: List[float], q: float) -> float:
+    """Перцентиль q (0-100) по методу ближайшего ранга; values должны быть отсортированы."""
+    if not values:
+        return 0.0
+    rank = max(0, min(len(values) - 1, round(q / 100 * len(values) + 0.5) - 1))
+    return values[rank]
+
+
+class ReplayStats:
+    """Задержки шагов сценария от отправки апдейта до ответного вызова Bot API."""
+
+    def __init__(self):
+        self.latencies: Dict[str, List[float]] = defaultdict(list)
+        self.timeouts: Dict[str, int] = defaultdict(int)
+        self.poll_errors = 0
+        self.sessions_done = 0
+        self.sessions_failed = 0
+
+    def observe(self, step: str, seconds: float) -> None:
+        self.latencies[step].append(seconds)
+
+
+def _edited(call: Call) -> bool:
+    return call["method"] == "editMessageText"
+
+
+def _sent(call: Call) -> bool:
+    return call["method"] == "sendMessage"
+
+
+def _poll_finished(call: Call) -> bool:
+    return _edited(call) and not (call["text"] or "").startswith(WAITING_FOR_RESPONSE)
+
+
+class Session:
+    """
+    Сценарий одного пользователя: /start, добавление хоста, список, карточка,
+    опрос агента, переключение краткого формата и повторный просмотр карточки.
+    Данные кнопок берутся из клавиатур, которые прислал бот. Перед повторным нажатием
+    той же кнопки сценарий ждёт DUPLICATE_WINDOW, это время в задержку не входит.
+    """
+
+    def __init__(self, api: FakeTelegram, stats: ReplayStats, user_id: int, agent: Tuple[str, int],
+                 think: float, timeout: float):
+        self.api = api
+        self.stats = stats
+        self.user_id = user_id
+        self.agent = agent
+        self.think = think
+        self.timeout = timeout
+        self._pressed: Dict[Tuple[int, str], float] = {}
+
+    async def _step(self, name: str, predicate: Predicate, text: Optional[str] = None,
+                    on: Optional[Call] = None, data: Optional[str] = None) -> Call:
+        if self.think:
+            await asyncio.sleep(self.think)
+        key = (on["message_id"], data) if on is not None else None
+        pressed_at = self._pressed.get(key)
+        if pressed_at is not None:
+            await asyncio.sleep(max(0.0, pressed_at + DUPLICATE_WINDOW - time.monotonic()))
+        future = self.api.expect(self.user_id, predicate)
+        started = time.perf_counter()
+        if on is None:
+            self.api.message(self.user_id, text)
+        else:
+            self.api.callback(self.user_id, on["message_id"], data)
+        try:
+            call = await asyncio.wait_for(future, self.timeout)
+        except asyncio.TimeoutError:
+            self.stats.timeouts[name] += 1
+            raise
+        if key is not None:
+            # Момент ответа бота не раньше момента, когда нажатие увидел DuplicateCallbackMiddleware
+            self._pressed[key] = time.monotonic()
+        self.stats.observe(name, call["at"] - started)
+        return call
+
+    async def run(self) -> None:
+        ip, port = self.agent
+        menu = await self._step("start", _sent, text="/start")
+        await self._step("add_host", _edited, on=menu, data="add_host")
+        await self._step("host_name", _sent, text=f"host{self.user_id}")
+        await self._step("host_ip", _sent, text=ip)
+        added = await self._step("host_port", _sent, text=str(port))
+        listing = await self._step("list_hosts", _edited, on=added, data="list_hosts")
+        host_button = find_button(listing, "h:")
+        card = await self._step("host_info", _edited, on=listing, data=host_button)
+        result = await self._step("poll", _poll_finished, on=card, data=find_button(card, "p:"))
+        if (result["text"] or "").startswith(ERROR_FETCHING_DATA):
+            self.stats.poll_errors += 1
+        await self._step("settings", _edited, on=result, data="settings")
+        settings = await self._step("switch_short", _edited, on=result, data="switch_short")
+        await self._step("host_info_short", _edited, on=settings, data=host_button)
+
+
+class StatementCounter:
+    """
+    Считает SQL-операторы, которые движки отправили в БД, по первому слову (SELECT, INSERT, ...).
+
+    Слушает before_cursor_execute, поэтому executemany считается одним оператором,
+    а вызов функции из app.database.requests — столькими, сколько операторов он выполнил.
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany) -> None:
+        self.counts[statement.lstrip().split(None, 1)[0].upper()] += 1
+
+    def attach(self, engine) -> None:
+        event.listen(engine.sync_engine, "before_cursor_execute", self)
+
+    def detach(self, engine) -> None:
+        event.remove(engine.sync_engine, "before_cursor_execute", self)
+
+
+def _call_counts() -> Dict[str, int]:
+    return {name: series.count for name, series in DB_QUERY_SECONDS._series.items()}
+
+
+def _agent_outcomes() -> Dict[str, int]:
+    return {name: series.count for name, series in AGENT_REQUEST_SECONDS._series.items()}
+
+
+def _print_report(stats: ReplayStats, elapsed: float, sessions: int, statements: Dict[str, int],
+                  calls: Dict[str, int], outcomes: Dict[str, int], api: FakeTelegram) -> None:
+    print(f"Сессий: {stats.sessions_done} завершено, {stats.sessions_failed} с ошибкой из {sessions} "
+          f"за {elapsed:.1f} сек ({stats.sessions_done / elapsed:.2f} сессий/сек)")
+    print()
+    print(f"{'шаг':<18}{'n':>6}{'p50 мс':>10}{'p90 мс':>10}{'p99 мс':>10}{'max мс':>10}{'таймауты':>10}")
+    for step, values in stats.latencies.items():
+        values = sorted(values)
+        print(f"{step:<18}{len(values):>6}"
+              + "".join(f"{percentile(values, q) * 1000:>10.1f}" for q in (50, 90, 99))
+              + f"{values[-1] * 1000:>10.1f}{stats.timeouts.get(step, 0):>10}")
+    all_values = sorted(value for values in stats.latencies.values() for value in values)
+    print(f"{'все шаги':<18}{len(all_values):>6}"
+          + "".join(f"{percentile(all_values, q) * 1000:>10.1f}" for q in (50, 90, 99))
+          + f"{(all_values[-1] if all_values else 0) * 1000:>10.1f}{sum(stats.timeouts.values()):>10}")
+    print()
+    sessions_done = max(stats.sessions_done, 1)
+    total_statements = sum(statements.values())
+    print(f"SQL-операторов: {total_statements} ({total_statements / sessions_done:.1f} на сессию)")
+    for verb, count in statements.most_common():
+        print(f"  {verb:<32}{count:>8}")
+    total_calls = sum(calls.values())
+    print(f"Вызовов функций БД: {total_calls} ({total_calls / sessions_done:.1f} на сессию)")
+    for name, count in sorted(calls.items(), key=lambda item: -item[1]):
+        if count:
+            print(f"  {name:<32}{count:>8}")
+    print(f"Опросы агентов: {dict(outcomes)}, ошибок опроса в сценариях: {stats.poll_errors}")
+    print(f"Вызовы Bot API: {dict(api.calls.most_common())}")
+
+
+async def replay(args) -> None:
+    from main import create_app
+    from aiogram.client.session.aiohttp import AiohttpSession
+    from aiogram.client.telegram import TelegramAPIServer
+    from app.database.models import async_main, dispose_engine, get_engine, get_read_session_maker
+    from app.utils.background import cancel_background_tasks
+    from app.utils.send_request import close_http_client
+
+    api = FakeTelegram(latency=args.api_latency)
+    api_runner = await api.start()
+    swarm = AgentSwarm(args.users, latency=args.agent_latency, jitter=args.agent_jitter,
+                       error_rate=args.agent_error_rate, slow_fraction=args.slow_fraction,
+                       slow_latency=args.slow_latency, down_fraction=args.down_fraction, seed=args.seed)
+    await swarm.start()
+
+    await async_main()
+    session = AiohttpSession(api=TelegramAPIServer.from_base(f"http://127.0.0.1:{bound_port(api_runner)}"))
+    bot, dp = create_app(token=FAKE_TOKEN, session=session)
+    polling = asyncio.create_task(dp.start_polling(bot, handle_signals=False, close_bot_session=False))
+    while not api.calls["getUpdates"]:
+        await asyncio.sleep(0.01)
+
+    stats = ReplayStats()
+    # Подключается после async_main, чтобы не считать DDL создания схемы
+    counter = StatementCounter()
+    read_maker = get_read_session_maker()
+    engines = [get_engine()] + ([read_maker.kw["bind"]] if read_maker else [])
+    for engine in engines:
+        counter.attach(engine)
+    calls_before = _call_counts()
+    outcomes_before = _agent_outcomes()
+
+    async def run_session(user_id: int, agent: Tuple[str, int]) -> None:
+        try:
+            await Session(api, stats, user_id, agent, args.think, args.timeout).run()
+            stats.sessions_done += 1
+        except Exception as e:
+            stats.sessions_failed += 1
+            logger.warning(f"Сессия {user_id} прервана: {e!r}")
+
+    started = time.perf_counter()
+    tasks = []
+    try:
+        for index, agent in enumerate(swarm.addresses):
+            tasks.append(asyncio.create_task(run_session(1000 + index, agent)))
+            await asyncio.sleep(1.0 / args.rate)
+        await asyncio.gather(*tasks)
+        elapsed = time.perf_counter() - started
+    finally:
+        await dp.stop_polling()
+        await asyncio.gather(polling, return_exceptions=True)
+        await cancel_background_tasks()
+        await close_http_client()
+        for engine in engines:
+            counter.detach(engine)
+        await dispose_engine()
+        await bot.session.close()
+        await swarm.stop()
+        await api_runner.cleanup()
+
+    calls = {name: count - calls_before.get(name, 0) for name, count in _call_counts().items()}
+    outcomes = {name: count - outcomes_before.get(name, 0) for name, count in _agent_outcomes().items()}
+    _print_report(stats, elapsed, len(swarm.addresses), counter.counts, calls, outcomes, api)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Прогон реального роутера бота сценариями пользователей против поддельных "
+                    "Bot API и агентов. Всё работает в одном процессе и event loop.")
+    parser.add_argument("--users", type=int, default=50, help="Количество сессий (и агентов)")
+    parser.add_argument("--rate", type=float, default=10.0, help="Новых сессий в секунду")
+    parser.add_argument("--think", type=float, default=0.0, help="Пауза пользователя перед каждым шагом, сек")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Ожидание ответа бота на шаг, сек")
+    parser.add_argument("--api-latency", type=float, default=0.0, help="Задержка ответов Bot API, сек")
+    parser.add_argument("--agent-latency", type=float, default=0.0)
+    parser.add_argument("--agent-jitter", type=float, default=0.0)
+    parser.add_argument("--agent-error-rate", type=float, default=0.0, help="Доля ответов 500")
+    parser.add_argument("--slow-fraction", type=float, default=0.0, help="Доля медленных агентов")
+    parser.add_argument("--slow-latency", type=float, default=2.0)
+    parser.add_argument("--down-fraction", type=float, default=0.0, help="Доля недоступных агентов")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--db-url", default=None,
+                        help="БД для прогона; по умолчанию новый временный файл SQLite")
+    args = parser.parse_args()
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # DB_URL читается при импорте config, поэтому задаётся до импорта приложения
+        os.environ["DB_URL"] = args.db_url or f"sqlite+aiosqlite:///{os.path.join(tmp, 'replay.db')}"
+        asyncio.run(replay(args))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,158 @@
+import argparse
+import asyncio
+import hashlib
+import json
+import logging
+import random
+import time
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+# Качество brotli для динамических ответов: 11 (по умолчанию) слишком дорого по CPU
+BROTLI_QUALITY = 5
+
+
+def make_payload(host_name: str, disks: int = 8, components: int = 16, seed: int = 0) -> Dict[str, Any]:
+    """Формирует ответ /get_info в формате ServersInfoAPI."""
+    rng = random.Random(f"{host_name}:{seed}")
+    ram_percent = rng.uniform(10, 90)
+    swap_percent = rng.uniform(0, 50)
+    return {
+        "system": {
+            "name": "Linux",
+            "kernel_version": "6.1.0",
+            "os_version": "Linux 12 Debian GNU/Linux",
+            "host_name": host_name,
+        },
+        "memory": {
+            "total_ram_gb": 16.0, "total_ram_mb": 16384.0,
+            "used_ram_gb": 16.0 * ram_percent / 100, "used_ram_mb": 16384.0 * ram_percent / 100,
+            "ram_percent": ram_percent,
+            "total_swap_gb": 4.0, "total_swap_mb": 4096.0,
+            "used_swap_gb": 4.0 * swap_percent / 100, "used_swap_mb": 4096.0 * swap_percent / 100,
+            "swap_percent": swap_percent,
+        },
+        "disks": [
+            {
+                "name": f"/dev/sd{chr(ord('a') + i % 26)}{i // 26 or ''}",
+                "mount_point": f"/mnt/disk{i}",
+                "total_space_gb": 512.0, "total_space_mb": 524288.0,
+                "available_space_gb": available / 1024, "available_space_mb": available,
+            }
+            for i, available in enumerate(rng.uniform(1024, 524288) for _ in range(disks))
+        ],
+        "components": [
+            {"label": f"coretemp Core {i}", "temperature": rng.uniform(30, 80)} for i in range(components)
+        ],
+    }
+
+
+class StubAgent:
+    """
+    Поддельный агент ServersInfoAPI.
+
+    Данные меняются раз в change_every секунд (0 — на каждый запрос). Отдаёт ETag и
+    отвечает 304 на совпавший If-None-Match, сжимает ответ согласно Accept-Encoding
+    (br, если установлен brotli, иначе gzip/deflate средствами aiohttp).
+    Задержку и долю ошибок можно настроить для нагрузочных тестов.
+    """
+
+    def __init__(self, host_name: str = "stub", change_every: float = 60.0, disks: int = 8,
+                 components: int = 16, latency: float = 0.0, jitter: float = 0.0, error_rate: float = 0.0,
+                 etag: bool = True, compress: bool = True):
+        self.host_name = host_name
+        self.change_every = change_every
+        self.disks = disks
+        self.components = components
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.etag = etag
+        self.compress = compress
+        self.requests = 0
+        self._version: Optional[int] = None
+        self._body = b""
+        self._etag = ""
+
+    def _current(self) -> None:
+        version = self.requests if self.change_every <= 0 else int(time.monotonic() // self.change_every)
+        if version != self._version:
+            self._version = version
+            payload = make_payload(self.host_name, self.disks, self.components, seed=version)
+            self._body = json.dumps(payload).encode()
+            self._etag = '"' + hashlib.sha1(self._body).hexdigest() + '"'
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        self.requests += 1
+        delay = self.latency + (random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+        if self.error_rate and random.random() < self.error_rate:
+            return web.Response(status=500, text="stub failure")
+        self._current()
+        if self.etag and request.headers.get("If-None-Match") == self._etag:
+            return web.Response(status=304, headers={"ETag": self._etag})
+        response = web.Response(body=self._body, content_type="application/json")
+        if self.etag:
+            response.headers["ETag"] = self._etag
+        if self.compress:
+            if brotli is not None and "br" in request.headers.get("Accept-Encoding", ""):
+                # aiohttp сам сжимать в br не умеет
+                response.body = brotli.compress(self._body, quality=BROTLI_QUALITY)
+                response.headers["Content-Encoding"] = "br"
+            else:
+                response.enable_compression()
+        return response
+
+    def make_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/get_info", self.handle)
+        return app
+
+    async def start(self, host: str = "127.0.0.1", port: int = 0) -> web.AppRunner:
+        """Запускает агента и возвращает раннер. При port=0 порт выбирается системой."""
+        runner = web.AppRunner(self.make_app(), access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host=host, port=port)
+        await site.start()
+        return runner
+
+
+def bound_port(runner: web.AppRunner) -> int:
+    """Возвращает порт, на котором слушает запущенный раннер."""
+    return runner.addresses[0][1]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поддельный агент ServersInfoAPI (/get_info)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=7878)
+    parser.add_argument("--host-name", default="stub")
+    parser.add_argument("--change-every", type=float, default=60.0)
+    parser.add_argument("--disks", type=int, default=8)
+    parser.add_argument("--components", type=int, default=16)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--error-rate", type=float, default=0.0)
+    parser.add_argument("--no-etag", action="store_true")
+    parser.add_argument("--no-compress", action="store_true")
+    args = parser.parse_args()
+
+    agent = StubAgent(host_name=args.host_name, change_every=args.change_every, disks=args.disks,
+                      components=args.components, latency=args.latency, jitter=args.jitter,
+                      error_rate=args.error_rate, etag=not args.no_etag, compress=not args.no_compress)
+    logging.basicConfig(level=logging.INFO)
+    logger.info(f"Агент слушает http://{args.host}:{args.port}/get_info")
+    web.run_app(agent.make_app(), host=args.host, port=args.port, print=None, access_log=None)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,22 +1,56 @@
 import asyncio
-from aiogram import Bot, Dispatcher
-from aiogram.client.default import DefaultBotProperties
-from aiogram.enums import ParseMode
 
-from app.database.models import async_main
-from config import BOT_TOKEN
+from config import BOT_TOKEN, METRICS_HOST, METRICS_PORT, REPORT_HOUR, REPORT_RATE, REPORT_WORKERS
 
-from app.router import main_router
 
-bot = Bot(token=BOT_TOKEN, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
-dp = Dispatcher()
+def create_app(token: str = None, session=None):
+    """
+    Собирает бота и диспетчер. Тяжёлые зависимости импортируются только здесь.
+
+    Args:
+        token (str): Токен бота, по умолчанию BOT_TOKEN.
+        session: Сессия aiogram, например с другим адресом Bot API (см. loadtest.replay).
+    """
+    from aiogram import Bot, Dispatcher
+    from aiogram.client.default import DefaultBotProperties
+    from aiogram.enums import ParseMode
+
+    from app.router import get_main_router
+    from app.utils.event_isolation import ChatEventIsolation
+
+    bot = Bot(token=token or BOT_TOKEN, session=session, default=DefaultBotProperties(parse_mode=ParseMode.HTML))
+    dp = Dispatcher(events_isolation=ChatEventIsolation())
+    dp.include_router(get_main_router())
+    return bot, dp
+
 
 async def main():
-    await async_main()
-    dp.include_router(main_router)
+    from app.database.models import async_main, dispose_engine
+    from app.utils.send_request import close_http_client
+    from app.utils.background import run_in_background, cancel_background_tasks
+    from app.reports.retention import run_sample_retention
 
-    await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    bot, dp = create_app()
+    await async_main()
+    metrics_runner = None
+    if METRICS_PORT:
+        from app.utils.metrics import start_metrics_server
+        metrics_runner = await start_metrics_server(METRICS_HOST, METRICS_PORT)
+    run_in_background(run_sample_retention(), name="sample-retention")
+    if REPORT_HOUR >= 0:
+        from app.reports.scheduler import ReportScheduler
+        scheduler = ReportScheduler(bot, hour=REPORT_HOUR, rate=REPORT_RATE, workers=REPORT_WORKERS)
+        run_in_background(scheduler.run(), name="reports")
+    try:
+        await bot.delete_webhook(drop_pending_updates=True)
+        await dp.start_polling(bot)
+    finally:
+        if metrics_runner is not None:
+            await metrics_runner.cleanup()
+        await cancel_background_tasks()
+        await close_http_client()
+        await dispose_engine()
+        await bot.session.close()
 
 if __name__ == '__main__':
     asyncio.run(main())
@@ -0,0 +1,21 @@
+import os
+import tempfile
+
+# config читает окружение при импорте, поэтому значения задаются до импорта приложения
+os.environ.setdefault("BOT_TOKEN", "123456:test")
+os.environ.setdefault("DB_URL", f"sqlite+aiosqlite:///{os.path.join(tempfile.mkdtemp(), 'bot.db')}")
+
+import pytest
+
+from app.database import models
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    """
+    Свой файл SQLite на каждый тест. Движок создаётся при первом обращении,
+    поэтому тест вызывает async_main() и в конце dispose_engine() внутри своего event loop.
+    """
+    path = tmp_path / "bot.db"
+    monkeypatch.setattr(models, "DB_URL", f"sqlite+aiosqlite:///{path}")
+    return path
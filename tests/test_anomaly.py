@@ -0,0 +1,55 @@
+import numpy as np
+import pytest
+
+from app.utils.anomaly import AnomalyDetector
+
+
+def _metrics(ram: float, disks: dict) -> dict:
+    return {
+        "memory": {"ram_percent": ram, "swap_percent": 0.0},
+        "disks": [{"mount_point": mount, "total_space_mb": 100.0, "available_space_mb": 100.0 - used}
+                  for mount, used in disks.items()],
+    }
+
+
+def test_disks_get_own_series_by_mount_point():
+    detector = AnomalyDetector(disks=2)
+
+    row = detector.values(1, _metrics(10.0, {"/": 30.0, "/data": 50.0, "/extra": 70.0}))
+    assert row == pytest.approx([10.0, 0.0, 30.0, 50.0])
+    # Порядок дисков в ответе не важен, пропавший диск даёт NaN
+    row = detector.values(1, _metrics(10.0, {"/data": 55.0}))
+    assert row[2] != row[2] and row[3] == pytest.approx(55.0)
+    assert detector.series_name(1, 3) == "disk:/data"
+
+
+def test_leak_on_one_disk_is_reported_for_that_disk_only():
+    detector = AnomalyDetector(disks=3, warmup=5)
+    anomalies = []
+    for cycle in range(40):
+        leaking = 20.0 + (cycle - 10 if cycle > 10 else 0)
+        metrics = _metrics(40.0 + cycle % 2, {"/": 30.0 + cycle % 2, "/var": leaking})
+        anomalies += detector.observe_rows({7: detector.values(7, metrics)})
+
+    assert {(host_id, series, kind) for host_id, series, kind, _ in anomalies} == {(7, "disk:/var", "leak")}
+
+
+def test_stationary_noise_rarely_looks_like_jump():
+    hosts, cycles = 2000, 300
+    rng = np.random.default_rng(0)
+    detector = AnomalyDetector(disks=0, capacity=hosts)
+    level = rng.uniform(20, 70, (hosts, 2))
+    scale = rng.uniform(0.5, 5.0, (hosts, 2))
+    host_ids = list(range(hosts))
+    false_jumps = 0
+    for _ in range(cycles):
+        anomalies = detector.observe(host_ids, level + rng.normal(0, 1, (hosts, 2)) * scale)
+        false_jumps += sum(1 for _, _, kind, _ in anomalies if kind == "jump")
+    observations = hosts * 2 * (cycles - detector.warmup)
+    # При 10 000 хостов × 20 рядов это меньше двух ложных скачков за цикл опроса
+    assert false_jumps / observations < 1e-5
+
+    # Настоящий скачок по-прежнему находится
+    spike = level + rng.normal(0, 1, (hosts, 2)) * scale
+    spike[5, 0] = 99.0
+    assert (5, "ram_percent", "jump", 99.0) in detector.observe(host_ids, spike)
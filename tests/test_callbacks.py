@@ -0,0 +1,46 @@
+import pytest
+
+from app.callbacks import CallbackHandlers, HostCallback, PollCallback
+
+
+def _handlers():
+    handlers = CallbackHandlers()
+
+    @handlers.data("settings")
+    async def settings(callback):
+        pass
+
+    @handlers.factory(HostCallback)
+    async def info_host(callback, callback_data):
+        pass
+
+    return handlers
+
+
+def test_resolve_static_and_typed_data():
+    handlers = _handlers()
+
+    handler, callback_data = handlers.resolve("settings")
+    assert handler.callback.__name__ == "settings"
+    assert callback_data is None
+
+    handler, callback_data = handlers.resolve(HostCallback(host_id=7).pack())
+    assert handler.callback.__name__ == "info_host"
+    assert callback_data == HostCallback(host_id=7)
+
+
+def test_resolve_unknown_data():
+    handlers = _handlers()
+
+    assert handlers.resolve("unknown") == (None, None)
+    assert handlers.resolve(None) == (None, None)
+    handler, callback_data = handlers.resolve(PollCallback(host_id=1).pack())
+    assert handler is None
+    assert callback_data == PollCallback(host_id=1)
+
+
+def test_duplicate_registration_is_rejected():
+    handlers = _handlers()
+
+    with pytest.raises(ValueError):
+        handlers.data("settings")(lambda callback: None)
@@ -0,0 +1,95 @@
+import asyncio
+import ipaddress
+import logging
+import socket
+from types import SimpleNamespace
+
+import pytest
+
+from app.database.models import async_main, dispose_engine
+from app.database.requests import set_user, get_hosts
+from app.utils.discovery import parse_scan_target, parse_networks, scan_network
+from app.utils.send_request import close_http_client
+from loadtest.replay import AgentSwarm
+from loadtest.stub_agent import StubAgent
+
+LOOPBACK = parse_networks("127.0.0.0/8")
+
+
+def _free_port(ip: str) -> int:
+    with socket.socket() as sock:
+        sock.bind((ip, 0))
+        return sock.getsockname()[1]
+
+
+class _Progress:
+    """Сообщение с прогрессом: запоминает тексты вместо вызовов Bot API."""
+
+    def __init__(self):
+        self.chat = SimpleNamespace(id=32)
+        self.texts = []
+
+    async def edit_text(self, text, reply_markup=None):
+        self.texts.append(text)
+
+
+def test_parse_scan_target_requires_allowed_network():
+    allowed = parse_networks("10.0.0.0/16, fd00::/64")
+
+    assert parse_scan_target("10.0.1.0/24:8080", allowed) == (ipaddress.ip_network("10.0.1.0/24"), 8080)
+    assert parse_scan_target("[fd00::/120]:80", allowed)[1] == 80
+    for target in ("10.1.0.0/24:8080", "127.0.0.1/32:8080", "10.0.0.0/15:80"):
+        with pytest.raises(ValueError):
+            parse_scan_target(target, allowed)
+    with pytest.raises(ValueError):
+        parse_scan_target("10.0.0.0/24:8080", [])
+
+
+def test_scan_finds_swarm_agents_quietly(caplog):
+    async def scenario():
+        port = _free_port("127.0.3.1")
+        # first=762 даёт адреса 127.0.3.1-127.0.3.3; .4-.6 не отвечают
+        swarm = AgentSwarm(3, first=762, port=port)
+        await swarm.start()
+        try:
+            network, _ = parse_scan_target(f"127.0.3.0/29:{port}", LOOPBACK)
+            return await scan_network(network, port)
+        finally:
+            await swarm.stop()
+            await close_http_client()
+
+    with caplog.at_level(logging.DEBUG, logger="app.utils.send_request"):
+        found = asyncio.run(scenario())
+
+    assert sorted(found) == [("127.0.3.1", "agent762"), ("127.0.3.2", "agent763"), ("127.0.3.3", "agent764")]
+    assert not [record for record in caplog.records if record.levelno >= logging.WARNING]
+
+
+def test_cancelled_scan_registers_partial_results(database):
+    from app.handlers import _scan_and_register
+
+    async def scenario():
+        await async_main()
+        port = _free_port("127.0.4.1")
+        swarm = AgentSwarm(2, first=1016, port=port)
+        slow = StubAgent(host_name="slow", latency=5)
+        await swarm.start()
+        slow_runner = await slow.start(host="127.0.4.3", port=port)
+        try:
+            await set_user(32)
+            progress = _Progress()
+            network, _ = parse_scan_target(f"127.0.4.0/29:{port}", LOOPBACK)
+            task = asyncio.create_task(_scan_and_register(progress, 32, network, port))
+            await asyncio.sleep(1.5)
+            task.cancel()
+            with pytest.raises(asyncio.CancelledError):
+                await task
+            assert "Добавлено хостов: 2" in progress.texts[-1]
+            return sorted(host.ip for host in await get_hosts(32))
+        finally:
+            await slow_runner.cleanup()
+            await swarm.stop()
+            await close_http_client()
+            await dispose_engine()
+
+    assert asyncio.run(scenario()) == ["127.0.4.1", "127.0.4.2"]
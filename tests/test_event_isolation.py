@@ -0,0 +1,118 @@
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+from app.middlewares import DuplicateCallbackMiddleware
+from app.utils.event_isolation import ChatEventIsolation, ChatQueueFull
+
+
+def _key(chat_id: int) -> StorageKey:
+    return StorageKey(bot_id=1, chat_id=chat_id, user_id=chat_id)
+
+
+async def _update(isolation: ChatEventIsolation, chat_id: int, name: str, log: list, delay: float) -> None:
+    async with isolation.lock(_key(chat_id)):
+        log.append(("start", name))
+        await asyncio.sleep(delay)
+        log.append(("end", name))
+
+
+def test_updates_of_one_chat_run_in_order():
+    async def scenario():
+        isolation = ChatEventIsolation()
+        log = []
+        tasks = []
+        for index, delay in enumerate((0.03, 0.01, 0.0)):
+            tasks.append(asyncio.create_task(_update(isolation, 1, f"u{index}", log, delay)))
+            await asyncio.sleep(0)
+        await asyncio.gather(*tasks)
+        return log, isolation
+
+    log, isolation = asyncio.run(scenario())
+    assert log == [("start", "u0"), ("end", "u0"), ("start", "u1"), ("end", "u1"), ("start", "u2"), ("end", "u2")]
+    # Очередь чата опустела — блокировка удалена
+    assert isolation._locks == {} and isolation._pending == {}
+
+
+def test_chats_are_processed_concurrently():
+    async def scenario():
+        isolation = ChatEventIsolation()
+        log = []
+        await asyncio.gather(*(_update(isolation, chat_id, f"chat{chat_id}", log, 0.02) for chat_id in (1, 2, 3)))
+        return log
+
+    log = asyncio.run(scenario())
+    # Все чаты начали обработку до того, как какой-либо закончил
+    assert [event for event, _ in log] == ["start"] * 3 + ["end"] * 3
+
+
+def test_full_chat_queue_rejects_update():
+    async def scenario():
+        isolation = ChatEventIsolation(max_pending=2)
+        log = []
+        tasks = [asyncio.create_task(_update(isolation, 1, f"u{index}", log, 0.02)) for index in range(2)]
+        await asyncio.sleep(0)
+        with pytest.raises(ChatQueueFull):
+            await _update(isolation, 1, "rejected", log, 0.0)
+        # Другой чат не затронут
+        await _update(isolation, 2, "other", log, 0.0)
+        await asyncio.gather(*tasks)
+        # Очередь разобрана — чат снова принимает апдейты
+        await _update(isolation, 1, "after", log, 0.0)
+        return log, isolation
+
+    log, isolation = asyncio.run(scenario())
+    assert ("start", "rejected") not in log
+    assert ("end", "after") in log and ("end", "other") in log
+    assert isolation._locks == {} and isolation._pending == {}
+
+
+def test_lock_is_released_when_handler_fails():
+    async def scenario():
+        isolation = ChatEventIsolation()
+        with pytest.raises(RuntimeError):
+            async with isolation.lock(_key(1)):
+                raise RuntimeError
+        return isolation
+
+    isolation = asyncio.run(scenario())
+    assert isolation._locks == {} and isolation._pending == {}
+
+
+class _Callback(SimpleNamespace):
+    async def answer(self, *args, **kwargs):
+        self.answered += 1
+
+
+def _callback(user_id: int, message_id: int, data: str) -> _Callback:
+    return _Callback(from_user=SimpleNamespace(id=user_id), message=SimpleNamespace(message_id=message_id),
+                     data=data, answered=0)
+
+
+def test_duplicate_taps_are_dropped_within_ttl():
+    handled = []
+
+    async def handler(event, data):
+        handled.append(event.data)
+        return "ok"
+
+    async def scenario():
+        middleware = DuplicateCallbackMiddleware(ttl=0.05)
+        first = _callback(1, 10, "hosts")
+        assert await middleware(handler, first, {}) == "ok"
+        repeat = _callback(1, 10, "hosts")
+        assert await middleware(handler, repeat, {}) is None
+        assert repeat.answered == 1
+        # Другая кнопка, другое сообщение и другой пользователь — не повторы
+        await middleware(handler, _callback(1, 10, "settings"), {})
+        await middleware(handler, _callback(1, 11, "hosts"), {})
+        await middleware(handler, _callback(2, 10, "hosts"), {})
+        await asyncio.sleep(0.06)
+        # После ttl то же нажатие снова обрабатывается, а старые ключи вычищены
+        await middleware(handler, _callback(1, 10, "hosts"), {})
+        assert list(middleware._seen) == [(1, 10, "hosts")]
+
+    asyncio.run(scenario())
+    assert handled == ["hosts", "settings", "hosts", "hosts", "hosts"]
@@ -0,0 +1,52 @@
+import asyncio
+import sqlite3
+
+from app.database.models import async_main, dispose_engine
+from app.database.requests import set_user, add_host, add_hosts_bulk, get_hosts, count_hosts
+
+
+def test_prefix_search_ignores_case(database):
+    async def scenario():
+        await async_main()
+        try:
+            await set_user(36)
+            await add_host(36, "Alpine", "10.0.0.1", 8000)
+            await add_hosts_bulk(36, [("alpha", "10.0.0.2", 8000), ("Бэкап", "10.0.0.3", 8000),
+                                      ("db", "10.0.0.4", 8000)])
+            assert [host.name for host in await get_hosts(36, name_prefix="al", sort="name")] == ["alpha", "Alpine"]
+            assert [host.name for host in await get_hosts(36, name_prefix="ALP", sort="name")] == ["alpha", "Alpine"]
+            assert [host.name for host in await get_hosts(36, name_prefix="бэк")] == ["Бэкап"]
+            assert await count_hosts(36, name_prefix="Al") == 2
+        finally:
+            await dispose_engine()
+
+    asyncio.run(scenario())
+
+
+def test_async_main_upgrades_existing_database(database):
+    # Таблица hosts в том виде, в каком её создавали версии без name_key и индексов поиска
+    with sqlite3.connect(database) as connection:
+        connection.executescript("""
+            CREATE TABLE users (id INTEGER PRIMARY KEY, tg_id BIGINT NOT NULL UNIQUE, settings JSON NOT NULL);
+            CREATE TABLE hosts (
+                id INTEGER PRIMARY KEY, ip VARCHAR(50) NOT NULL UNIQUE, port INTEGER NOT NULL,
+                name VARCHAR(100) NOT NULL, last_checked DATETIME, user_id BIGINT REFERENCES users (tg_id)
+            );
+            INSERT INTO users (tg_id, settings) VALUES (36, '[{"short": false}]');
+            INSERT INTO hosts (ip, port, name, user_id) VALUES ('10.0.0.1', 8000, 'Alpine', 36);
+        """)
+
+    async def scenario():
+        # Второй запуск проверяет, что обновление схемы идемпотентно
+        for _ in range(2):
+            await async_main()
+            await dispose_engine()
+        try:
+            assert [host.name for host in await get_hosts(36, name_prefix="al")] == ["Alpine"]
+        finally:
+            await dispose_engine()
+
+    asyncio.run(scenario())
+    with sqlite3.connect(database) as connection:
+        indexes = {name for name, in connection.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+    assert {"ix_hosts_user_name_key", "ix_metrics_ram_percent", "ix_host_tags_tag_host"} <= indexes
@@ -0,0 +1,57 @@
+import asyncio
+import json
+
+from app.database.models import async_main, async_session, dispose_engine
+from app.database.requests import set_user, get_hosts, _insert_hosts_one_by_one
+from app.utils.host_transfer import import_hosts, parse_host_array
+
+
+async def _chunks(data: bytes, size: int):
+    for start in range(0, len(data), size):
+        yield data[start:start + size]
+
+
+async def _collect(data: bytes, size: int):
+    return [row async for row in parse_host_array(_chunks(data, size))]
+
+
+def test_json_array_is_parsed_across_chunk_boundaries():
+    hosts = [{"name": f"хост{index}", "ip": f"10.0.0.{index}", "port": 8000 + index} for index in range(1, 6)]
+    data = json.dumps(hosts, ensure_ascii=False, indent=2).encode()
+
+    for size in (1, 7, len(data)):
+        rows = asyncio.run(_collect(data, size))
+        assert [host for _, host, _ in rows] == [(h["name"], h["ip"], h["port"]) for h in hosts]
+
+
+def test_json_array_reports_bad_items_and_structure():
+    rows = asyncio.run(_collect(b'[{"name": "a", "ip": "10.0.0.1", "port": 1}, {"name": "b"}, 5 x', 4))
+
+    assert rows[0] == ("объект 1", ("a", "10.0.0.1", 1), None)
+    assert rows[1][0] == "объект 2" and "нет поля" in rows[1][2]
+    assert rows[2][0] == "объект 3" and "ожидается объект" in rows[2][2]
+    assert rows[3][0] == "объект 4" and "разбор остановлен" in rows[3][2]
+    assert asyncio.run(_collect(b'{"name": "a"}', 4))[0][2].startswith("ожидается JSON-массив")
+
+
+def test_import_json_array_and_plain_insert_fallback(database):
+    async def scenario():
+        await async_main()
+        try:
+            await set_user(31)
+            data = json.dumps([{"name": "a", "ip": "10.31.0.1", "port": 1},
+                               {"name": "b", "ip": "10.31.0.1", "port": 2}]).encode()
+            added, skipped, problems = await import_hosts(31, _chunks(data, 5), "json")
+            assert (added, skipped) == (1, 1)
+            assert problems == ["объект 2: IP 10.31.0.1 повторяется в файле"]
+
+            async with async_session() as session:
+                async with session.begin():
+                    inserted = await _insert_hosts_one_by_one(
+                        session, 31, [("dup", "10.31.0.1", 1), ("c", "10.31.0.2", 3)])
+            assert [ip for _, ip in inserted] == ["10.31.0.2"]
+            assert sorted(host.ip for host in await get_hosts(31)) == ["10.31.0.1", "10.31.0.2"]
+        finally:
+            await dispose_engine()
+
+    asyncio.run(scenario())
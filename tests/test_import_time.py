@@ -0,0 +1,37 @@
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# Кумулятивное время `import main` в микросекундах. Сейчас ~45 мс, почти всё — asyncio;
+# импорт aiogram занимает секунды, SQLAlchemy — ~200 мс, так что регрессия заметна сразу.
+IMPORT_BUDGET_US = 150_000
+RUNS = 3
+HEAVY_MODULES = ("aiogram", "sqlalchemy", "httpx", "aiohttp", "numpy")
+
+
+def _import_main() -> dict:
+    """Запускает `python -X importtime -c "import main"` и возвращает {модуль: кумулятивное время, мкс}."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import main"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_import_main_within_budget():
+    runs = [_import_main() for _ in range(RUNS)]
+    best = min(times["main"] for times in runs)
+    assert best <= IMPORT_BUDGET_US, f"import main занял {best / 1000:.1f} мс, бюджет {IMPORT_BUDGET_US / 1000:.0f} мс"
+
+
+def test_import_main_is_lazy():
+    imported = _import_main()
+    heavy = sorted(name for name in imported if name.split(".")[0] in HEAVY_MODULES)
+    assert not heavy, f"import main тянет тяжёлые зависимости: {heavy[:5]}"
@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from app.utils import metrics
+from app.utils.metrics import Histogram, Counter, AGENT_REQUEST_SECONDS, timed, metrics_delta, apply_metrics_delta
+from app.utils.send_request import send_request, commit_etag, close_http_client
+from loadtest.stub_agent import StubAgent, bound_port
+
+
+def test_histogram_render_is_cumulative():
+    histogram = Histogram("test_seconds", "Тестовая гистограмма.", "step", buckets=(1.0, 0.1, 0.5))
+    for value in (0.05, 0.1, 0.3, 0.7, 3.0):
+        histogram.observe("a", value)
+
+    lines = histogram.render()
+    assert lines[:2] == ["# HELP test_seconds Тестовая гистограмма.", "# TYPE test_seconds histogram"]
+    # Граница корзины входит в неё (le), корзины отсортированы и накопительны
+    assert lines[2:] == [
+        'test_seconds_bucket{step="a",le="0.1"} 2',
+        'test_seconds_bucket{step="a",le="0.5"} 3',
+        'test_seconds_bucket{step="a",le="1.0"} 4',
+        'test_seconds_bucket{step="a",le="+Inf"} 5',
+        'test_seconds_sum{step="a"} 4.15',
+        'test_seconds_count{step="a"} 5',
+    ]
+
+
+def test_timed_records_calls_and_failures():
+    histogram = Histogram("test_calls_seconds", "", "query")
+
+    @timed(histogram)
+    async def works():
+        return 1
+
+    @timed(histogram, label="custom")
+    async def fails():
+        raise ValueError
+
+    async def scenario():
+        assert await works() == 1
+        with pytest.raises(ValueError):
+            await fails()
+
+    asyncio.run(scenario())
+    assert works.__name__ == "works"
+    assert histogram.labels("works").count == 1
+    assert histogram.labels("custom").count == 1
+
+
+def _outcome_counts() -> dict:
+    return {label: series.count for label, series in AGENT_REQUEST_SECONDS._series.items()}
+
+
+def test_send_request_outcome_labels():
+    async def scenario():
+        agents = [StubAgent(change_every=3600), StubAgent(error_rate=1.0), StubAgent(latency=1.0)]
+        runners = [await agent.start() for agent in agents]
+        ok_port, error_port, slow_port = (str(bound_port(runner)) for runner in runners)
+        before = _outcome_counts()
+        try:
+            await send_request("127.0.0.1", ok_port, conditional=True)
+            commit_etag("127.0.0.1", ok_port)
+            await send_request("127.0.0.1", ok_port, conditional=True)
+            await send_request("127.0.0.1", error_port)
+            await send_request("127.0.0.1", slow_port, timeout=0.1)
+            await send_request("127.0.0.1", "1")
+        finally:
+            await close_http_client()
+            for runner in runners:
+                await runner.cleanup()
+        after = _outcome_counts()
+        return {label: count - before.get(label, 0) for label, count in after.items() if count != before.get(label, 0)}
+
+    assert asyncio.run(scenario()) == {
+        "ok": 1, "not_modified": 1, "http_error": 1, "timeout": 1, "request_error": 1,
+    }
+
+
+def test_metrics_delta_round_trip(monkeypatch):
+    buckets = (0.1, 1.0)
+    worker_histogram = Histogram("agent_seconds", "", "outcome", buckets)
+    worker_bytes = Counter("agent_bytes", "")
+    supervisor_histogram = Histogram("agent_seconds", "", "outcome", buckets)
+    supervisor_bytes = Counter("agent_bytes", "")
+    monkeypatch.setattr(metrics, "FORWARDED_HISTOGRAMS", (worker_histogram,))
+    monkeypatch.setattr(metrics, "FORWARDED_COUNTERS", (worker_bytes,))
+    monkeypatch.setattr(metrics, "REGISTRY", [supervisor_histogram, supervisor_bytes])
+
+    sent = {}
+    worker_histogram.observe("ok", 0.05)
+    worker_histogram.observe("ok", 0.5)
+    worker_bytes.inc(100)
+    apply_metrics_delta(metrics_delta(sent))
+
+    # Второй прирост содержит только новые наблюдения; неизменившиеся серии не пересылаются
+    worker_histogram.observe("ok", 5.0)
+    worker_histogram.observe("timeout", 0.5)
+    worker_bytes.inc(20)
+    delta = metrics_delta(sent)
+    assert delta[("agent_seconds", "ok")] == ([0, 0, 1], 5.0, 1)
+    apply_metrics_delta(delta)
+    assert metrics_delta(sent) == {}
+
+    assert supervisor_histogram.render() == worker_histogram.render()
+    assert supervisor_bytes.value == 120
@@ -0,0 +1,101 @@
+import asyncio
+from types import SimpleNamespace
+
+from app import handlers
+from app.messages import POLL_FAILED, ERROR_FETCHING_DATA, GROUP_POLL_FINISHED
+from app.utils.send_request import close_http_client
+from loadtest.stub_agent import StubAgent, bound_port
+
+
+class _Message:
+    """Сообщение бота, которое фоновый опрос редактирует по завершении."""
+
+    def __init__(self):
+        self.texts = []
+
+    async def edit_text(self, text, reply_markup=None):
+        self.texts.append(text)
+
+
+class _BrokenAgent(StubAgent):
+    """Агент, отвечающий 200 с JSON без полей метрик."""
+
+    def _current(self) -> None:
+        self._body = b'{"status": "ok"}'
+        self._etag = '"broken"'
+
+
+def _poll(monkeypatch, agent: StubAgent, **patches) -> _Message:
+    for name, function in patches.items():
+        monkeypatch.setattr(handlers, name, function)
+    message = _Message()
+    poll_key = (29, 1)
+
+    async def scenario():
+        runner = await agent.start()
+        handlers._polls_in_progress.add(poll_key)
+        try:
+            await handlers._poll_and_report(message, 29, 1, "127.0.0.1", str(bound_port(runner)), poll_key)
+        finally:
+            await close_http_client()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
+    assert poll_key not in handlers._polls_in_progress
+    return message
+
+
+def test_poll_shows_error_when_saving_fails(monkeypatch):
+    async def update_host_metrics(host_ip, metrics_data):
+        raise RuntimeError("database is locked")
+
+    message = _poll(monkeypatch, StubAgent(), update_host_metrics=update_host_metrics)
+    assert message.texts == [POLL_FAILED]
+
+
+def test_poll_reports_malformed_response_as_failed(monkeypatch):
+    failed = []
+
+    async def record_failed_polls(host_ids):
+        failed.extend(host_ids)
+
+    message = _poll(monkeypatch, _BrokenAgent(), record_failed_polls=record_failed_polls)
+    assert failed == [1]
+    assert message.texts == [ERROR_FETCHING_DATA + "некорректный ответ агента: нет раздела system"]
+
+
+def test_group_poll_saves_valid_hosts_and_counts_malformed_as_failed(monkeypatch):
+    saved, failed = [], []
+
+    async def update_hosts_metrics(samples):
+        saved.extend(host_id for host_id, _ in samples)
+
+    async def record_failed_polls(host_ids):
+        failed.extend(host_ids)
+
+    async def touch_hosts(host_ids):
+        pass
+
+    async def hosts(**kwargs):
+        return None
+
+    for name, function in (("update_hosts_metrics", update_hosts_metrics), ("record_failed_polls", record_failed_polls),
+                           ("touch_hosts", touch_hosts), ("hosts", hosts)):
+        monkeypatch.setattr(handlers, name, function)
+    message = _Message()
+    poll_key = (36, "web")
+
+    async def scenario():
+        runners = [await StubAgent().start(), await _BrokenAgent().start()]
+        group = [SimpleNamespace(id=1, ip="127.0.0.1", port=bound_port(runners[0])),
+                 SimpleNamespace(id=2, ip="127.0.0.1", port=bound_port(runners[1]))]
+        try:
+            await handlers._poll_group(message, 36, "web", group, poll_key)
+        finally:
+            await close_http_client()
+            for runner in runners:
+                await runner.cleanup()
+
+    asyncio.run(scenario())
+    assert saved == [1] and failed == [2]
+    assert message.texts == [GROUP_POLL_FINISHED.format(tag="web", updated=1, unchanged=0, failed=1)]
@@ -0,0 +1,122 @@
+import asyncio
+import queue
+
+from aiohttp import web
+
+from app.poller.hash_ring import HashRing
+from app.poller.worker import _poll_cycle, _worker_main
+from app.utils.samples import metrics_problem
+from app.utils.send_request import close_http_client
+from loadtest.stub_agent import StubAgent, bound_port, make_payload
+
+HOSTS = [(host_id, f"10.0.{host_id // 254}.{host_id % 254 + 1}", 8000) for host_id in range(10000)]
+
+
+def _owners(ring: HashRing) -> dict:
+    return {host[0]: worker_id for worker_id, hosts in ring.assign(HOSTS).items() for host in hosts}
+
+
+def test_hash_ring_moves_about_one_nth_of_hosts():
+    ring = HashRing(range(4))
+    before = _owners(ring)
+
+    ring.add(4)
+    after_add = _owners(ring)
+    moved = [host_id for host_id in before if before[host_id] != after_add[host_id]]
+    # Переезжают только хосты нового воркера, и их около 1/5
+    assert {after_add[host_id] for host_id in moved} == {4}
+    assert 0.1 < len(moved) / len(HOSTS) < 0.3
+
+    ring.remove(1)
+    after_remove = _owners(ring)
+    moved = [host_id for host_id in after_add if after_add[host_id] != after_remove[host_id]]
+    assert {after_add[host_id] for host_id in moved} == {1}
+    assert sorted(moved) == sorted(host_id for host_id, owner in after_add.items() if owner == 1)
+    assert set(ring.assign(HOSTS)) == {0, 2, 3, 4}
+
+
+def test_metrics_problem():
+    assert metrics_problem(make_payload("ok")) is None
+    assert metrics_problem({"status": "ok"}) == "нет раздела system"
+    payload = make_payload("broken")
+    del payload["memory"]["ram_percent"]
+    assert metrics_problem(payload) == "нет числа memory.ram_percent"
+    assert metrics_problem(dict(make_payload("broken"), disks=None)) == "disks не является списком объектов"
+
+
+async def _start_broken_agent() -> web.AppRunner:
+    """Агент, отвечающий 200 с JSON без полей метрик."""
+    async def handle(_request):
+        return web.json_response({"status": "ok"})
+
+    app = web.Application()
+    app.router.add_get("/get_info", handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    await web.TCPSite(runner, host="127.0.0.1", port=0).start()
+    return runner
+
+
+def _drain(results: queue.Queue) -> list:
+    messages = []
+    while not results.empty():
+        messages.append(results.get())
+    return messages
+
+
+def test_poll_cycle_counts_malformed_response_as_failed():
+    async def scenario():
+        runners = [await StubAgent().start(), await _start_broken_agent()]
+        results = queue.Queue()
+        try:
+            hosts = [(1, "127.0.0.1", bound_port(runners[0])), (2, "127.0.0.1", bound_port(runners[1]))]
+            await _poll_cycle(0, hosts, results, concurrency=2, batch_size=100)
+        finally:
+            await close_http_client()
+            for runner in runners:
+                await runner.cleanup()
+        return _drain(results)
+
+    messages = asyncio.run(scenario())
+    assert [(kind, [item[0] for item in payload] if kind == "samples" else payload)
+            for kind, _, payload in messages] == [("samples", [1]), ("failed", [2])]
+
+
+def test_worker_protocol_assign_saved_stop():
+    async def scenario():
+        loop = asyncio.get_running_loop()
+        runner = await StubAgent(change_every=3600).start()
+        commands, results = queue.Queue(), queue.Queue()
+
+        async def next_cycle() -> dict:
+            """Сообщения воркера до конца очередного цикла, кроме "metrics": {вид: данные}."""
+            messages = {}
+            while True:
+                kind, worker_id, payload = await loop.run_in_executor(None, results.get, True, 10)
+                assert worker_id == 7
+                if kind == "cycle":
+                    return messages
+                if kind != "metrics":
+                    messages[kind] = payload
+
+        worker = asyncio.create_task(_worker_main(7, commands, results, interval=0.1, concurrency=10,
+                                                  batch_size=100))
+        try:
+            commands.put(("assign", [(1, "127.0.0.1", bound_port(runner))]))
+            first = await next_cycle()
+            assert [host_id for host_id, _ in first["samples"]] == [1]
+            # Пока писатель не подтвердил сохранение, ETag не отправляется: снова полный ответ
+            assert set(await next_cycle()) == {"samples"}
+            commands.put(("saved", [1]))
+            # Подтверждение может прийти во время цикла, поэтому 304 ожидается не позже следующего
+            cycles = [await next_cycle(), await next_cycle()]
+            assert {"unchanged": [1]} in cycles
+            commands.put(("stop", None))
+            await asyncio.wait_for(worker, 5)
+            # Перед выходом воркер пересылает последний прирост метрик
+            assert _drain(results)[-1][0] == "metrics"
+        finally:
+            worker.cancel()
+            await runner.cleanup()
+
+    asyncio.run(scenario())
@@ -0,0 +1,70 @@
+import asyncio
+
+import pytest
+
+from app.database import models
+from app.database.models import Base, User, current_user_id, async_main, dispose_engine
+from app.database.requests import set_user, get_user, switch_user_short_format
+
+
+@pytest.fixture
+def replica(database, monkeypatch):
+    """«Реплика» — второй файл SQLite рядом с основной БД; реплика без репликации."""
+    path = database.with_name("replica.db")
+    monkeypatch.setattr(models, "DB_READ_URL", f"sqlite+aiosqlite:///{path}")
+    monkeypatch.setattr(models, "DB_READ_MAX_STALENESS", 5.0)
+    return path
+
+
+async def _prepare_replica(tg_id: int) -> None:
+    """Кладёт в реплику пользователя с пометкой, по которой видно, откуда пришло чтение."""
+    read_maker = models.get_read_session_maker()
+    async with models._read_engine.begin() as connection:
+        await connection.run_sync(Base.metadata.create_all)
+    async with read_maker() as session:
+        async with session.begin():
+            session.add(User(tg_id=tg_id, settings=[{"short": False, "report": None, "replica": True}]))
+
+
+def _source(user) -> str:
+    return "replica" if user.settings[0].get("replica") else "primary"
+
+
+def test_reads_follow_writes_per_user(replica):
+    async def scenario():
+        await async_main()
+        try:
+            await set_user(35)
+            await _prepare_replica(35)
+            # Без недавних записей чтение идёт в реплику
+            assert _source(await get_user(35)) == "replica"
+
+            current_user_id.set(35)
+            await switch_user_short_format(35)
+            assert _source(await get_user(35)) == "primary"
+
+            # Запись пользователя 35 не уводит в основную БД чтения других пользователей
+            current_user_id.set(36)
+            assert _source(await get_user(35)) == "replica"
+
+            current_user_id.set(35)
+            models._last_writes[35] -= models.DB_READ_MAX_STALENESS
+            assert _source(await get_user(35)) == "replica"
+        finally:
+            await dispose_engine()
+
+    asyncio.run(scenario())
+
+
+def test_unavailable_replica_falls_back_to_primary(replica, monkeypatch):
+    monkeypatch.setattr(models, "DB_READ_URL", f"sqlite+aiosqlite:///{replica.parent / 'missing' / 'replica.db'}")
+
+    async def scenario():
+        await async_main()
+        try:
+            await set_user(37)
+            return await get_user(37)
+        finally:
+            await dispose_engine()
+
+    assert _source(asyncio.run(scenario())) == "primary"
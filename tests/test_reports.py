@@ -0,0 +1,110 @@
+import asyncio
+from datetime import datetime, timedelta
+
+from sqlalchemy import select
+
+from app.database.models import MetricSample, async_main, async_session, dispose_engine
+from app.database.requests import set_user, add_hosts_bulk, get_hosts, switch_user_report_period, \
+    get_report_subscribers, get_report_stats
+from app.reports.render import render_report
+from app.reports.retention import run_sample_retention, SAMPLE_RETENTION
+
+
+def _sample(host_id: int, taken_at: datetime, up: bool = True, ram: float = None, disk: float = None):
+    return MetricSample(host_id=host_id, taken_at=taken_at, up=up, ram_percent=ram,
+                        swap_percent=None if ram is None else 5.0, disk_percent=disk)
+
+
+def test_report_stats_and_render(database):
+    now = datetime(2026, 10, 19, 9, 0)
+    since = now - timedelta(days=1)
+
+    async def scenario():
+        await async_main()
+        try:
+            for tg_id in (1, 2, 3):
+                await set_user(tg_id)
+            await switch_user_report_period(1)
+            for _ in range(2):
+                await switch_user_report_period(2)
+            assert await get_report_subscribers("daily") == [1]
+            assert await get_report_subscribers("weekly") == [2]
+
+            await add_hosts_bulk(1, [("web", "10.0.0.1", 8000), ("db", "10.0.0.2", 8000), ("idle", "10.0.0.3", 8000)])
+            web, db, _ = sorted(await get_hosts(1), key=lambda host: host.id)
+            async with async_session() as session:
+                async with session.begin():
+                    session.add_all([
+                        # Отсчёт до начала периода в сводку не входит
+                        _sample(web.id, since - timedelta(hours=1), ram=99.0, disk=10.0),
+                        _sample(web.id, since + timedelta(hours=1), ram=40.0, disk=50.0),
+                        _sample(web.id, since + timedelta(hours=2), ram=70.0),
+                        _sample(web.id, since + timedelta(hours=3), up=False),
+                        _sample(web.id, since + timedelta(hours=4), ram=55.0, disk=53.5),
+                        _sample(db.id, since + timedelta(hours=1), up=False),
+                    ])
+            return await get_report_stats([1], since)
+        finally:
+            await dispose_engine()
+
+    rows = asyncio.run(scenario())
+    assert [row[2:] for row in rows] == [
+        ("web", 4, 3, 70.0, 5.0, 50.0, 53.5),
+        ("db", 1, 0, None, None, None, None),
+        ("idle", 0, 0, None, None, None, None),
+    ]
+
+    text = render_report("daily", "18.10 09:00", "19.10 09:00", [row[1:] for row in rows])
+    assert text.startswith("📊 <b>Отчёт за сутки</b> (18.10 09:00 — 19.10 09:00)")
+    # Сначала хост без ответов, затем хост с доступностью 75%, затем хост без данных
+    assert text.index("<b>db</b>") < text.index("<b>web</b>") < text.index("<b>idle</b>")
+    assert "Доступность: 0% (0 из 1)" in text
+    assert "Доступность: 75.0% (3 из 4)" in text
+    assert "Пик RAM: 70.0% · Swap: 5.0%" in text
+    assert "Диск: 53.5% (+3.5 п.п.)" in text
+    assert "Нет данных опросов за период" in text
+
+
+def test_sample_retention_runs_without_reports(database):
+    async def scenario():
+        await async_main()
+        try:
+            await set_user(1)
+            await add_hosts_bulk(1, [("web", "10.0.0.1", 8000)])
+            host_id = (await get_hosts(1))[0].id
+            now = datetime.now()
+            async with async_session() as session:
+                async with session.begin():
+                    session.add_all([_sample(host_id, now - SAMPLE_RETENTION - timedelta(hours=1), ram=10.0),
+                                     _sample(host_id, now - timedelta(hours=1), ram=20.0)])
+            retention = asyncio.create_task(run_sample_retention(interval=3600))
+            try:
+                for _ in range(100):
+                    async with async_session() as session:
+                        kept = (await session.scalars(select(MetricSample.ram_percent))).all()
+                    if len(kept) == 1:
+                        break
+                    await asyncio.sleep(0.05)
+            finally:
+                retention.cancel()
+                await asyncio.gather(retention, return_exceptions=True)
+            return kept
+        finally:
+            await dispose_engine()
+
+    assert asyncio.run(scenario()) == [20.0]
+
+
+def test_report_fits_telegram_limit_with_long_names():
+    # 100 символов — максимальная длина имени хоста
+    hosts = [(host_id, f"{host_id:03d}" + "ж" * 97, 10, 9, 50.0, 5.0, 40.0, 45.0) for host_id in range(60)]
+    text = render_report("weekly", "12.10 09:00", "19.10 09:00", hosts)
+    shown = text.count("🖥️")
+    # Строка хоста с таким именем — около 170 единиц, следующая уже не поместилась бы
+    assert 4096 - 400 < len(text.encode("utf-16-le")) // 2 <= 4096
+    assert 0 < shown < len(hosts)
+    assert text.endswith(f"… и ещё {len(hosts) - shown} хостов")
+
+    # Всё, что помещается, выводится без строки «ещё»
+    short = render_report("daily", "18.10 09:00", "19.10 09:00", hosts[:5])
+    assert short.count("🖥️") == 5 and "и ещё" not in short
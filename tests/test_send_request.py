@@ -0,0 +1,23 @@
+import asyncio
+
+from app.utils.send_request import send_request, commit_etag, close_http_client, NOT_MODIFIED
+from loadtest.stub_agent import StubAgent, bound_port
+
+
+def test_etag_is_used_only_after_commit():
+    async def scenario():
+        runner = await StubAgent(change_every=3600).start()
+        port = str(bound_port(runner))
+        try:
+            # Безусловный ответ ETag не запоминает
+            assert isinstance(await send_request("127.0.0.1", port), dict)
+            assert isinstance(await send_request("127.0.0.1", port, conditional=True), dict)
+            # Ответ не подтверждён как сохранённый — 304 быть не должно
+            assert isinstance(await send_request("127.0.0.1", port, conditional=True), dict)
+            commit_etag("127.0.0.1", port)
+            assert await send_request("127.0.0.1", port, conditional=True) is NOT_MODIFIED
+        finally:
+            await close_http_client()
+            await runner.cleanup()
+
+    asyncio.run(scenario())